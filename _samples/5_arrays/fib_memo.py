@@ -0,0 +1,21 @@
+def memo(size):
+    # python calls the function as is, the compiler keeps its results in a table of size entries
+    def decorate(function):
+        return function
+    return decorate
+
+@memo(25)
+def fib(n):
+    if n <= 1:
+        result = n
+    else:
+        pred_1 = n-1
+        r_1 = fib(pred_1)
+        pred_2 = n-2
+        r_2 = fib(pred_2)
+        result = r_1 + r_2
+    return result
+
+n = int(input())
+value = fib(n)
+print(value)
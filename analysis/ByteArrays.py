@@ -0,0 +1,118 @@
+"""
+    Arrays whose elements always fit in a byte are stored one byte per
+    element: .BLOCK n instead of .BLOCK 2n, LDBA/STBA instead of LDWA/STWA
+    and indexes that are not doubled. An array is stored in bytes when it
+    is annotated so (flags_: bytearray = [0] * 100), or when it starts
+    with a value in 0..255 and every value stored in it is in 0..255 too.
+"""
+
+import ast
+from visitors.Expressions import is_array_init, is_input
+
+# annotations of an array stored in bytes, its stores keep the low byte of the value
+BYTE_TYPES = ('bytearray', 'bytes', 'list[bool]')
+BYTE_MAX = 255
+
+def fits_byte(value):
+    return type(value) is int and 0 <= value <= BYTE_MAX
+
+class Annotations(ast.NodeTransformer):
+    """
+        x: T = value becomes x = value, the annotation stays as the type
+        comment of the assignment (as in x = value  # type: T), the passes
+        and the code generators only know plain assignments.
+    """
+
+    def visit_AnnAssign(self, node):
+        if node.value is None:
+            raise ValueError(f'Annotation without a value: {ast.unparse(node)}')
+        return ast.copy_location(ast.Assign(targets=[node.target], value=node.value, type_comment=ast.unparse(node.annotation)), node)
+
+    def generic_visit(self, node):
+        # annotations are statements, expressions are not walked
+        if isinstance(node, ast.expr):
+            return node
+        return super().generic_visit(node)
+
+class ByteArrays():
+    """
+        Decides which arrays are stored in bytes, after the passes that
+        rewrite values (folding, loops). An array read from a byte array
+        only holds bytes too, so the candidates shrink until every store
+        of the remaining ones is known to fit.
+    """
+
+    def __init__(self, analysis) -> None:
+        self.analysis = analysis
+        self.report = []
+
+    def infer(self):
+        """Record the arrays stored in bytes in the analysis, returns how many"""
+        analysis = self.analysis
+        arrays = self.__arrays()
+        annotated = set()
+        candidates = set()
+        for key, inits in arrays.items():
+            values = [init.value.left.elts[0].value for init in inits]
+            if any(init.type_comment in BYTE_TYPES for init in inits):
+                if not all(fits_byte(v) for v in values):
+                    raise ValueError(f'{key[1]} holds bytes but starts with {", ".join(str(v) for v in values if not fits_byte(v))}')
+                annotated.add(key)
+            if all(fits_byte(v) for v in values):
+                candidates.add(key)
+        stores = {}
+        for function, node in analysis.element_stores:
+            if function is not None and function not in analysis.functions:
+                continue
+            target = node.targets[0] if isinstance(node, ast.Assign) else node.target
+            value = node.value if isinstance(node, ast.Assign) and not is_input(node.value) else None
+            stores.setdefault(self.__resolve(function, target.value.id), []).append((function, value))
+        changed = True
+        while changed:
+            changed = False
+            for key in sorted(candidates - annotated, key = str):
+                if not all(self.__fits(function, value, candidates) for function, value in stores.get(key, [])):
+                    candidates.discard(key)
+                    changed = True
+        for key in sorted(candidates, key = str):
+            function, name = key
+            if function is None:
+                analysis.byte_arrays.add(name)
+            else:
+                analysis.functions[function].byte_arrays.add(name)
+            saved = max(init.value.right.value for init in arrays[key])
+            where = f' in {function}' if function is not None else ''
+            self.report.append(f'byte arrays: {name}{where} stored in bytes, {saved} bytes saved')
+        return len(candidates)
+
+    ####
+    ## Helper functions
+    ####
+
+    def __arrays(self):
+        """(function or None, name) -> the assignments creating the array"""
+        arrays = {}
+        for node in self.analysis.global_assignments:
+            if is_array_init(node.value):
+                arrays.setdefault((None, node.targets[0].id), []).append(node)
+        for function in self.analysis.functions.values():
+            for node in function.local_assignments:
+                if is_array_init(node.value):
+                    arrays.setdefault((function.name, node.targets[0].id), []).append(node)
+        return arrays
+
+    def __resolve(self, function, name):
+        if function is not None and self.analysis.functions[function].is_array(name):
+            return (function, name)
+        return (None, name)
+
+    def __fits(self, function, value, candidates):
+        """The value stored is always in 0..255"""
+        if isinstance(value, ast.Constant):
+            return fits_byte(value.value)
+        if isinstance(value, ast.BinOp) and isinstance(value.op, ast.Mod) and isinstance(value.right, ast.Constant):
+            # python's modulo has the sign of the divisor
+            return type(value.right.value) is int and 0 < value.right.value <= BYTE_MAX + 1
+        if isinstance(value, ast.Subscript) and isinstance(value.value, ast.Name):
+            return self.__resolve(function, value.value.id) in candidates
+        return False
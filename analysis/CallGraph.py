@@ -0,0 +1,92 @@
+"""
+    Reachability from the top level program, on the summaries of
+    ProgramAnalysis. It runs after constant folding, a global whose reads
+    were all replaced by its value is not needed anymore.
+"""
+
+import ast
+
+def has_side_effects(node):
+    """Evaluating node reads input, calls a function or may stop on a division by zero"""
+    for n in ast.walk(node):
+        if isinstance(n, ast.Call) and n.func.id != 'int':
+            return True
+        if isinstance(n, ast.BinOp) and isinstance(n.op, (ast.FloorDiv, ast.Mod)):
+            if not isinstance(n.right, ast.Constant) or n.right.value == 0:
+                return True
+    return False
+
+class CallGraph():
+
+    def __init__(self, analysis) -> None:
+        self.analysis = analysis
+        self.reachable = self.__reachable()
+        # name -> line of the definition
+        self.dead_functions = {name: f.node.lineno for name, f in analysis.functions.items() if name not in self.reachable}
+        self.dead_globals = self.__dead_globals()
+
+    def prune(self):
+        """Drop the dead functions and the assignments of dead globals from the analysis"""
+        self.analysis.global_assignments = self.live_assignments()
+        for name in self.dead_functions:
+            del self.analysis.functions[name]
+
+    def live_assignments(self):
+        """Assignments of global names in source order, without those of dead functions and dead globals"""
+        dead = set(self.dead_globals)
+        live = []
+        for node in self.analysis.global_assignments:
+            if node.targets[0].id not in dead and self.__owner(node) in self.reachable:
+                live.append(node)
+        return live
+
+    def report(self):
+        lines = [f'call graph: removed function {name} (line {line})' for name, line in self.dead_functions.items()]
+        lines.extend(f'call graph: removed global {name}' for name in self.dead_globals)
+        return lines
+
+    ####
+    ## Helper functions
+    ####
+
+    def __reachable(self):
+        """Names of the functions the top level calls, directly or not"""
+        functions = self.analysis.functions
+        reachable = set()
+        pending = [name for name in self.analysis.top_level_calls if name in functions]
+        while pending:
+            name = pending.pop()
+            if name in reachable:
+                continue
+            reachable.add(name)
+            pending.extend(callee for callee in functions[name].calls if callee in functions)
+        # the top level itself
+        reachable.add(None)
+        return reachable
+
+    def __owner(self, node):
+        return self.__owners.get(id(node))
+
+    def __dead_globals(self):
+        """Globals no reachable code reads, and whose assignments can be dropped"""
+        self.__owners = {}
+        for name, summary in self.analysis.functions.items():
+            for node in summary.global_assignments:
+                self.__owners[id(node)] = name
+        read = {name for name, count in self.analysis.top_level_reads.items() if count > 0}
+        for name in self.reachable:
+            if name is None:
+                continue
+            summary = self.analysis.functions[name]
+            read.update(n for n, count in summary.reads.items() if count > 0 and summary.reads_global(n))
+        dead = []
+        kept = set()
+        for node in self.analysis.global_assignments + self.analysis.global_updates:
+            name = node.targets[0].id if isinstance(node, ast.Assign) else node.target.id
+            if name in read or name in kept or self.__owner(node) not in self.reachable:
+                continue
+            if has_side_effects(node.value):
+                kept.add(name)
+            elif name not in dead:
+                dead.append(name)
+        return [name for name in dead if name not in kept]
@@ -0,0 +1,113 @@
+"""
+    How much memory a program needs, from its final instructions. Pep/9
+    loads the program at address 0 and the stack grows down from the
+    stack top towards it, the operating system lives above. The program
+    breaks when the deepest stack reaches its last byte.
+"""
+
+from ir.Instruction import Mode, Opcode
+from simulator.Pep9 import STACK_TOP
+
+RETURN_ADDRESS = 2      # bytes CALL pushes
+
+class MemoryFootprint():
+    """
+        Code and static data sizes, the frame of every routine (the entry
+        point, the functions and the runtime routines: the CALL targets)
+        and the deepest stack along the call graph. A call cycle makes the
+        stack of the routines that reach it unbounded, None.
+    """
+
+    def __init__(self, instructions, entry = 'tl') -> None:
+        self.entry = entry
+        self.code = sum(i.size() for i in instructions if i.is_code)
+        self.data = sum(i.size() for i in instructions if not i.is_code)
+        self.frames = {}        # routine -> bytes its SUBSP reserve at most
+        self.calls = {}         # routine -> routines it calls, in order
+        self.__routines(instructions)
+        # routines on a call cycle
+        self.recursive = [name for name in self.frames if name in self.__reachable(name)]
+        self.depths = {}        # routine -> stack bytes of a call, the calls it makes included, None when unbounded
+        for name in self.frames:
+            self.__depth(name)
+
+    @property
+    def size(self):
+        """Bytes of the program from address 0"""
+        return self.code + self.data
+
+    @property
+    def stack(self):
+        """Deepest stack of the program, None when it is unbounded"""
+        return self.depths.get(self.entry, 0)
+
+    @property
+    def free(self):
+        """Bytes left between the program and the deepest stack, negative when they collide"""
+        return STACK_TOP - self.size - (self.stack or 0)
+
+    def check(self):
+        """ValueError when the program and its stack do not fit below the stack top"""
+        if self.free < 0:
+            stack = f' and a stack of {self.stack} bytes' if self.stack else ''
+            raise ValueError(f'program of {self.size} bytes{stack} does not fit in the {STACK_TOP} bytes of Pep/9 memory below the stack top')
+
+    def report(self):
+        stack = f'stack {self.stack} bytes at most' if self.stack is not None else 'stack unbounded'
+        lines = [f'memory: code {self.code} bytes, static data {self.data} bytes, {stack}, {self.free} bytes free below {STACK_TOP:#06x}']
+        for name, frame in self.frames.items():
+            depth = self.depths[name]
+            lines.append(f'memory: {name} frame {frame} bytes, stack {depth if depth is not None else "unbounded"}{" bytes" if depth is not None else ""} with its calls')
+        for name in self.recursive:
+            level = self.frames[name] + RETURN_ADDRESS
+            room = STACK_TOP - self.size - self.frames.get(self.entry, 0)
+            lines.append(f'memory: {name} is recursive, {level} bytes per call, at most {room // level} nested calls fit')
+        return lines
+
+    ####
+    ## Helper functions
+    ####
+
+    def __routines(self, instructions):
+        """Frames and calls of the routines, each runs from its label to the next routine"""
+        starts = {self.entry} | {i.operand for i in instructions if i.opcode is Opcode.CALL and i.mode is Mode.I}
+        name = None
+        used = 0
+        for ins in instructions:
+            if ins.label in starts and ins.opcode is not Opcode.EQUATE:
+                name = ins.label
+                used = 0
+                self.frames.setdefault(name, 0)
+                self.calls.setdefault(name, [])
+            if name is None:
+                continue
+            # the generated code only moves the stack pointer by constants
+            if ins.opcode is Opcode.SUBSP and isinstance(ins.operand, int):
+                used += ins.operand
+                self.frames[name] = max(self.frames[name], used)
+            elif ins.opcode is Opcode.ADDSP and isinstance(ins.operand, int):
+                used -= ins.operand
+            elif ins.opcode is Opcode.CALL and ins.operand not in self.calls[name]:
+                self.calls[name].append(ins.operand)
+
+    def __reachable(self, name):
+        """Routines a call of name may lead to"""
+        reached = set()
+        pending = list(self.calls.get(name, []))
+        while pending:
+            callee = pending.pop()
+            if callee not in reached:
+                reached.add(callee)
+                pending.extend(self.calls.get(callee, []))
+        return reached
+
+    def __depth(self, name):
+        """Stack bytes of a call of name"""
+        if name not in self.depths:
+            if name in self.recursive or any(callee in self.recursive for callee in self.__reachable(name)):
+                # reaching a cycle is enough to be unbounded
+                self.depths[name] = None
+            else:
+                deepest = max((RETURN_ADDRESS + self.__depth(callee) for callee in self.calls.get(name, [])), default = 0)
+                self.depths[name] = self.frames.get(name, 0) + deepest
+        return self.depths[name]
@@ -0,0 +1,229 @@
+"""
+    Single walk over the module collecting everything the later stages used
+    to find with their own walks: global assignments, per function
+    summaries and the calls of every scope. Values are looked at lazily,
+    after constant folding has rewritten them in place.
+"""
+
+import ast
+from visitors.Expressions import is_array_init
+
+def memo_size(node):
+    """N of a @memo(N) decorator, None without one"""
+    size = None
+    for decorator in node.decorator_list:
+        if (isinstance(decorator, ast.Call) and isinstance(decorator.func, ast.Name) and decorator.func.id == 'memo' and len(decorator.args) == 1
+                and isinstance(decorator.args[0], ast.Constant) and type(decorator.args[0].value) is int and decorator.args[0].value > 0):
+            size = decorator.args[0].value
+        else:
+            raise ValueError(f'Unsupported decorator on {node.name}, only @memo(size) is supported')
+    return size
+
+def drop_memo_definition(module):
+    """
+        A program using @memo(N) defines memo itself so python can run it,
+        as a decorator returning the function as is. The compiler makes the
+        tables on its own, that definition is removed from the module.
+    """
+    functions = [node for node in module.body if isinstance(node, ast.FunctionDef)]
+    if any(memo_size(node) is not None for node in functions if node.name != 'memo'):
+        module.body = [node for node in module.body if not (isinstance(node, ast.FunctionDef) and node.name == 'memo')]
+
+class FunctionSummary():
+    """What the code generators need to know about one function definition"""
+
+    def __init__(self, node) -> None:
+        self.node = node
+        self.name = node.name
+        self.params = [a.arg for a in node.args.args]
+        self.memo = memo_size(node) # entries of the result table, None when not memoized
+        self.declared_globals = set()
+        self.locals = {}        # name -> its first assignment, None for an augmented assignment
+        self.local_assignments = [] # assignments of the locals, in source order
+        self.returns = False    # has a return with a value
+        self.calls = []         # names of the called functions
+        self.assigned = set()   # every name the body assigns, parameters included
+        self.reads = {}         # name -> loads of the name in the body
+        self.global_assignments = [] # assignments and augmented assignments of declared globals
+        self.byte_arrays = set()    # local arrays stored one byte per element, set by ByteArrays
+
+    def reads_global(self, name):
+        return name not in self.params and name not in self.locals
+
+    def local_size(self, name):
+        """Bytes of a local variable, arrays take 2 per element, or 1 when stored in bytes"""
+        node = self.locals[name]
+        if node is not None and is_array_init(node.value):
+            return (1 if name in self.byte_arrays else 2) * node.value.right.value
+        return 2
+
+    def is_array(self, name):
+        node = self.locals.get(name)
+        return node is not None and is_array_init(node.value)
+
+class ProgramAnalysis(ast.NodeVisitor):
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.functions = {}             # name -> FunctionSummary, in definition order
+        self.global_assignments = []    # assignments of global names, in source order
+        self.global_updates = []        # augmented assignments of global names
+        self.assignment_counts = {}     # global name -> assignments outside of functions
+        self.assigned_in_functions = set() # globals assigned by functions (declared global)
+        self.top_level_calls = []
+        self.top_level_reads = {}       # name -> loads outside of the functions
+        self.element_stores = []        # (function or None, assignment to an array element)
+        self.byte_arrays = set()        # global arrays stored one byte per element, set by ByteArrays
+        self.__module = None
+        self.__function = None
+
+    def analyze(self, module):
+        self.__module = module
+        self.visit(module)
+        return self
+
+    ####
+    ## Queries, valid after constant folding too
+    ####
+
+    def global_names(self):
+        """Names of the module scope: functions, globals and the names the functions read or declare as globals"""
+        names = set(self.functions) | set(self.assignment_counts) | set(self.top_level_reads)
+        for function in self.functions.values():
+            names.update(n for n in function.reads if function.reads_global(n))
+            names.update(function.declared_globals)
+        return names
+
+    def signatures(self):
+        """name -> (number of parameters, returns a value) of every function"""
+        return {name: (len(f.params), f.returns) for name, f in self.functions.items()}
+
+    def is_pure(self, name, visiting = None):
+        """The function only computes its result from its arguments: no input, output or global state"""
+        visiting = set() if visiting is None else visiting
+        if name in visiting:
+            return True
+        visiting.add(name)
+        function = self.functions[name]
+        if function.declared_globals or any(callee in ('input', 'print', 'exit') for callee in function.calls):
+            return False
+        # private constants are .EQUATEs, folded constants are not read anymore
+        if any(count > 0 and function.reads_global(n) and n[0] != '_' for n, count in function.reads.items()):
+            return False
+        return all(self.is_pure(callee, visiting) for callee in function.calls if callee in self.functions)
+
+    def calls_only_pure(self, name):
+        """Every function name calls, but itself, is pure"""
+        return all(self.is_pure(callee) for callee in self.functions[name].calls if callee in self.functions and callee != name)
+
+    def call_area(self, function = None, exclude = ()):
+        """Bytes a frame needs for the arguments (and return value) of its calls, the top level when function is None"""
+        calls = self.top_level_calls if function is None else self.functions[function].calls
+        size = 0
+        for name in calls:
+            callee = self.functions.get(name)
+            if callee is not None and name not in exclude:
+                size = max(size, 2 * len(callee.params) + (2 if callee.returns else 0))
+        return size
+
+    def initializers(self):
+        """
+            Module level assignments the static allocation already performs:
+            the first assignment of a global, when it is a constant (a .WORD)
+            or a zero filled array (a zeroed .BLOCK).
+        """
+        body = {id(statement) for statement in self.__module.body}
+        seen = set()
+        result = set()
+        for node in self.global_assignments:
+            name = node.targets[0].id
+            if name in seen:
+                continue
+            seen.add(name)
+            if id(node) not in body:
+                continue
+            value = node.value
+            if isinstance(value, ast.Constant) or is_array_init(value) and value.left.elts[0].value == 0:
+                result.add(id(node))
+        return result
+
+    def forget_read(self, name, function = None):
+        """A load of name was replaced by its value, in a function or the top level"""
+        reads = self.top_level_reads if function is None else self.functions[function].reads
+        reads[name] -= 1
+
+    ####
+    ## Walk
+    ####
+
+    def visit_FunctionDef(self, node):
+        if self.__function is not None:
+            raise ValueError(f'Nested function definitions are not supported: {node.name}')
+        self.__function = FunctionSummary(node)
+        self.functions[node.name] = self.__function
+        # the decorators are not part of the body
+        for statement in node.body:
+            self.visit(statement)
+        self.__function = None
+
+    def visit_Global(self, node):
+        if self.__function is not None:
+            self.__function.declared_globals.update(node.names)
+
+    def visit_Assign(self, node):
+        if len(node.targets) != 1:
+            raise ValueError("Only unary assignments are supported")
+        target = node.targets[0]
+        if isinstance(target, ast.Name):
+            self.__assigned(target.id, node)
+        elif isinstance(target, ast.Subscript):
+            self.__stored(node)
+        self.generic_visit(node)
+
+    def visit_AugAssign(self, node):
+        if isinstance(node.target, ast.Subscript):
+            self.__stored(node)
+        if isinstance(node.target, ast.Name):
+            self.__assigned(node.target.id, None)
+            if self.__function is None or node.target.id in self.__function.declared_globals:
+                self.global_updates.append(node)
+                if self.__function is not None:
+                    self.__function.global_assignments.append(node)
+        self.generic_visit(node)
+
+    def visit_Return(self, node):
+        if self.__function is not None and node.value is not None:
+            self.__function.returns = True
+        self.generic_visit(node)
+
+    def visit_Name(self, node):
+        if isinstance(node.ctx, ast.Load):
+            reads = self.__function.reads if self.__function is not None else self.top_level_reads
+            reads[node.id] = reads.get(node.id, 0) + 1
+
+    def visit_Call(self, node):
+        if isinstance(node.func, ast.Name):
+            (self.__function.calls if self.__function is not None else self.top_level_calls).append(node.func.id)
+        for arg in node.args:
+            self.visit(arg)
+
+    def __stored(self, node):
+        self.element_stores.append((self.__function.name if self.__function is not None else None, node))
+
+    def __assigned(self, name, node):
+        function = self.__function
+        if function is not None:
+            function.assigned.add(name)
+            if name not in function.declared_globals:
+                if name not in function.params:
+                    function.locals.setdefault(name, node)
+                    if node is not None:
+                        function.local_assignments.append(node)
+                return
+            self.assigned_in_functions.add(name)
+            if node is not None:
+                function.global_assignments.append(node)
+        else:
+            self.assignment_counts[name] = self.assignment_counts.get(name, 0) + 1
+        if node is not None:
+            self.global_assignments.append(node)
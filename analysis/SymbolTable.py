@@ -0,0 +1,122 @@
+"""
+    Symbols of the generated program. Pep/9 symbols have at most 8
+    characters, longer python names get a truncated label with a counter.
+    Labels only depend on the order of the definitions, so compiling the
+    same source twice gives the same program.
+"""
+
+MAX_LENGTH = 8
+
+# kinds of global symbols, in the order the static memory allocates them
+GLOBAL = 'global'   # .BLOCK 2
+CONSTANT = 'const'  # .WORD value
+EQUATE = 'equate'   # .EQUATE value, private constants
+ARRAY = 'array'     # .BLOCK size, 1 or 2 bytes per element
+KINDS = (GLOBAL, CONSTANT, EQUATE, ARRAY)
+
+def memo_tables(function):
+    """Names of the tables of a @memo function: its results, and whether each one is known"""
+    return f'{function}.values', f'{function}.known'
+
+class Symbol():
+    """One global name of the python program"""
+    __slots__ = ('name', 'kind', 'value', 'size', 'element', 'label')
+
+    def __init__(self, name, kind, value = None, size = 2, element = 2) -> None:
+        self.name = name
+        self.kind = kind
+        self.value = value      # initial value of constants and .EQUATEs
+        self.size = size        # bytes
+        self.element = element  # bytes per element of an array
+        self.label = None       # assembly symbol, set by assign_labels()
+
+    def __repr__(self):
+        return f'Symbol({self.name} -> {self.label}: {self.kind})'
+
+class SymbolTable():
+
+    def __init__(self, reserved = (), outer = frozenset()) -> None:
+        self.symbols = {}           # name -> Symbol, in definition order
+        self.__taken = set(reserved) # labels in use, function names and the entry point included
+        self.__fixed = set(reserved) # the reserved labels and those of the symbols, the ones a scope avoids
+        self.__outer = outer        # fixed labels of the table a scope comes from, shared and not copied
+        self.__counters = {}        # truncated base -> last counter used
+        self.removed = set()        # dead globals, their assignments are not generated
+
+    def __contains__(self, name):
+        return name in self.symbols
+
+    def __getitem__(self, name):
+        return self.symbols[name]
+
+    def is_removed(self, name):
+        return name in self.removed
+
+    def define(self, name, kind, value = None, size = 2, element = 2):
+        """Record of name, the first definition decides its kind"""
+        symbol = self.symbols.get(name)
+        if symbol is None:
+            symbol = self.symbols[name] = Symbol(name, kind, value, size, element)
+        elif kind is ARRAY:
+            if symbol.kind is not ARRAY:
+                raise ValueError(f'{name} is used both as a variable and as an array')
+            symbol.size = max(symbol.size, size)
+        return symbol
+
+    def define_hidden(self, name, base, kind, size = 2):
+        """Symbol the python program does not name, its label is made from base"""
+        symbol = self.define(name, kind, size = size)
+        if symbol.label is None:
+            symbol.label = self.unique(base)
+            self.__fixed.add(symbol.label)
+        return symbol
+
+    def of_kind(self, kind):
+        return [s for s in self.symbols.values() if s.kind is kind]
+
+    def assign_labels(self):
+        """Give every symbol its label, names that fit keep theirs"""
+        pending = []
+        for symbol in self.symbols.values():
+            if symbol.label is not None:
+                continue
+            if len(symbol.name) <= MAX_LENGTH and symbol.name not in self.__taken:
+                symbol.label = symbol.name
+                self.__taken.add(symbol.name)
+            else:
+                pending.append(symbol)
+        # shortened names come last, they cannot take the label of a name that fits
+        for symbol in pending:
+            symbol.label = self.unique(symbol.name)
+        self.__fixed.update(symbol.label for symbol in self.symbols.values())
+
+    def scope(self):
+        """
+            Empty table a function frame makes its .EQUATE labels in on its
+            own. It only avoids the labels of the symbols and the reserved
+            ones: linking renames the frame labels for the program, so the
+            frames of the other functions do not matter.
+        """
+        return SymbolTable(outer = self.__fixed)
+
+    def label(self, name):
+        """Assembly symbol of a global name, names that are not defined are used as is"""
+        symbol = self.symbols.get(name)
+        return symbol.label if symbol is not None else name
+
+    def unique(self, name):
+        """New label made from name, used for the .EQUATEs of the function frames too"""
+        base = name[:MAX_LENGTH]
+        if base not in self.__taken and base not in self.__outer:
+            self.__taken.add(base)
+            return base
+        counter = self.__counters.get(base, 1)
+        while True:
+            counter += 1
+            suffix = str(counter)
+            label = base[:MAX_LENGTH - len(suffix)] + suffix
+            if label not in self.__taken and label not in self.__outer:
+                break
+        self.__counters[base] = counter
+        self.__taken.add(label)
+        return label
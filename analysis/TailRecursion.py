@@ -0,0 +1,85 @@
+"""
+    Self calls of a function that do not need a new frame. return f(..)
+    is a tail call. When every return that calls f is return x op f(..)
+    (or return f(..) op x) with the same op, + or *, the pending
+    operations can be collected in an accumulator instead: both wrap to 16
+    bits, so they stay associative and commutative. The accumulator computes
+    x before the recursive call, so in f(..) op x it may only read what the
+    recursion cannot change.
+"""
+
+import ast
+from analysis.CallGraph import has_side_effects
+
+IDENTITY = {ast.Add: 0, ast.Mult: 1}
+
+class TailRecursion():
+
+    def __init__(self, node, analysis, enabled = True) -> None:
+        self.name = node.name
+        self.analysis = analysis
+        self.tail_calls = {}    # id of a return -> self call it returns
+        self.accumulated = {}   # id of a return -> (self call, other operand)
+        self.operator = None    # operator of the accumulator, None without one
+        if enabled:
+            self.__analyze(node)
+
+    @property
+    def eliminates(self):
+        return bool(self.tail_calls or self.accumulated)
+
+    @property
+    def identity(self):
+        return IDENTITY[type(self.operator)]
+
+    ####
+    ## Helper functions
+    ####
+
+    def __analyze(self, node):
+        calls = [n for n in ast.walk(node) if self.__is_self_call(n)]
+        returns = [n for n in ast.walk(node) if isinstance(n, ast.Return)]
+        handled = 0
+        operators = set()
+        accumulated = {}
+        for statement in returns:
+            value = statement.value
+            if self.__is_self_call(value) and not self.__calls_self(value.args):
+                self.tail_calls[id(statement)] = value
+                handled += 1
+            elif isinstance(value, ast.BinOp) and type(value.op) in IDENTITY:
+                for call, other, first in ((value.left, value.right, True), (value.right, value.left, False)):
+                    if not self.__is_self_call(call) or self.__calls_self(call.args) or self.__calls_self([other]):
+                        continue
+                    # in f(..) op x, x is computed after the whole recursion
+                    if first and not self.__unchanged_by_recursion(other):
+                        continue
+                    accumulated[id(statement)] = (call, other)
+                    operators.add(type(value.op))
+                    handled += 1
+                    break
+        # the accumulator changes every return, so no self call may be left
+        if accumulated and len(operators) == 1 and handled == len(calls) and all(r.value is not None for r in returns):
+            self.accumulated = accumulated
+            self.operator = operators.pop()()
+
+    def __unchanged_by_recursion(self, node):
+        """node has the same value and effects before and after the recursive call"""
+        if has_side_effects(node):
+            return False
+        summary = self.analysis.functions[self.name]
+        names = {n.id for n in ast.walk(node) if isinstance(n, ast.Name)} - {n.func.id for n in ast.walk(node) if isinstance(n, ast.Call)}
+        # constants, parameters and locals, a private constant is an .EQUATE
+        if all(not summary.reads_global(name) or name[0] == '_' for name in names):
+            return True
+        # no global can change while the recursion runs, an element store needs no global declaration
+        targets = [node.targets[0] if isinstance(node, ast.Assign) else node.target for function, node in self.analysis.element_stores if function == self.name]
+        if any(summary.reads_global(target.value.id) for target in targets):
+            return False
+        return not summary.declared_globals and self.analysis.calls_only_pure(self.name)
+
+    def __is_self_call(self, node):
+        return isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == self.name
+
+    def __calls_self(self, nodes):
+        return any(self.__is_self_call(n) for node in nodes for n in ast.walk(node))
@@ -0,0 +1,31 @@
+"""
+    Compile time of every program under pyperf (calibration, worker
+    processes, outlier handling). Needs the pyperf package of the Pipfile:
+
+        python -m benchmarks.CompileTime -o before.json
+        python -m benchmarks.CompileTime -o after.json
+        python -m pyperf compare_to before.json after.json
+"""
+
+import ast
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pyperf
+from benchmarks.Runner import sample_programs, stress_programs
+from compiler import Compiler
+
+def compile_once(source):
+    Compiler().generate('<benchmark>', ast.parse(source))
+
+def main():
+    runner = pyperf.Runner()
+    runner.metadata['description'] = 'Python to Pep/9 compile time'
+    for name, source, _ in sample_programs() + stress_programs(1):
+        runner.bench_func(name, compile_once, source)
+
+if __name__ == '__main__':
+    main()
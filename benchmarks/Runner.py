@@ -0,0 +1,201 @@
+"""
+    Benchmark harness: compiles every sample (and the generated stress
+    programs), runs them on the simulator when an input is known and stores
+    the metrics as JSON, so two commits can be compared.
+
+        python -m benchmarks.Runner run -o before.json
+        python -m benchmarks.Runner run -o after.json
+        python -m benchmarks.Runner compare before.json after.json
+"""
+
+import argparse
+import ast
+import glob
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.StressPrograms import STRESS_PROGRAMS
+from compiler import Compiler, compiler_version
+from optimizers.Inliner import DEFAULT_BUDGET
+from simulator.Pep9 import AssemblerError, CPU, SimulationError, assemble
+
+SAMPLE_DIRS = ['1_global', '2_mem_alloc', '3_conditionals', '4_function_calls', '5_arrays']
+INPUTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'inputs.json')
+
+# metrics that only change when the generated code changes, any increase is a regression
+DETERMINISTIC = ('emitted_instructions', 'size_bytes', 'executed_instructions', 'cycles')
+# measured metrics, compared with a tolerance
+MEASURED = ('compile_seconds', 'peak_memory_kb')
+
+####
+## Collecting the programs
+####
+
+def sample_programs():
+    """(name, source, input or None) of every sample, the name is its path under _samples"""
+    with open(INPUTS_FILE) as f:
+        inputs = json.load(f)
+    programs = []
+    for directory in SAMPLE_DIRS:
+        for path in sorted(glob.glob(os.path.join(ROOT, '_samples', directory, '*.py'))):
+            name = os.path.relpath(path, os.path.join(ROOT, '_samples')).replace(os.sep, '/')
+            with open(path) as f:
+                programs.append((name, f.read(), inputs.get(name)))
+    return programs
+
+def stress_programs(scale):
+    return [(name, generate(scale), stdin) for name, (generate, stdin) in STRESS_PROGRAMS.items()]
+
+####
+## Measuring
+####
+
+def measure(source, stdin, repeat, max_steps, options):
+    """Metrics of one program, 'error' is set when it does not compile or run"""
+    result = {}
+    try:
+        times = []
+        for _ in range(repeat):
+            root = ast.parse(source)
+            start = time.perf_counter()
+            program = Compiler(**options).generate('<benchmark>', root)
+            times.append(time.perf_counter() - start)
+        # peak memory on a separate run, tracing slows the compiler down
+        tracemalloc.start()
+        Compiler(**options).generate('<benchmark>', ast.parse(source))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    except Exception as e:
+        return {'error': f'compile: {type(e).__name__}: {e}'}
+    result['compile_seconds'] = min(times)
+    result['compile_seconds_median'] = statistics.median(times)
+    result['peak_memory_kb'] = round(peak / 1024, 1)
+    result['emitted_instructions'] = sum(1 for i in program if i.is_code)
+    result['size_bytes'] = sum(i.size() for i in program)
+    if stdin is None:
+        return result
+    try:
+        execution = CPU(assemble(program), stdin, max_steps).run()
+    except (AssemblerError, SimulationError) as e:
+        result['error'] = f'run: {e}'
+        return result
+    result['executed_instructions'] = execution.instructions
+    result['cycles'] = execution.cycles
+    result['output'] = execution.output
+    return result
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_suite(args):
+    programs = [] if args.stress_only else sample_programs()
+    if args.stress_scale > 0:
+        programs += stress_programs(args.stress_scale)
+    if args.filter:
+        programs = [p for p in programs if args.filter in p[0]]
+    options = {'peephole': not args.no_peephole, 'fold_constants': not args.no_fold, 'prune': not args.no_prune, 'inline_budget': args.inline_budget, 'optimize_loops': not args.no_loop_opt, 'registers': not args.no_registers, 'branches': not args.no_branch_opt, 'byte_arrays': not args.no_byte_arrays, 'tail_calls': not args.no_tail_calls}
+    benchmarks = {}
+    for name, source, stdin in programs:
+        benchmarks[name] = measure(source, stdin, args.repeat, args.max_steps, options)
+        metrics = benchmarks[name]
+        summary = metrics.get('error') or f'{metrics["compile_seconds"] * 1000:8.2f} ms  {metrics["emitted_instructions"]:6} instr  {metrics.get("executed_instructions", "-")} executed'
+        print(f'{name:40} {summary}', file=sys.stderr)
+    results = {
+        'compiler_version': compiler_version(),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'options': options,
+        'repeat': args.repeat,
+        'stress_scale': args.stress_scale,
+        'benchmarks': benchmarks,
+    }
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    return 0
+
+####
+## Comparing two result files
+####
+
+def compare(args):
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    print(f'base: {base.get("commit")} ({base.get("compiler_version")})  new: {new.get("commit")} ({new.get("compiler_version")})')
+    regressions = 0
+    for name in sorted(set(base['benchmarks']) | set(new['benchmarks'])):
+        before, after = base['benchmarks'].get(name), new['benchmarks'].get(name)
+        if before is None or after is None:
+            print(f'{name:40} only in {"new" if before is None else "base"}')
+            continue
+        if 'error' in after and 'error' not in before:
+            print(f'{name:40} REGRESSION now fails: {after["error"]}')
+            regressions += 1
+            continue
+        if before.get('output') != after.get('output') and 'output' in before and 'output' in after:
+            print(f'{name:40} REGRESSION output changed: {before["output"]!r} -> {after["output"]!r}')
+            regressions += 1
+        for metric in DETERMINISTIC + MEASURED:
+            if metric not in before or metric not in after:
+                continue
+            old, value = before[metric], after[metric]
+            change = (value - old) / old * 100 if old else 0.0
+            tolerance = 0.0 if metric in DETERMINISTIC else args.threshold
+            flag = ''
+            if change > tolerance:
+                flag = '  REGRESSION'
+                regressions += 1
+            elif change < -tolerance:
+                flag = '  improved'
+            if flag or args.verbose:
+                print(f'{name:40} {metric:22} {old:>12.6g} -> {value:>12.6g} ({change:+.1f}%){flag}')
+    print(f'{regressions} regressions')
+    return 1 if regressions else 0
+
+def main():
+    parser = argparse.ArgumentParser(description='Compiler and generated code benchmarks')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('run', help='measure every program and write JSON results')
+    run.add_argument('-o', '--output', help='result file (default: stdout)')
+    run.add_argument('--repeat', type=int, default=5, help='compilations per program, the fastest one is kept')
+    run.add_argument('--stress-scale', type=int, default=1, help='size multiplier of the generated programs, 0 skips them')
+    run.add_argument('--stress-only', default=False, action='store_true', help='skip the samples')
+    run.add_argument('--filter', help='only programs whose name contains this text')
+    run.add_argument('--max-steps', type=int, default=10_000_000, help='simulated instructions before giving up')
+    run.add_argument('--no-peephole', default=False, action='store_true')
+    run.add_argument('--no-fold', default=False, action='store_true')
+    run.add_argument('--no-prune', default=False, action='store_true')
+    run.add_argument('--inline-budget', type=int, default=DEFAULT_BUDGET)
+    run.add_argument('--no-loop-opt', default=False, action='store_true')
+    run.add_argument('--no-registers', default=False, action='store_true')
+    run.add_argument('--no-branch-opt', default=False, action='store_true')
+    run.add_argument('--no-byte-arrays', default=False, action='store_true')
+    run.add_argument('--no-tail-calls', default=False, action='store_true')
+    diff = commands.add_parser('compare', help='compare two result files, exits with 1 on regressions')
+    diff.add_argument('base')
+    diff.add_argument('new')
+    diff.add_argument('--threshold', type=float, default=10.0, help='tolerated slowdown of measured metrics in percent (default: 10)')
+    diff.add_argument('-v', '--verbose', default=False, action='store_true', help='show unchanged metrics too')
+    args = parser.parse_args()
+    sys.exit(run_suite(args) if args.command == 'run' else compare(args))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+    Generated programs far bigger than the samples, they show how compile
+    time grows with program size. Every generator is deterministic, the
+    same size always gives the same source.
+"""
+
+def many_functions(count):
+    """count small functions with parameters, locals and loops, all called from the top level"""
+    lines = []
+    for i in range(count):
+        lines.append(f'def func{i}(a, b):')
+        lines.append('    total = 0')
+        lines.append('    while a > 0:')
+        lines.append(f'        total = total + b - {i % 7}')
+        lines.append('        a = a - 1')
+        lines.append('    return total')
+        lines.append('')
+    lines.append('n = int(input())')
+    lines.append('result = 0')
+    for i in range(count):
+        lines.append(f'result = result + func{i}(n, {i % 13})')
+    lines.append('print(result)')
+    return '\n'.join(lines) + '\n'
+
+def many_statements(count):
+    """A single top level of count assignments over a handful of globals"""
+    names = ['alpha', 'beta', 'gamma', 'delta', 'epsilon']
+    lines = ['seed = int(input())']
+    for name in names:
+        lines.append(f'{name} = seed')
+    for i in range(count):
+        target = names[i % len(names)]
+        left = names[(i + 1) % len(names)]
+        right = names[(i + 3) % len(names)]
+        lines.append(f'{target} = {left} - {right} + {i % 100}')
+    for name in names:
+        lines.append(f'print({name})')
+    return '\n'.join(lines) + '\n'
+
+def long_names(count):
+    """count globals whose names exceed the 8 characters of a Pep/9 label, all printed so none is pruned"""
+    lines = ['value = int(input())']
+    for i in range(count):
+        lines.append(f'global_counter_number_{i} = value + {i}')
+    for i in range(count):
+        lines.append(f'print(global_counter_number_{i})')
+    return '\n'.join(lines) + '\n'
+
+def nested_loops(depth, body):
+    """depth nested while loops, the innermost one holds body statements"""
+    lines = ['n = int(input())', 'acc = 0']
+    for d in range(depth):
+        lines.append(f'{"    " * d}i{d} = 0')
+        lines.append(f'{"    " * d}while i{d} < n:')
+    indent = '    ' * depth
+    for i in range(body):
+        lines.append(f'{indent}acc = acc + i{depth - 1} - {i % 5}')
+    for d in reversed(range(depth)):
+        lines.append(f'{"    " * (d + 1)}i{d} = i{d} + 1')
+    lines.append('print(acc)')
+    return '\n'.join(lines) + '\n'
+
+# name -> (source generator, program input)
+STRESS_PROGRAMS = {
+    'stress/many_functions': (lambda scale: many_functions(200 * scale), '3'),
+    'stress/many_statements': (lambda scale: many_statements(1000 * scale), '7'),
+    'stress/long_names': (lambda scale: long_names(200 * scale), '11'),
+    'stress/nested_loops': (lambda scale: nested_loops(4, 50 * scale), '2'),
+}
@@ -0,0 +1,93 @@
+import hashlib
+import os
+import tempfile
+
+# suffixes of the entries: emitted programs, and the functions they are made of
+PROGRAM = '.pep'
+FRAGMENT = '.frag'
+SUFFIXES = (PROGRAM, FRAGMENT)
+
+class CompilationCache():
+    """
+        Content addressed cache of emitted programs, stored one file per entry.
+        The key covers the source, the compiler version and the options, so a
+        hit can be returned without parsing anything. The compiled functions
+        of a FragmentCache live next to the programs. Entries are evicted in
+        least recently used order (file mtime) once the cache exceeds max_size.
+    """
+
+    def __init__(self, directory, version, max_size=64 * 1024 * 1024) -> None:
+        self.directory = directory
+        self.version = version
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, source, options='', input_file=''):
+        digest = hashlib.sha256()
+        for part in (self.version, options, input_file, source):
+            digest.update(part.encode())
+            digest.update(b'\0') # separator, so ('ab', 'c') and ('a', 'bc') differ
+        return digest.hexdigest()
+
+    def get(self, key):
+        text = self.read(key)
+        if text is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return text
+
+    def read(self, key, suffix=PROGRAM):
+        """Text of an entry, None when there is none, hits and misses are not counted"""
+        path = self.__path(key, suffix)
+        try:
+            with open(path) as f:
+                text = f.read()
+        except OSError:
+            return None
+        try:
+            os.utime(path) # mark as recently used
+        except OSError:
+            pass
+        return text
+
+    def put(self, key, text, suffix=PROGRAM):
+        os.makedirs(self.directory, exist_ok=True)
+        # write to a temporary file first, concurrent writers of the same key only ever see a complete entry
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+        os.replace(tmp, self.__path(key, suffix))
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_size, returns how many were removed"""
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return 0
+        entries = []
+        total = 0
+        for name in names:
+            if not name.endswith(SUFFIXES):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+            total += stat.st_size
+        removed = 0
+        for _, size, name in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+    def __path(self, key, suffix):
+        return os.path.join(self.directory, key + suffix)
@@ -0,0 +1,53 @@
+import ast
+import hashlib
+from cache.CompilationCache import FRAGMENT
+from ir.Fragment import Fragment
+
+class FragmentCache():
+    """
+        Compiled functions, so a compilation only generates the functions
+        that changed. The key covers the AST of the function after the
+        module passes (inlined bodies, folded constants), what its code
+        depends on outside of it (labels of the globals it names,
+        signatures of its callees), where its statements sit relative to
+        the def line (the source positions of the instructions) and the
+        options. Entries stay in memory
+        and, with a store (a CompilationCache), on disk next to the
+        programs.
+    """
+
+    def __init__(self, store = None, version = '') -> None:
+        self.store = store
+        self.version = store.version if store is not None else version
+        self.hits = 0
+        self.misses = 0
+        self.__fragments = {}
+
+    def key(self, node, dependencies, options = ''):
+        digest = hashlib.sha256()
+        layout = ' '.join(f'{n.lineno - node.lineno}:{n.col_offset}' for n in ast.walk(node) if isinstance(n, ast.stmt))
+        for part in (self.version, options, dependencies, layout, ast.dump(node)):
+            digest.update(part.encode())
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def get(self, key):
+        fragment = self.__fragments.get(key)
+        if fragment is None and self.store is not None:
+            text = self.store.read(key, FRAGMENT)
+            if text is not None:
+                try:
+                    fragment = self.__fragments[key] = Fragment.loads(text)
+                except ValueError:
+                    # a damaged entry is generated again and replaced
+                    fragment = None
+        if fragment is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return fragment
+
+    def put(self, key, fragment):
+        self.__fragments[key] = fragment
+        if self.store is not None:
+            self.store.put(key, fragment.dumps(), FRAGMENT)
@@ -0,0 +1,243 @@
+"""
+    Library entry points: every stage returns its lines instead of printing
+    them, so several compilations can run in the same process (or thread)
+    without sharing stdout.
+"""
+
+import ast
+import functools
+import hashlib
+import os
+from visitors.GlobalVariables import GlobalVariableExtraction
+from visitors.TopLevelProgram import TopLevelProgram
+from visitors.FuncDef import FuncDef
+from generators.StaticMemoryAllocation import StaticMemoryAllocation
+from generators.EntryPoint import EntryPoint
+from generators.Runtime import RuntimeLibrary
+from optimizers.BranchOptimizer import BranchOptimizer
+from optimizers.ConstantFolding import ConstantFolding
+from optimizers.Inliner import DEFAULT_BUDGET, Inliner
+from optimizers.LoopOptimizer import LoopOptimizer
+from analysis.ByteArrays import Annotations, ByteArrays
+from analysis.CallGraph import CallGraph
+from analysis.MemoryFootprint import MemoryFootprint
+from analysis.ProgramAnalysis import ProgramAnalysis, drop_memo_definition
+from analysis.SymbolTable import ARRAY, SymbolTable, memo_tables
+from optimizers.Peephole import PeepholeOptimizer
+from optimizers.RegisterAllocator import RegisterAllocator
+from ir.Instruction import Instruction, Opcode, comment, immediate, program_size
+from profiling.StageProfiler import NoStage
+
+__version__ = '0.3.0'
+
+# source directories whose content defines the generated code
+COMPILER_PACKAGES = ['ir', 'analysis', 'visitors', 'generators', 'optimizers', 'cache']
+
+@functools.lru_cache(maxsize=None)
+def compiler_version():
+    """Version used in cache keys, it changes whenever a compiler source file changes"""
+    root = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256(__version__.encode())
+    files = [os.path.join(root, 'compiler.py')]
+    for package in COMPILER_PACKAGES:
+        directory = os.path.join(root, package)
+        files.extend(os.path.join(directory, n) for n in sorted(os.listdir(directory)) if n.endswith('.py'))
+    for path in files:
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return f'{__version__}+{digest.hexdigest()[:12]}'
+
+class Compiler():
+    """
+        One compilation pipeline. The options change the generated code,
+        report collects what the optimization passes did during the last run.
+        With fragments, the functions that did not change since an earlier
+        run are not generated again. With source_map, mapping holds where
+        the instructions of the last run come from (EntryPoint.source_map).
+    """
+
+    def __init__(self, peephole = True, peephole_rules = None, fold_constants = True, prune = True, inline_budget = DEFAULT_BUDGET, optimize_loops = True, registers = True, branches = True, byte_arrays = True, tail_calls = True, source_comments = False, source_map = False, fragments = None, profiler = None) -> None:
+        self.fold_constants = fold_constants
+        self.optimize_loops = optimize_loops
+        self.registers = registers
+        self.branches = branches
+        self.byte_arrays = byte_arrays
+        self.tail_calls = tail_calls
+        self.inline_budget = inline_budget
+        self.prune = prune
+        self.peephole = peephole
+        self.peephole_rules = peephole_rules
+        # every statement is preceded by its python line as a comment
+        self.source_comments = source_comments
+        self.source_map = source_map
+        # compiled functions kept from one compilation to the next (a FragmentCache), None to generate them all
+        self.fragments = fragments
+        # measures every stage (a StageProfiler), None to measure nothing
+        self.profiler = profiler
+        self.report = []
+        self.mapping = None
+        self.__source = (None, None)    # (module, lines of its source) of the last parse
+
+    def options(self):
+        """Canonical text of the options, used in cache keys"""
+        rules = ','.join(sorted(self.peephole_rules)) if self.peephole_rules else 'all'
+        return f'inline={self.inline_budget};fold={self.fold_constants};loops={self.optimize_loops};regs={self.registers};branches={self.branches};bytes={self.byte_arrays};tail={self.tail_calls};prune={self.prune};peephole={self.peephole};rules={rules};comments={self.source_comments}'
+
+    def parse(self, source, input_file = '<string>'):
+        """ast.parse, the first stage a profile measures"""
+        with self.__stage('parse', input_file) as stage:
+            root_node = stage.ast = ast.parse(source)
+        self.__source = (root_node, source.splitlines())
+        return root_node
+
+    def translate(self, input_file, root_node):
+        """Run all the stages on a parsed module, returns the list of .pep lines"""
+        program = self.generate(input_file, root_node)
+        module, source_lines = self.__source
+        if module is not root_node or not self.source_comments:
+            source_lines = None
+        with self.__stage('emit', input_file) as stage:
+            entry = EntryPoint(program, source_lines)
+            lines = entry.generate_f()
+            self.mapping = entry.source_map(input_file) if self.source_map else None
+            stage.instructions = program
+        return lines
+
+    def generate(self, input_file, root_node):
+        """Run all the stages on a parsed module, returns the whole program as IR instructions"""
+        self.report = []
+        with self.__stage('analysis', input_file) as stage:
+            # x: T = value is x = value for every later stage
+            Annotations().visit(root_node)
+            drop_memo_definition(root_node)
+            # the only walk over the whole module, every later stage queries it
+            analysis = ProgramAnalysis().analyze(root_node)
+            stage.ast = root_node
+        if self.inline_budget:
+            with self.__stage('inlining', input_file) as stage:
+                inliner = Inliner(analysis, self.inline_budget)
+                if inliner.inline(root_node):
+                    # the inlined bodies added locals and globals, the AST is walked once more
+                    analysis = ProgramAnalysis().analyze(root_node)
+                self.report.extend(inliner.report)
+                stage.ast = root_node
+        if self.fold_constants:
+            with self.__stage('folding', input_file) as stage:
+                # the AST is changed in place
+                folding = ConstantFolding(analysis)
+                folding.fold(root_node)
+                self.report.extend(folding.report)
+                stage.ast = root_node
+        if self.optimize_loops:
+            with self.__stage('loops', input_file) as stage:
+                loops = LoopOptimizer(analysis)
+                if loops.optimize(root_node):
+                    # the new variables are locals or globals too
+                    analysis = ProgramAnalysis().analyze(root_node)
+                self.report.extend(loops.report)
+                stage.ast = root_node
+        program = [comment(f'Translating {input_file}')]
+        dead_globals = []
+        if self.prune:
+            with self.__stage('prune', input_file):
+                # after folding, the reads of constants are gone
+                call_graph = CallGraph(analysis)
+                call_graph.prune()
+                dead_globals = call_graph.dead_globals
+                self.report.extend(call_graph.report())
+        if self.byte_arrays:
+            with self.__stage('bytes', input_file):
+                # the values are final, and the dead functions do not store anything anymore
+                byte_arrays = ByteArrays(analysis)
+                byte_arrays.infer()
+                self.report.extend(byte_arrays.report)
+        with self.__stage('globals', input_file) as stage:
+            # function names and the entry point are labels too
+            symbol_table = SymbolTable(reserved = ['tl', *analysis.functions])
+            symbol_table.removed.update(dead_globals)
+            extractor = GlobalVariableExtraction(symbol_table, analysis.byte_arrays)
+            for node in analysis.global_assignments:
+                extractor.visit_Assign(node)
+            symbol_table.assign_labels()
+            for summary in analysis.functions.values():
+                if summary.memo is not None:
+                    values, known = memo_tables(summary.name)
+                    symbol_table.define_hidden(values, f'{summary.name}_v', ARRAY, 2 * summary.memo)
+                    symbol_table.define_hidden(known, f'{summary.name}_k', ARRAY, 2 * summary.memo)
+            memory_alloc = StaticMemoryAllocation(symbol_table)
+            program.append(comment('Branching to top level (tl) instructions'))
+            program.append(Instruction(Opcode.BR, *immediate('tl')))
+            program.extend(memory_alloc.generate())
+            stage.instructions = program
+        runtime = RuntimeLibrary()
+        # loop counters in X, shared like the runtime routines
+        registers = RegisterAllocator() if self.registers else None
+        with self.__stage('functions', input_file) as stage:
+            func_level = FuncDef(symbol_table, analysis, runtime, registers, self.tail_calls)
+            reused, generated = (self.fragments.hits, self.fragments.misses) if self.fragments is not None else (0, 0)
+            for summary in analysis.functions.values():
+                if self.fragments is None:
+                    func_level.visit(summary.node)
+                else:
+                    self.__reuse(func_level, summary.node)
+            if self.fragments is not None:
+                self.report.append(f'fragments: {self.fragments.hits - reused} functions reused, {self.fragments.misses - generated} generated')
+            stage.instructions = func_level.finalize()
+
+        with self.__stage('top_level', input_file) as stage:
+            top_level = TopLevelProgram('tl', symbol_table, analysis, runtime, registers, func_level.next_id)
+            top_level.visit(root_node)
+            if registers is not None:
+                self.report.extend(registers.report)
+            top = stage.instructions = top_level.finalize()
+
+        # routines are linked in front of the top level once every visitor has asked for them
+        instructions = func_level.finalize() + runtime.generate() + [comment('Top Level instructions')] + top
+        if self.branches:
+            with self.__stage('branches', input_file) as stage:
+                # the loops still have the layout the visitors gave them
+                branches = BranchOptimizer(keep_labels = ['tl'])
+                instructions = stage.instructions = branches.optimize(instructions)
+                self.report.append(f'branches: {branches.rotated} loops rotated, {branches.threaded} jumps threaded, {branches.compares} compares removed')
+        if self.peephole:
+            with self.__stage('peephole', input_file) as stage:
+                optimizer = PeepholeOptimizer(self.peephole_rules, keep_labels = ['tl'])
+                instructions = stage.instructions = optimizer.optimize(instructions)
+                self.report.append(f'peephole: removed {optimizer.removed} instructions')
+        program.extend(instructions)
+        self.report.append(f'size: {program_size(program)} bytes')
+        with self.__stage('memory', input_file):
+            # the stack grows down towards the program, a collision corrupts it silently at run time
+            footprint = MemoryFootprint(program)
+            self.report.extend(footprint.report())
+            footprint.check()
+        return program
+
+    def __reuse(self, func_level, node):
+        """Link the function, generated only when the fragments do not have it yet"""
+        key = self.fragments.key(node, func_level.dependencies(node), f'regs={self.registers};tail={self.tail_calls}')
+        fragment = self.fragments.get(key)
+        if fragment is None:
+            fragment = func_level.generate(node)
+            self.fragments.put(key, fragment)
+        func_level.link(fragment, node.lineno)
+
+    def __stage(self, name, input_file):
+        return self.profiler.stage(name, input_file) if self.profiler is not None else NoStage()
+
+def translate(input_file, root_node, **options):
+    return Compiler(**options).translate(input_file, root_node)
+
+def compile_program(source: str, input_file: str = '<string>', **options) -> list[Instruction]:
+    """Compile python source code, returns the program as IR instructions (the simulator runs them as is)"""
+    compiler = Compiler(**options)
+    return compiler.generate(input_file, compiler.parse(source, input_file))
+
+def compile_source(source: str, input_file: str = '<string>', **options) -> str:
+    """Compile python source code, returns the Pep/9 program as one string"""
+    compiler = Compiler(**options)
+    return '\n'.join(compiler.translate(input_file, compiler.parse(source, input_file))) + '\n'
+
+def compile_to(fileobj, source: str, input_file: str = '<string>', **options) -> None:
+    """Compile python source code and write the program to fileobj in a single write"""
+    fileobj.write(compile_source(source, input_file, **options))
@@ -1,16 +1,54 @@
+from ir.Instruction import Opcode
+
 class EntryPoint():
+    """Lowers the intermediate representation to Pep/9 assembly text, the only place text is produced"""
 
-    def __init__(self, instructions) -> None:
+    def __init__(self, instructions, source_lines = None) -> None:
         self.__instructions = instructions
+        # lines of the python source, the code of every statement is preceded by its line as a comment
+        self.__source_lines = source_lines
+        self.__rows = []    # line of the text of every instruction, from 1
 
     def generate(self):
-        print('; Top Level instructions')
-        for label, instr in self.__instructions:
-            s = f'\t\t{instr}' if label == None else f'{str(label+":"):<9}\t{instr}'
-            print(s)
-    
+        return ['; Top Level instructions'] + self.generate_f()
+
     def generate_f(self):
-        for label, instr in self.__instructions:
-            s = f'\t\t{instr}' if label == None else f'{str(label+":"):<9}\t{instr}'
-            print(s)
-    
\ No newline at end of file
+        lines = []
+        self.__rows = []
+        current = None
+        for instr in self.__instructions:
+            if self.__source_lines is not None and instr.line is not None and instr.line != current:
+                current = instr.line
+                lines.append(f'; line {current}: {self.__quote(current)}')
+            label = instr.label
+            if instr.opcode is None and label is None:
+                # comment lines start in the first column
+                lines.append(instr.text())
+            else:
+                s = f'\t\t{instr.text()}' if label == None else f'{str(label+":"):<9}\t{instr.text()}'
+                lines.append(s)
+            self.__rows.append(len(lines))
+        return lines
+
+    def source_map(self, input_file):
+        """
+            Where the code comes from: [line of the text, address, source
+            line, source column] of every instruction with a source
+            position, and the address of every label. The lines of the text
+            are the ones of generate_f.
+        """
+        if len(self.__rows) != len(self.__instructions):
+            self.generate_f()
+        mappings = []
+        labels = {}
+        address = 0
+        for instr, row in zip(self.__instructions, self.__rows):
+            if instr.label is not None and instr.opcode is not Opcode.EQUATE:
+                labels[instr.label] = address
+            if instr.is_code and instr.line is not None:
+                mappings.append([row, address, instr.line, instr.column])
+            address += instr.size()
+        return {'version': 1, 'file': input_file, 'mappings': mappings, 'labels': labels}
+
+    def __quote(self, line):
+        return self.__source_lines[line - 1].strip() if 0 < line <= len(self.__source_lines) else ''
@@ -0,0 +1,192 @@
+"""
+    Runtime routines called by the generated code for the operations Pep/9
+    has no instruction for. Calling convention: left operand in A, right
+    operand in X, result in A. X is clobbered.
+"""
+
+import ast
+from ir.Instruction import Instruction, Opcode, comment, immediate, parse
+
+ROUTINES = {
+    # A * X, shift and add over the 16 bits of the multiplier
+    '_mul': [
+        ('_mul', 'STWA _mula,d'),
+        (None, 'LDWA 0,i'),
+        (None, 'STWA _mulr,d'),
+        (None, 'STWX _mulb,d'),
+        (None, 'LDWX _mulb,d'),
+        (None, 'BRGE _mulp'),
+        # a * b == -a * -b, a positive multiplier runs out of bits early
+        (None, 'NEGX'),
+        (None, 'STWX _mulb,d'),
+        (None, 'LDWA _mula,d'),
+        (None, 'NEGA'),
+        (None, 'STWA _mula,d'),
+        ('_mulp', 'LDWX 16,i'),
+        ('_mull', 'LDWA _mulb,d'),
+        (None, 'BREQ _muld'),
+        (None, 'ANDA 1,i'),
+        (None, 'BREQ _muls'),
+        (None, 'LDWA _mulr,d'),
+        (None, 'ADDA _mula,d'),
+        (None, 'STWA _mulr,d'),
+        ('_muls', 'LDWA _mula,d'),
+        (None, 'ASLA'),
+        (None, 'STWA _mula,d'),
+        (None, 'LDWA _mulb,d'),
+        (None, 'ASRA'),
+        (None, 'STWA _mulb,d'),
+        (None, 'SUBX 1,i'),
+        (None, 'BRNE _mull'),
+        ('_muld', 'LDWA _mulr,d'),
+        (None, 'RET'),
+        ('_mula', '.BLOCK 2'),
+        ('_mulb', '.BLOCK 2'),
+        ('_mulr', '.BLOCK 2'),
+    ],
+    # A // X with python (floor) semantics
+    '_div': [
+        ('_div', 'CALL _dvm'),
+        (None, 'LDWA _dvq,d'),
+        (None, 'RET'),
+    ],
+    # A % X with python semantics, the result has the sign of the divisor
+    '_mod': [
+        ('_mod', 'CALL _dvm'),
+        (None, 'LDWA _dvr,d'),
+        (None, 'RET'),
+    ],
+    # restoring division of the magnitudes, then signs are fixed up to floor semantics
+    '_dvm': [
+        ('_dvm', 'STWA _dva,d'),
+        (None, 'STWX _dvb,d'),
+        (None, 'LDWX _dvb,d'),
+        (None, 'BRNE _dvm0'),
+        (None, 'STOP'), # division by zero ends the program
+        ('_dvm0', 'LDWA _dva,d'),
+        (None, 'BRGE _dv1'),
+        (None, 'NEGA'),
+        ('_dv1', 'STWA _dvn,d'),
+        (None, 'LDWA _dvb,d'),
+        (None, 'BRGE _dv2'),
+        (None, 'NEGA'),
+        ('_dv2', 'STWA _dvd,d'),
+        (None, 'LDWA 0,i'),
+        (None, 'STWA _dvq,d'),
+        (None, 'STWA _dvr,d'),
+        (None, 'LDWX 16,i'),
+        ('_dv3', 'LDWA _dvn,d'),
+        (None, 'ASLA'),
+        (None, 'STWA _dvn,d'),
+        (None, 'LDWA _dvr,d'),
+        (None, 'ROLA'),
+        (None, 'STWA _dvr,d'),
+        (None, 'LDWA _dvq,d'),
+        (None, 'ASLA'),
+        (None, 'STWA _dvq,d'),
+        (None, 'LDWA _dvr,d'),
+        (None, 'SUBA _dvd,d'),
+        (None, 'BRC _dv4'), # no borrow: remainder >= divisor
+        (None, 'BR _dv5'),
+        ('_dv4', 'STWA _dvr,d'),
+        (None, 'LDWA _dvq,d'),
+        (None, 'ORA 1,i'),
+        (None, 'STWA _dvq,d'),
+        ('_dv5', 'SUBX 1,i'),
+        (None, 'BRNE _dv3'),
+        # the truncated remainder has the sign of the dividend
+        (None, 'LDWA _dva,d'),
+        (None, 'BRGE _dv6'),
+        (None, 'LDWA _dvr,d'),
+        (None, 'NEGA'),
+        (None, 'STWA _dvr,d'),
+        ('_dv6', 'LDWA _dvb,d'),
+        (None, 'BRGE _dv7'),
+        (None, 'LDWA _dva,d'),
+        (None, 'BRLT _dv9'),
+        (None, 'BR _dv8'),
+        ('_dv7', 'LDWA _dva,d'),
+        (None, 'BRGE _dv9'),
+        # signs differ: negative quotient, rounded down when there is a remainder
+        ('_dv8', 'LDWA _dvq,d'),
+        (None, 'NEGA'),
+        (None, 'STWA _dvq,d'),
+        (None, 'LDWA _dvr,d'),
+        (None, 'BREQ _dv9'),
+        (None, 'ADDA _dvb,d'),
+        (None, 'STWA _dvr,d'),
+        (None, 'LDWA _dvq,d'),
+        (None, 'SUBA 1,i'),
+        (None, 'STWA _dvq,d'),
+        ('_dv9', 'RET'),
+        ('_dva', '.BLOCK 2'),
+        ('_dvb', '.BLOCK 2'),
+        ('_dvn', '.BLOCK 2'),
+        ('_dvd', '.BLOCK 2'),
+        ('_dvq', '.BLOCK 2'),
+        ('_dvr', '.BLOCK 2'),
+    ],
+}
+
+# routines calling other routines
+DEPENDENCIES = {'_div': ['_dvm'], '_mod': ['_dvm']}
+
+OPERATORS = {ast.Mult: '_mul', ast.FloorDiv: '_div', ast.Mod: '_mod'}
+
+class RuntimeLibrary():
+    """Keeps track of the routines the program calls, only those get linked"""
+
+    def __init__(self) -> None:
+        self.__used = []
+
+    def use(self, operator):
+        """Returns the label to CALL for a multiplicative ast operator"""
+        name = OPERATORS[type(operator)]
+        self.link(name)
+        return name
+
+    @property
+    def routines(self):
+        """Names of the routines in use, in the order they are linked"""
+        return list(self.__used)
+
+    def link(self, name):
+        """Link a routine by name, with the routines it calls"""
+        if name in self.__used:
+            return
+        self.__used.append(name)
+        for dependency in DEPENDENCIES.get(name, []):
+            self.link(dependency)
+
+    def generate(self) -> list[Instruction]:
+        instructions = []
+        if self.__used:
+            instructions.append(comment('*** runtime library'))
+        for name in self.__used:
+            instructions.extend(parse(instr, label) for label, instr in ROUTINES[name])
+        return instructions
+
+####
+## Strength reduction
+####
+
+def power_of_two(node):
+    """Exponent k when node is the constant 2**k (k >= 0), None otherwise"""
+    if isinstance(node, ast.Constant) and type(node.value) is int and node.value > 0 and node.value & (node.value - 1) == 0:
+        return node.value.bit_length() - 1
+    return None
+
+def reduce_power_of_two(operator, shift, register = 'A'):
+    """(opcode, operand) of the instructions computing 'register operator 2**shift' in place"""
+    match operator:
+        case ast.Mult():
+            if shift >= 16:
+                return [(Opcode[f'LDW{register}'], immediate(0))]
+            return [(Opcode[f'ASL{register}'], None)] * shift
+        case ast.FloorDiv():
+            # an arithmetic shift rounds towards minus infinity, exactly like //
+            return [(Opcode[f'ASR{register}'], None)] * min(shift, 15)
+        case ast.Mod():
+            # two's complement masking gives the python result for a positive modulus
+            return [(Opcode[f'AND{register}'], immediate((1 << shift) - 1 & 0xFFFF))] if shift < 16 else []
+    raise ValueError(f'Unsupported binary operator: {operator}')
@@ -1,23 +1,22 @@
+from analysis.SymbolTable import ARRAY, CONSTANT, EQUATE, GLOBAL
+from ir.Instruction import Instruction, Opcode, comment
 
 class StaticMemoryAllocation():
 
-    def __init__(self, global_vars: dict(), global_vars_const: list(), global_vars_priv: list(), results_arrays: list()) -> None:
-        self.__global_vars: dict() = global_vars
-        self.__global_vars_const = global_vars_const
-        self.__global_vars_priv = global_vars_priv
-        self.__results_arrays = results_arrays
+    def __init__(self, symbol_table) -> None:
+        self.__symbol_table = symbol_table
 
     def generate(self):
-        print('; Allocating Global (static) memory')
-        for n in self.__global_vars:
-            print(f'{str(n+":"):<9}\t.BLOCK 2') # reserving memory
+        instructions = [comment('Allocating Global (static) memory')]
+        for s in self.__symbol_table.of_kind(GLOBAL):
+            instructions.append(Instruction(Opcode.BLOCK, 2, label=s.label)) # reserving memory
 
-        for n in self.__global_vars_const:
-            print(f'{str(n[0]+":"):<9}\t.WORD {n[1]}') # allocating constant value to memory, n[0] is the var name, n[1] is const val
+        for s in self.__symbol_table.of_kind(CONSTANT):
+            instructions.append(Instruction(Opcode.WORD, s.value, label=s.label)) # allocating constant value to memory
 
-        for n in self.__global_vars_priv:
-            print(f'{str(n[0]+":"):<9}\t.EQUATE {n[1]}') # allocating constant value to memory, n[0] is the var name, n[1] is const val
+        for s in self.__symbol_table.of_kind(EQUATE):
+            instructions.append(Instruction(Opcode.EQUATE, s.value, label=s.label)) # private constants take no memory
 
-        for n in self.__results_arrays: 
-            print(f'{str(n[0]+":"):<9}\t.BLOCK {n[1].value*2}') # allocating constant value to memory, n[0] is the var name, n[1] is const val
- 
\ No newline at end of file
+        for s in self.__symbol_table.of_kind(ARRAY):
+            instructions.append(Instruction(Opcode.BLOCK, s.size, label=s.label)) # zeroed memory for the elements
+        return instructions
@@ -0,0 +1,68 @@
+"""
+    Code of one function, generated on its own. Its .EQUATE symbols and
+    numbered labels are local: linking renames them for the program, so a
+    fragment fits any program where the function and what it depends on
+    did not change.
+"""
+
+import json
+import re
+from ir.Instruction import Instruction, Mode, Opcode
+
+# source lines in the report, they move with the function
+LINE = re.compile(r'\bline (\d+)')
+
+class Fragment():
+
+    def __init__(self, instructions, symbols, labels, ids, routines, report, line) -> None:
+        self.instructions = instructions
+        self.symbols = symbols      # (label, base) of the .EQUATEs, in the order the frame made them
+        self.labels = labels        # numbered code labels, name_N with N < ids
+        self.ids = ids              # label numbers used
+        self.routines = routines    # runtime routines called
+        self.report = report        # what the register allocator did
+        self.line = line            # first line of the function
+
+    def relocate(self, names, line):
+        """Copy of the instructions with the local symbols renamed, names maps old -> new, when the function starts at line"""
+        delta = line - self.line
+        result = []
+        for ins in self.instructions:
+            ins = ins.copy()
+            if ins.line is not None:
+                ins.line += delta
+            if ins.label is not None:
+                ins.label = names.get(ins.label, ins.label)
+            if ins.symbol is not None:
+                ins.operand = names.get(ins.operand, ins.operand)
+            if ins.comment is not None and '#' in ins.comment:
+                # the frame comments list the .EQUATEs: push #fx #fy
+                ins.comment = ' '.join('#' + names.get(word[1:], word[1:]) if word.startswith('#') else word for word in ins.comment.split(' '))
+            result.append(ins)
+        return result
+
+    def report_at(self, line):
+        """Report lines of the function when it starts at line"""
+        delta = line - self.line
+        return [LINE.sub(lambda m: f'line {int(m.group(1)) + delta}', text) for text in self.report]
+
+    ####
+    ## Cache entries
+    ####
+
+    def dumps(self):
+        instructions = [[i.opcode.value if i.opcode is not None else None, i.operand, i.mode.value if i.mode is not None else None, i.label, i.comment, i.line, i.column]
+                        for i in self.instructions]
+        return json.dumps({'instructions': instructions, 'symbols': self.symbols, 'labels': self.labels, 'ids': self.ids,
+                           'routines': self.routines, 'report': self.report, 'line': self.line})
+
+    @staticmethod
+    def loads(text):
+        """Fragment of a cache entry, ValueError when the entry is damaged"""
+        try:
+            data = json.loads(text)
+            instructions = [Instruction(Opcode(opcode) if opcode is not None else None, operand, Mode(mode) if mode is not None else None, label, note, line, column)
+                            for opcode, operand, mode, label, note, line, column in data['instructions']]
+            return Fragment(instructions, [tuple(s) for s in data['symbols']], data['labels'], data['ids'], data['routines'], data['report'], data['line'])
+        except (KeyError, TypeError) as e:
+            raise ValueError(f'damaged fragment: {e}')
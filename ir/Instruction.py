@@ -0,0 +1,200 @@
+"""
+    Intermediate representation shared by the visitors, the optimizers and
+    the simulator. An instruction keeps its operand as a number or a symbol
+    and its addressing mode apart, assembly text only exists after
+    EntryPoint lowers the program.
+"""
+
+import enum
+
+class Opcode(enum.Enum):
+    # unary instructions
+    STOP = 'STOP'
+    RET = 'RET'
+    NOP1 = 'NOP1'
+    NOTA = 'NOTA'
+    NOTX = 'NOTX'
+    NEGA = 'NEGA'
+    NEGX = 'NEGX'
+    ASLA = 'ASLA'
+    ASLX = 'ASLX'
+    ASRA = 'ASRA'
+    ASRX = 'ASRX'
+    ROLA = 'ROLA'
+    ROLX = 'ROLX'
+    RORA = 'RORA'
+    RORX = 'RORX'
+    # branches
+    BR = 'BR'
+    BRLE = 'BRLE'
+    BRLT = 'BRLT'
+    BREQ = 'BREQ'
+    BRNE = 'BRNE'
+    BRGE = 'BRGE'
+    BRGT = 'BRGT'
+    BRV = 'BRV'
+    BRC = 'BRC'
+    CALL = 'CALL'
+    # instructions with an addressing mode
+    DECI = 'DECI'
+    DECO = 'DECO'
+    HEXO = 'HEXO'
+    STRO = 'STRO'
+    ADDSP = 'ADDSP'
+    SUBSP = 'SUBSP'
+    ADDA = 'ADDA'
+    ADDX = 'ADDX'
+    SUBA = 'SUBA'
+    SUBX = 'SUBX'
+    ANDA = 'ANDA'
+    ANDX = 'ANDX'
+    ORA = 'ORA'
+    ORX = 'ORX'
+    CPWA = 'CPWA'
+    CPWX = 'CPWX'
+    CPBA = 'CPBA'
+    CPBX = 'CPBX'
+    LDWA = 'LDWA'
+    LDWX = 'LDWX'
+    LDBA = 'LDBA'
+    LDBX = 'LDBX'
+    STWA = 'STWA'
+    STWX = 'STWX'
+    STBA = 'STBA'
+    STBX = 'STBX'
+    # directives
+    BLOCK = '.BLOCK'
+    WORD = '.WORD'
+    BYTE = '.BYTE'
+    EQUATE = '.EQUATE'
+    END = '.END'
+
+class Mode(enum.Enum):
+    I = 'i'
+    D = 'd'
+    N = 'n'
+    S = 's'
+    SF = 'sf'
+    X = 'x'
+    SX = 'sx'
+    SFX = 'sfx'
+
+UNARY = frozenset({Opcode.STOP, Opcode.RET, Opcode.NOP1, Opcode.NOTA, Opcode.NOTX, Opcode.NEGA, Opcode.NEGX,
+                   Opcode.ASLA, Opcode.ASLX, Opcode.ASRA, Opcode.ASRX, Opcode.ROLA, Opcode.ROLX, Opcode.RORA, Opcode.RORX})
+CONDITIONAL = frozenset({Opcode.BRLE, Opcode.BRLT, Opcode.BREQ, Opcode.BRNE, Opcode.BRGE, Opcode.BRGT, Opcode.BRV, Opcode.BRC})
+BRANCHES = CONDITIONAL | {Opcode.BR, Opcode.CALL}
+UNCONDITIONAL = frozenset({Opcode.BR, Opcode.RET, Opcode.STOP})
+DIRECTIVES = frozenset({Opcode.BLOCK, Opcode.WORD, Opcode.BYTE, Opcode.EQUATE, Opcode.END})
+
+MODES = {m.value: m for m in Mode}
+
+class Instruction():
+    """
+        One line of the program. opcode is None for a line that only holds a
+        comment, operand is an int or a symbol, mode is None for unary
+        instructions and directives. line and column are the position of
+        the python statement it comes from, None for generated code
+        (runtime routines, static memory).
+    """
+    __slots__ = ('opcode', 'operand', 'mode', 'label', 'comment', 'line', 'column')
+
+    def __init__(self, opcode, operand = None, mode = None, label = None, comment = None, line = None, column = None) -> None:
+        self.opcode = opcode
+        self.operand = operand
+        self.mode = mode
+        self.label = label
+        self.comment = comment
+        self.line = line
+        self.column = column
+
+    @property
+    def is_code(self):
+        """True for an instruction the CPU executes"""
+        return self.opcode is not None and self.opcode not in DIRECTIVES
+
+    @property
+    def symbol(self):
+        """Symbol used as operand, None for a number"""
+        return self.operand if isinstance(self.operand, str) else None
+
+    def size(self):
+        """Bytes the line occupies in memory"""
+        if self.opcode is None:
+            return 0
+        if self.opcode in UNARY:
+            return 1
+        match self.opcode:
+            case Opcode.BLOCK:
+                return self.operand
+            case Opcode.WORD:
+                return 2
+            case Opcode.BYTE:
+                return 1
+            case Opcode.EQUATE | Opcode.END:
+                return 0
+        return 3
+
+    def copy(self):
+        return Instruction(self.opcode, self.operand, self.mode, self.label, self.comment, self.line, self.column)
+
+    def at(self, other):
+        """Give the instruction the source position of other, returns it"""
+        self.line = other.line
+        self.column = other.column
+        return self
+
+    def text(self):
+        """Assembly text of the line, without its label"""
+        if self.opcode is None:
+            return f'; {self.comment}'
+        text = self.opcode.value
+        if self.operand is not None:
+            # branches are written without their (immediate) addressing mode
+            mode = self.mode if self.mode is not None and not (self.opcode in BRANCHES and self.mode is Mode.I) else None
+            text = f'{text} {self.operand},{mode.value}' if mode is not None else f'{text} {self.operand}'
+        if self.comment is not None:
+            text = f'{text}\t; {self.comment}'
+        return text
+
+    def __repr__(self):
+        return f'Instruction({self.label}: {self.text()})' if self.label else f'Instruction({self.text()})'
+
+####
+## Helper functions to build operands, (value, mode) pairs
+####
+
+def immediate(value):
+    return (value, Mode.I)
+
+def direct(symbol):
+    return (symbol, Mode.D)
+
+def stack(offset):
+    return (offset, Mode.S)
+
+def comment(text, label = None):
+    return Instruction(None, label = label, comment = text)
+
+def parse(text, label = None):
+    """Instruction from one line of assembly text (without label), used for hand written routines"""
+    code, _, note = text.partition(';')
+    note = note.strip() or None
+    code = code.strip()
+    if not code:
+        return comment(note, label)
+    parts = code.split(None, 1)
+    opcode = Opcode(parts[0].upper())
+    operand, mode = None, None
+    if len(parts) > 1:
+        value, _, suffix = parts[1].replace(' ', '').rpartition(',')
+        if value:
+            mode = MODES[suffix.lower()]
+        else:
+            value = suffix
+            mode = Mode.I if opcode in BRANCHES else None
+        operand = int(value) if value.lstrip('+-').isdigit() else value
+    return Instruction(opcode, operand, mode, label, note)
+
+def program_size(instructions):
+    """Bytes of memory used by the instructions and directives"""
+    return sum(i.size() for i in instructions)
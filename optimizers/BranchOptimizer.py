@@ -0,0 +1,251 @@
+"""
+    Branch optimizations on the IR instructions, after finalize() and
+    before the peephole optimizer (which cleans up the NOP1 and the
+    branches to the next instruction they leave behind).
+"""
+
+from ir.Instruction import CONDITIONAL, Instruction, Mode, Opcode
+
+# labels the visitors give to a while loop
+LOOP_TEST = 'test_l_'
+LOOP_END = 'end_l_'
+LOOP_BODY = 'body_l_'
+
+# longest loop test (without its branch) copied in front of the loop instead of a BR to the test
+GUARD_SIZE = 4
+
+# conditions on N and Z only, with the condition that holds when they do not
+NEGATED = {Opcode.BRLT: Opcode.BRGE, Opcode.BRGE: Opcode.BRLT, Opcode.BRLE: Opcode.BRGT, Opcode.BRGT: Opcode.BRLE,
+           Opcode.BREQ: Opcode.BRNE, Opcode.BRNE: Opcode.BREQ}
+
+# instructions that set N and Z from the value of the register they leave, as CPWr 0,i would
+SETS_A = frozenset({Opcode.LDWA, Opcode.ADDA, Opcode.SUBA, Opcode.ANDA, Opcode.ORA, Opcode.ASLA, Opcode.ASRA, Opcode.NEGA, Opcode.NOTA})
+SETS_X = frozenset({Opcode.LDWX, Opcode.ADDX, Opcode.SUBX, Opcode.ANDX, Opcode.ORX, Opcode.ASLX, Opcode.ASRX, Opcode.NEGX, Opcode.NOTX})
+COMPARES = {Opcode.CPWA: SETS_A, Opcode.CPWX: SETS_X}
+# LDWr 0,i then LDBr: a byte in a cleared register, N and Z are those of the whole register
+BYTE_LOADS = {Opcode.CPWA: (Opcode.LDWA, Opcode.LDBA), Opcode.CPWX: (Opcode.LDWX, Opcode.LDBX)}
+# instructions that change neither the registers nor the status bits
+STORES = frozenset({Opcode.STWA, Opcode.STWX, Opcode.STBA, Opcode.STBX})
+
+class BranchOptimizer():
+    """
+        - loops are rotated: the test moves after the body and branches
+          back while the condition holds, a short test is copied in front
+          of the loop to enter it, so an iteration runs one branch less
+        - branches to a BR go to its target, a BR to a RET or a STOP
+          becomes it, a conditional branch over a BR becomes the opposite
+          branch
+        - a CPWr 0,i is removed when the instruction before it already
+          set N and Z from the same register
+    """
+    RULES = ('rotate_loops', 'thread_jumps', 'compares')
+
+    def __init__(self, keep_labels = ()) -> None:
+        # labels referenced from outside of the optimized instructions
+        self.keep_labels = set(keep_labels)
+        self.rotated = 0
+        self.threaded = 0
+        self.compares = 0
+
+    def optimize(self, instructions: list[Instruction]) -> list[Instruction]:
+        for rule in self.RULES:
+            instructions = getattr(self, f'_{rule}')(instructions)
+        return instructions
+
+    ####
+    ## Rules
+    ####
+
+    def _rotate_loops(self, instructions):
+        """test: T, BRcc end, B, BR test, end: becomes T, BRcc end, body: B, test: T, BR!cc body, end:"""
+        labels = {ins.label: i for i, ins in enumerate(instructions) if ins.label is not None and ins.opcode is not Opcode.EQUATE}
+        return self.__rotate(instructions, 0, len(instructions), labels)
+
+    def _thread_jumps(self, instructions):
+        labels = {ins.label: i for i, ins in enumerate(instructions) if ins.label is not None and ins.opcode is not Opcode.EQUATE}
+        result = []
+        for i, ins in enumerate(instructions):
+            if ins.opcode is Opcode.BR or ins.opcode in CONDITIONAL:
+                target = self.__final_target(instructions, ins.symbol, labels)
+                if target != ins.symbol:
+                    ins = ins.copy()
+                    ins.operand = target
+                    self.threaded += 1
+                landing = self.__executable(instructions, labels.get(target))
+                if ins.opcode is Opcode.BR and landing is not None and instructions[landing].opcode in (Opcode.RET, Opcode.STOP):
+                    # one byte instead of a branch to it
+                    ins = Instruction(instructions[landing].opcode, label = ins.label, comment = ins.comment).at(ins)
+                    self.threaded += 1
+            result.append(ins)
+        return self.__invert_over_branches(result)
+
+    def _compares(self, instructions):
+        referenced = self.__referenced(instructions)
+        result = []
+        for i, ins in enumerate(instructions):
+            if ins.opcode in COMPARES and ins.operand == 0 and ins.mode is Mode.I and (ins.label is None or ins.label not in referenced):
+                following = self.__executable(instructions, i + 1)
+                setter = self.__setter(result, referenced)
+                if (following is not None and instructions[following].opcode in NEGATED and setter is not None
+                        and (setter.opcode in COMPARES[ins.opcode] or self.__byte_load(result, setter, ins.opcode))
+                        and (ins.label is None or instructions[following].label is None)):
+                    if ins.label is not None:
+                        instructions[following] = instructions[following].copy()
+                        instructions[following].label = ins.label
+                    self.compares += 1
+                    continue
+            result.append(ins)
+        return result
+
+    ####
+    ## Helper functions
+    ####
+
+    def __rotate(self, instructions, start, end, labels):
+        result = []
+        i = start
+        while i < end:
+            ins = instructions[i]
+            loop = self.__loop(instructions, i, end, labels) if ins.label is not None and ins.label.startswith(LOOP_TEST) else None
+            if loop is None:
+                result.append(ins)
+                i += 1
+                continue
+            exit_branch, back, finish = loop
+            test = instructions[i:exit_branch]
+            body = self.__rotate(instructions, exit_branch + 1, back, labels)
+            body_label = LOOP_BODY + ins.label[len(LOOP_TEST):]
+            branch = instructions[exit_branch]
+            if sum(1 for t in test if t.is_code) <= GUARD_SIZE:
+                # a copy of the test enters the loop
+                guard = [t.copy() for t in test]
+                guard[0].label = None
+                result.extend(guard)
+                result.append(Instruction(branch.opcode, branch.operand, branch.mode, comment = branch.comment).at(branch))
+            else:
+                result.append(Instruction(Opcode.BR, ins.label, Mode.I).at(ins))
+            first = next((j for j, b in enumerate(body) if b.opcode is not None), None)
+            if first is not None and body[first].label is None:
+                body[first] = body[first].copy()
+                body[first].label = body_label
+            else:
+                result.append(Instruction(Opcode.NOP1, label = body_label).at(branch))
+            result.extend(body)
+            result.extend(test)
+            result.append(Instruction(NEGATED[branch.opcode], body_label, Mode.I, comment = 'loop while the condition holds').at(branch))
+            self.rotated += 1
+            i = finish
+        return result
+
+    def __loop(self, instructions, i, end, labels):
+        """(index of the exit branch, index of the BR back, index of the end label) of the loop whose test starts at i, None when it does not have that shape"""
+        name = instructions[i].label[len(LOOP_TEST):]
+        finish = labels.get(LOOP_END + name)
+        if finish is None or not i < finish < end:
+            return None
+        exit_branch = None
+        for j in range(i, finish):
+            ins = instructions[j]
+            if j > i and ins.label is not None:
+                return None
+            if ins.opcode in CONDITIONAL:
+                exit_branch = j
+                break
+            if ins.opcode in (Opcode.BR, Opcode.RET, Opcode.STOP):
+                return None
+        if exit_branch is None or instructions[exit_branch].symbol != LOOP_END + name or instructions[exit_branch].opcode not in NEGATED:
+            return None
+        back = finish - 1
+        while back > exit_branch and instructions[back].opcode is None:
+            back -= 1
+        ins = instructions[back]
+        if back <= exit_branch + 1 or ins.opcode is not Opcode.BR or ins.symbol != instructions[i].label or ins.label is not None:
+            return None
+        return exit_branch, back, finish
+
+    def __final_target(self, instructions, target, labels):
+        """Label a branch to target ends up at, following the BR in the way"""
+        seen = {target}
+        while True:
+            landing = self.__executable(instructions, labels.get(target))
+            if landing is None or instructions[landing].opcode is not Opcode.BR or instructions[landing].mode is not Mode.I:
+                return target
+            following = instructions[landing].symbol
+            if following is None or following in seen or following not in labels:
+                return target
+            seen.add(following)
+            target = following
+
+    def __invert_over_branches(self, instructions):
+        """BRcc next, BR target, next: becomes BR!cc target, next:"""
+        result = []
+        i = 0
+        while i < len(instructions):
+            ins = instructions[i]
+            jump = self.__next_line(instructions, i + 1)
+            if ins.opcode in NEGATED and jump is not None and instructions[jump].opcode is Opcode.BR and instructions[jump].label is None:
+                after = self.__executable(instructions, jump + 1)
+                if after is not None and ins.symbol in self.__labels(instructions, jump + 1, after):
+                    # the comments in between stay
+                    result.extend(instructions[i + 1:jump])
+                    result.append(Instruction(NEGATED[ins.opcode], instructions[jump].operand, instructions[jump].mode, ins.label, ins.comment).at(ins))
+                    self.threaded += 1
+                    i = jump + 1
+                    continue
+            result.append(ins)
+            i += 1
+        return result
+
+    def __labels(self, instructions, start, stop):
+        """Labels of the lines from start to stop included"""
+        return {instructions[k].label for k in range(start, stop + 1) if instructions[k].opcode is not Opcode.EQUATE}
+
+    def __next_line(self, instructions, i):
+        """Index of the first instruction from i, comments are skipped"""
+        for j in range(i, len(instructions)):
+            if instructions[j].opcode is not None:
+                return j
+        return None
+
+    def __executable(self, instructions, i):
+        """Index of the first instruction from i that the CPU executes and is not a NOP1, None if there is none"""
+        if i is None:
+            return None
+        for j in range(i, len(instructions)):
+            ins = instructions[j]
+            if ins.opcode is None or ins.opcode is Opcode.NOP1 or ins.opcode is Opcode.EQUATE:
+                continue
+            return j if ins.is_code else None
+        return None
+
+    def __setter(self, previous, referenced):
+        """Instruction that last set the status bits before the next one, None when control may come from elsewhere"""
+        for ins in reversed(previous):
+            if ins.opcode is None:
+                continue
+            if ins.opcode in STORES or ins.opcode is Opcode.NOP1:
+                if ins.label is not None and ins.label in referenced:
+                    return None
+                continue
+            return ins
+        return None
+
+    def __byte_load(self, previous, setter, compare):
+        """setter loads a byte in the register the compare tests, right after clearing it"""
+        clear, load = BYTE_LOADS[compare]
+        if setter.opcode is not load or setter.label is not None:
+            return False
+        found = False
+        for ins in reversed(previous):
+            if ins is setter:
+                found = True
+            elif found and ins.opcode is not None:
+                return ins.opcode is clear and ins.operand == 0 and ins.mode is Mode.I
+        return False
+
+    def __referenced(self, instructions):
+        referenced = set(self.keep_labels)
+        for ins in instructions:
+            if ins.opcode is not None and ins.opcode is not Opcode.EQUATE and ins.symbol is not None:
+                referenced.add(ins.symbol)
+        return referenced
@@ -0,0 +1,114 @@
+"""
+    Constant folding and propagation on the module AST, it runs before the
+    visitors. Arithmetic wraps to 16 bits after every operation, exactly
+    like the Pep/9 code it replaces.
+"""
+
+import ast
+import operator
+from visitors.Expressions import to_word
+
+OPERATIONS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+}
+
+def is_int(node):
+    return isinstance(node, ast.Constant) and type(node.value) is int
+
+def is_private(name):
+    # same test as the visitors (.isupper is never called, any _name is private)
+    return name[0] == '_' and name[1:].isupper
+
+class ConstantFolding(ast.NodeTransformer):
+    """
+        A global is a constant when the module body assigns it exactly once,
+        with a value that folds to a constant, and no function declares it
+        global. A private (_NAME) is a constant as soon as its first
+        assignment is, since the visitors turn it into an .EQUATE. Reads of
+        constants are replaced by their value, so expressions using them
+        fold as well. The assignment itself stays and becomes a .WORD
+        initializer (or an .EQUATE).
+    """
+
+    def __init__(self, analysis) -> None:
+        super().__init__()
+        self.analysis = analysis
+        self.constants = {}     # name -> value
+        self.folded = 0         # operations computed at compile time
+        self.propagated = 0     # reads replaced by a constant
+        self.report = []
+        self.__shadowed = set() # locals and parameters of the function being visited
+        self.__function = None
+
+    def fold(self, module):
+        """Transform module in place, returns it"""
+        # first the module level definitions, in order, so constants can build on each other
+        for statement in module.body:
+            if not isinstance(statement, ast.Assign) or not isinstance(statement.targets[0], ast.Name):
+                continue
+            statement.value = self.visit(statement.value)
+            name = statement.targets[0].id
+            if not is_int(statement.value) or name in self.constants:
+                continue
+            if is_private(name) or self.analysis.assignment_counts.get(name) == 1 and name not in self.analysis.assigned_in_functions:
+                self.constants[name] = statement.value.value
+                self.report.append(f'constant folding: {name} = {statement.value.value} (line {statement.lineno})')
+        # then every other expression of the program
+        for statement in module.body:
+            if isinstance(statement, ast.Assign) and isinstance(statement.targets[0], ast.Name):
+                continue
+            self.visit(statement)
+        self.report.append(f'constant folding: {self.folded} operations folded, {self.propagated} reads propagated')
+        return module
+
+    ####
+    ## Folding
+    ####
+
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        if not is_int(node.left) or not is_int(node.right) or type(node.op) not in OPERATIONS:
+            return node
+        left, right = to_word(node.left.value), to_word(node.right.value)
+        if right == 0 and isinstance(node.op, (ast.FloorDiv, ast.Mod)):
+            # left for the runtime, which stops the program
+            return node
+        self.folded += 1
+        return ast.copy_location(ast.Constant(to_word(OPERATIONS[type(node.op)](left, right))), node)
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        if is_int(node.operand) and isinstance(node.op, (ast.USub, ast.UAdd)):
+            self.folded += 1
+            value = -node.operand.value if isinstance(node.op, ast.USub) else node.operand.value
+            return ast.copy_location(ast.Constant(to_word(value)), node)
+        return node
+
+    ####
+    ## Propagation
+    ####
+
+    def visit_Name(self, node):
+        if isinstance(node.ctx, ast.Load) and node.id in self.constants and node.id not in self.__shadowed:
+            self.propagated += 1
+            self.analysis.forget_read(node.id, self.__function)
+            return ast.copy_location(ast.Constant(self.constants[node.id]), node)
+        return node
+
+    def visit_Call(self, node):
+        # the called name is not a value
+        node.args = [self.visit(arg) for arg in node.args]
+        return node
+
+    def visit_FunctionDef(self, node):
+        summary = self.analysis.functions[node.name]
+        self.__shadowed = set(summary.params) | set(summary.locals)
+        self.__function = node.name
+        self.generic_visit(node)
+        self.__shadowed = set()
+        self.__function = None
+        return node
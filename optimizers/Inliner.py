@@ -0,0 +1,164 @@
+"""
+    Inlining of small leaf functions on the module AST, before the
+    analysis the code generators use. A call statement is replaced by
+    copies of the parameters, the body of the function and the assignment
+    of its result, so the call frame and the CALL/RET pair disappear.
+"""
+
+import ast
+import copy
+from visitors.Expressions import BUILTINS, is_pure
+
+# nodes of the body a function may have to be inlined
+DEFAULT_BUDGET = 40
+
+class Inliner(ast.NodeTransformer):
+    """
+        A function is inlined when it calls no user function, declares no
+        globals, is not memoized, has at most budget nodes and can only return from its
+        last statement. A call is inlined when it is a whole statement:
+        x = f(..), x op= f(..), return f(..) or f(..). Parameters and
+        locals get fresh names, locals of the caller (globals at the top
+        level), parameters that the body never assigns are replaced by
+        their argument when it is a constant or a name no later argument
+        can change.
+    """
+
+    def __init__(self, analysis, budget = DEFAULT_BUDGET) -> None:
+        super().__init__()
+        self.analysis = analysis
+        self.budget = budget
+        self.inlined = {}       # name -> inlined calls
+        self.report = []
+        self.__candidates = {name: f for name, f in analysis.functions.items() if self.__inlinable(f)}
+        self.__globals = frozenset(analysis.global_names())
+        self.__names = set(self.__globals) # names a fresh name avoids, those of the scope being visited
+        self.__caller = None    # summary of the function being visited, None at the top level
+        self.__count = 0
+
+    def inline(self, module):
+        """Transform module in place, returns the number of inlined calls"""
+        if self.__candidates:
+            self.visit(module)
+        for name, count in self.inlined.items():
+            self.report.append(f'inlining: {name} inlined at {count} call sites')
+        return sum(self.inlined.values())
+
+    ####
+    ## Call sites
+    ####
+
+    def visit_FunctionDef(self, node):
+        self.__caller = self.analysis.functions[node.name]
+        # fresh names are numbered per function, a change in one function does not rename the others
+        outer = self.__names, self.__count
+        self.__names = set(self.__globals) | set(self.__caller.params) | set(self.__caller.locals) | set(self.__caller.reads)
+        self.__count = 0
+        self.generic_visit(node)
+        self.__names, self.__count = outer
+        self.__caller = None
+        return node
+
+    def visit_Assign(self, node):
+        result = self.__inline(node.value, True, lambda value: ast.Assign(targets=node.targets, value=value))
+        return result if result is not None else node
+
+    def visit_AugAssign(self, node):
+        result = self.__inline(node.value, True, lambda value: ast.AugAssign(target=node.target, op=node.op, value=value))
+        return result if result is not None else node
+
+    def visit_Return(self, node):
+        result = self.__inline(node.value, True, lambda value: ast.Return(value=value))
+        return result if result is not None else node
+
+    def visit_Expr(self, node):
+        result = self.__inline(node.value, False, None)
+        return result if result is not None else node
+
+    def __inline(self, call, uses_result, make_statement):
+        """Statements replacing the call, None when it stays a call"""
+        if not isinstance(call, ast.Call) or not isinstance(call.func, ast.Name):
+            return None
+        callee = self.__candidates.get(call.func.id)
+        if callee is None or callee is self.__caller or len(call.args) != len(callee.params):
+            return None
+        if uses_result and not callee.returns:
+            return None
+        body = callee.node.body
+        returned = body[-1].value if body and isinstance(body[-1], ast.Return) else None
+        # a discarded result is only computed for its side effects, which only calls have
+        if not uses_result and returned is not None and not isinstance(returned, ast.Call) and any(isinstance(n, ast.Call) for n in ast.walk(returned)):
+            return None
+        if self.__caller is not None:
+            # the globals the callee reads must not be hidden by locals of the caller
+            hidden = set(self.__caller.params) | set(self.__caller.locals)
+            if any(callee.reads_global(name) and name in hidden for name in callee.reads):
+                return None
+
+        self.__count += 1
+        statements = []
+        mapping = {}
+        for i, (param, arg) in enumerate(zip(callee.params, call.args)):
+            # a call in a later argument may change the variable before the body reads it
+            changing = isinstance(arg, ast.Name) and not all(is_pure(a) for a in call.args[i + 1:])
+            if param not in callee.assigned and isinstance(arg, (ast.Constant, ast.Name)) and not changing:
+                mapping[param] = arg
+            else:
+                mapping[param] = self.__fresh(param)
+                statements.append(ast.copy_location(ast.Assign(targets=[ast.Name(mapping[param].id, ast.Store())], value=arg), call))
+        for name in callee.locals:
+            mapping[name] = self.__fresh(name)
+
+        renamer = Renamer(mapping)
+        for statement in body:
+            if isinstance(statement, ast.Return):
+                continue
+            statements.append(renamer.visit(copy.deepcopy(statement)))
+        if returned is not None and (uses_result or isinstance(returned, ast.Call)):
+            value = renamer.visit(copy.deepcopy(returned))
+            statement = make_statement(value) if uses_result else ast.Expr(value=value)
+            statements.append(ast.copy_location(statement, call))
+        self.inlined[callee.name] = self.inlined.get(callee.name, 0) + 1
+        return [ast.fix_missing_locations(s) for s in statements]
+
+    ####
+    ## Helper functions
+    ####
+
+    def __inlinable(self, function):
+        body = function.node.body
+        # a memoized function keeps its table
+        if function.memo is not None or function.declared_globals or any(name not in BUILTINS for name in function.calls):
+            return False
+        if sum(1 for _ in ast.walk(function.node)) - 1 > self.budget:
+            return False
+        returns = [n for n in ast.walk(function.node) if isinstance(n, ast.Return)]
+        return all(n is body[-1] for n in returns)
+
+    def __fresh(self, name):
+        """Name of a parameter or local of the inlined call, i<n>_<name>"""
+        fresh = f'i{self.__count}_{name}'
+        while fresh in self.__names:
+            fresh = 'i' + fresh
+        self.__names.add(fresh)
+        return ast.Name(fresh, ast.Load())
+
+class Renamer(ast.NodeTransformer):
+    """Replaces the parameters and locals of an inlined body"""
+
+    def __init__(self, mapping) -> None:
+        super().__init__()
+        self.mapping = mapping
+
+    def visit_Name(self, node):
+        replacement = self.mapping.get(node.id)
+        if replacement is None:
+            return node
+        if isinstance(replacement, ast.Name):
+            return ast.copy_location(ast.Name(replacement.id, node.ctx), node)
+        return ast.copy_location(copy.deepcopy(replacement), node)
+
+    def visit_Call(self, node):
+        # the called name is not a value
+        node.args = [self.visit(arg) for arg in node.args]
+        return node
@@ -0,0 +1,227 @@
+"""
+    While loop optimizations on the module AST, after constant folding.
+    Inner loops are optimized first, what they move out of their body can
+    then move out of the outer loop as well.
+"""
+
+import ast
+import copy
+from generators.Runtime import power_of_two
+from visitors.Expressions import BUILTINS, is_array_init, to_word
+
+# operations an invariant expression may use, it is computed even when the loop does not run
+SAFE = (ast.Add, ast.Sub, ast.Mult)
+
+class LoopOptimizer(ast.NodeTransformer):
+    """
+        Two rewrites, in this order on every loop:
+        - a product i * c of an induction variable (i = i + s, once per
+          iteration) by an invariant becomes a variable updated with
+          + c * s next to i
+        - invariant expressions are computed once, in assignments to fresh
+          variables before the loop
+    """
+
+    def __init__(self, analysis) -> None:
+        super().__init__()
+        self.analysis = analysis
+        self.reduced = 0    # products replaced by an incremented variable
+        self.hoisted = 0    # invariant expressions computed before their loop
+        self.report = []
+        self.__globals = frozenset(analysis.global_names())
+        self.__names = set(self.__globals) # names a fresh name avoids, those of the scope being visited
+        self.__scope = None # summary of the function being visited, None at the top level
+        self.__count = 0
+
+    def optimize(self, module):
+        """Transform module in place, returns the number of rewrites"""
+        self.visit(module)
+        self.report.append(f'loops: {self.reduced} products reduced, {self.hoisted} expressions hoisted')
+        return self.reduced + self.hoisted
+
+    def visit_FunctionDef(self, node):
+        self.__scope = self.analysis.functions[node.name]
+        # fresh names are numbered per function, a change in one function does not rename the others
+        outer = self.__names, self.__count
+        self.__names = set(self.__globals) | set(self.__scope.params) | set(self.__scope.locals) | set(self.__scope.reads)
+        self.__count = 0
+        self.generic_visit(node)
+        self.__names, self.__count = outer
+        self.__scope = None
+        return node
+
+    def visit_While(self, node):
+        self.generic_visit(node)
+        if node.orelse:
+            return node
+        preheader = []
+        assigned, calls = self.__modified(node)
+        self.__reduce(node, preheader, assigned, calls)
+        # the reduced products are assigned in the loop now
+        assigned, calls = self.__modified(node)
+        Hoister(self, preheader, assigned, calls).hoist(node)
+        return preheader + [node]
+
+    ####
+    ## Induction variables
+    ####
+
+    def __reduce(self, node, preheader, assigned, calls):
+        # basic induction variables: name -> (index of the update in the body, op, step)
+        inductions = {}
+        for index, statement in enumerate(node.body):
+            target, op, value = increment(statement)
+            if target is None or assigned.get(target) != 1 or not self.__invariant_leaf(value, assigned, calls):
+                continue
+            if calls and not self.__is_local(target) and target in self.analysis.assigned_in_functions:
+                continue
+            inductions[target] = (index, op, value)
+        if not inductions:
+            return
+        # products by an invariant that is not a power of two (those are shifts already)
+        products = {}   # (variable, factor) -> product nodes
+        for n in ast.walk(node):
+            if not isinstance(n, ast.BinOp) or not isinstance(n.op, ast.Mult):
+                continue
+            for variable, factor in ((n.left, n.right), (n.right, n.left)):
+                if (isinstance(variable, ast.Name) and variable.id in inductions and self.__invariant_leaf(factor, assigned, calls)
+                        and power_of_two(factor) is None and not (isinstance(factor, ast.Name) and factor.id in inductions)):
+                    products.setdefault((variable.id, ast.dump(factor)), []).append(n)
+                    break
+        if not products:
+            return
+        replaced = {}
+        updates = {}    # index of an induction update -> statements to add after it
+        for (variable, _), nodes in products.items():
+            index, op, step = inductions[variable]
+            factor = nodes[0].right if isinstance(nodes[0].left, ast.Name) and nodes[0].left.id == variable else nodes[0].left
+            name = self.fresh('s')
+            preheader.append(ast.Assign(targets=[ast.Name(name, ast.Store())],
+                                        value=ast.BinOp(left=ast.Name(variable, ast.Load()), op=ast.Mult(), right=copy.deepcopy(factor))))
+            if isinstance(factor, ast.Constant) and isinstance(step, ast.Constant):
+                delta = ast.Constant(to_word(factor.value * step.value))
+            else:
+                # invariant, hoisted right after
+                delta = ast.BinOp(left=copy.deepcopy(factor), op=ast.Mult(), right=copy.deepcopy(step))
+            update = ast.Assign(targets=[ast.Name(name, ast.Store())], value=ast.BinOp(left=ast.Name(name, ast.Load()), op=copy.deepcopy(op), right=delta))
+            updates.setdefault(index, []).append(ast.fix_missing_locations(ast.copy_location(update, node)))
+            for n in nodes:
+                replaced[id(n)] = name
+            self.reduced += len(nodes)
+        Replacer(replaced).visit(node)
+        body = []
+        for index, statement in enumerate(node.body):
+            body.append(statement)
+            body.extend(updates.get(index, []))
+        node.body = body
+        for statement in preheader:
+            ast.fix_missing_locations(ast.copy_location(statement, node))
+
+    ####
+    ## Helper functions
+    ####
+
+    def invariant(self, node, assigned, calls):
+        """The expression has the same value in every iteration and computing it cannot stop the program"""
+        if isinstance(node, ast.Constant):
+            return type(node.value) is int
+        if isinstance(node, ast.Name):
+            return self.__invariant_name(node.id, assigned, calls)
+        if isinstance(node, ast.UnaryOp):
+            return isinstance(node.op, (ast.USub, ast.UAdd)) and self.invariant(node.operand, assigned, calls)
+        if isinstance(node, ast.BinOp) and not is_array_init(node):
+            if not isinstance(node.op, SAFE) and not (isinstance(node.op, (ast.FloorDiv, ast.Mod)) and isinstance(node.right, ast.Constant) and node.right.value != 0):
+                return False
+            return self.invariant(node.left, assigned, calls) and self.invariant(node.right, assigned, calls)
+        return False
+
+    def fresh(self, prefix):
+        """New variable name, a local in a function and a global at the top level"""
+        self.__count += 1
+        name = f'{prefix}{self.__count}'
+        while name in self.__names:
+            name = prefix + name
+        self.__names.add(name)
+        return name
+
+    def __invariant_leaf(self, node, assigned, calls):
+        return isinstance(node, (ast.Constant, ast.Name)) and self.invariant(node, assigned, calls)
+
+    def __invariant_name(self, name, assigned, calls):
+        if name in assigned:
+            return False
+        # a called function may change a global it declares
+        return not calls or self.__is_local(name) or name not in self.analysis.assigned_in_functions
+
+    def __is_local(self, name):
+        scope = self.__scope
+        return scope is not None and (name in scope.params or name in scope.locals)
+
+    def __modified(self, node):
+        """(name -> assignments in the loop, whether the loop calls a user function)"""
+        assigned = {}
+        calls = False
+        for n in ast.walk(node):
+            if isinstance(n, ast.Assign) and isinstance(n.targets[0], ast.Name):
+                assigned[n.targets[0].id] = assigned.get(n.targets[0].id, 0) + 1
+            elif isinstance(n, ast.AugAssign) and isinstance(n.target, ast.Name):
+                assigned[n.target.id] = assigned.get(n.target.id, 0) + 1
+            elif isinstance(n, ast.Call) and n.func.id not in BUILTINS:
+                calls = True
+        return assigned, calls
+
+class Hoister(ast.NodeTransformer):
+    """Replaces the invariant expressions of a loop by variables assigned in its preheader"""
+
+    def __init__(self, optimizer, preheader, assigned, calls) -> None:
+        super().__init__()
+        self.optimizer = optimizer
+        self.preheader = preheader
+        self.assigned = assigned
+        self.calls = calls
+        self.names = {} # dump of a hoisted expression -> its variable
+
+    def hoist(self, loop):
+        loop.test = self.visit(loop.test)
+        loop.body = [self.visit(statement) for statement in loop.body]
+
+    def visit_BinOp(self, node):
+        if not self.optimizer.invariant(node, self.assigned, self.calls):
+            return self.generic_visit(node)
+        key = ast.dump(node)
+        name = self.names.get(key)
+        if name is None:
+            name = self.names[key] = self.optimizer.fresh('h')
+            self.preheader.append(ast.fix_missing_locations(ast.copy_location(ast.Assign(targets=[ast.Name(name, ast.Store())], value=node), node)))
+            self.optimizer.hoisted += 1
+        return ast.copy_location(ast.Name(name, ast.Load()), node)
+
+    def visit_Call(self, node):
+        # the called name is not a value
+        node.args = [self.visit(arg) for arg in node.args]
+        return node
+
+class Replacer(ast.NodeTransformer):
+    """Replaces nodes, by id, with a variable"""
+
+    def __init__(self, replaced) -> None:
+        super().__init__()
+        self.replaced = replaced
+
+    def visit_BinOp(self, node):
+        name = self.replaced.get(id(node))
+        if name is not None:
+            return ast.copy_location(ast.Name(name, ast.Load()), node)
+        return self.generic_visit(node)
+
+def increment(statement):
+    """(name, op, value) of name = name op value (or value + name) and name op= value with op + or -, Nones otherwise"""
+    if isinstance(statement, ast.AugAssign) and isinstance(statement.target, ast.Name) and isinstance(statement.op, (ast.Add, ast.Sub)):
+        return statement.target.id, statement.op, statement.value
+    if isinstance(statement, ast.Assign) and isinstance(statement.targets[0], ast.Name) and isinstance(statement.value, ast.BinOp):
+        name, value = statement.targets[0].id, statement.value
+        if isinstance(value.op, (ast.Add, ast.Sub)) and isinstance(value.left, ast.Name) and value.left.id == name:
+            return name, value.op, value.right
+        if isinstance(value.op, ast.Add) and isinstance(value.right, ast.Name) and value.right.id == name:
+            return name, value.op, value.left
+    return None, None, None
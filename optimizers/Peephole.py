@@ -0,0 +1,160 @@
+"""
+    Peephole optimizer working on the IR instructions produced by the
+    visitors, it runs after finalize() and before EntryPoint.
+"""
+
+from ir.Instruction import CONDITIONAL, UNCONDITIONAL, Instruction, Opcode
+
+# a store followed by the load of the same operand
+STORE_LOAD = {Opcode.LDWA: Opcode.STWA, Opcode.LDWX: Opcode.STWX}
+
+class PeepholeOptimizer():
+    RULES = ('store_load', 'branch_to_next', 'unreachable', 'nop_labels')
+
+    def __init__(self, rules = None, keep_labels = ()) -> None:
+        unknown = set(rules or ()) - set(self.RULES)
+        if unknown:
+            raise ValueError(f'Unknown peephole rules: {", ".join(sorted(unknown))}')
+        self.rules = [r for r in self.RULES if rules is None or r in rules]
+        # labels referenced from outside of the optimized instructions
+        self.keep_labels = set(keep_labels)
+        self.removed = 0
+
+    def optimize(self, instructions: list[Instruction]) -> list[Instruction]:
+        instructions = list(instructions)
+        changed = True
+        while changed:
+            changed = False
+            for rule in self.rules:
+                before = len(instructions)
+                instructions = getattr(self, f'_{rule}')(instructions)
+                if len(instructions) != before:
+                    self.removed += before - len(instructions)
+                    changed = True
+        return instructions
+
+    ####
+    ## Rules, each one is a single linear scan
+    ####
+
+    def _store_load(self, instructions):
+        """STWr x followed by LDWr x reloads the value that is already in the register"""
+        result = []
+        last = None # previous executable instruction
+        for i, instr in enumerate(instructions):
+            if instr.opcode is None:
+                result.append(instr)
+                continue
+            if instr.label is None and last is not None and instr.opcode in STORE_LOAD:
+                # the load also sets N and Z, keep it when a branch depends on them
+                if (last.opcode is STORE_LOAD[instr.opcode] and last.operand == instr.operand and last.mode is instr.mode
+                        and not self.__branches_next(instructions, i)):
+                    continue
+            result.append(instr)
+            last = instr
+        return result
+
+    def _branch_to_next(self, instructions):
+        """A branch to the instruction that follows anyway"""
+        result = []
+        for i, instr in enumerate(instructions):
+            if (instr.opcode is Opcode.BR or instr.opcode in CONDITIONAL) and instr.label is None and instr.operand in self.__next_labels(instructions, i):
+                continue
+            result.append(instr)
+        return result
+
+    def _unreachable(self, instructions):
+        """Instructions after an unconditional jump that nothing branches to"""
+        result = []
+        dead = False
+        for instr in instructions:
+            if instr.opcode is None:
+                result.append(instr)
+                continue
+            if instr.label is not None and instr.opcode is not Opcode.EQUATE:
+                dead = False
+            if dead and instr.is_code:
+                continue
+            result.append(instr)
+            if instr.opcode in UNCONDITIONAL:
+                dead = True
+        return result
+
+    def _nop_labels(self, instructions):
+        """Move the label of a 'label: NOP1' onto the next instruction and drop the NOP1"""
+        referenced = self.__referenced(instructions)
+        renamed = {}
+        result = []
+        pending = None # label waiting for the next executable instruction
+        for i, instr in enumerate(instructions):
+            label = instr.label
+            if instr.opcode is Opcode.NOP1 and pending is None:
+                if label is None or label not in referenced and label not in self.keep_labels:
+                    continue
+                target = self.__next_executable(instructions, i)
+                if target is not None:
+                    next_label = instructions[target].label
+                    if next_label is None:
+                        pending = label
+                        continue
+                    if label not in self.keep_labels:
+                        renamed[label] = next_label
+                        # the branches to label will now reach next_label
+                        referenced.add(next_label)
+                        continue
+            if pending is not None and instr.opcode is not None:
+                instr.label, pending = pending, None
+            result.append(instr)
+        if renamed:
+            for instr in result:
+                self.__rename(instr, renamed)
+        return result
+
+    ####
+    ## Helper functions
+    ####
+
+    def __next_executable(self, instructions, i):
+        """Index of the next instruction after i, None if a directive comes first"""
+        for j in range(i + 1, len(instructions)):
+            opcode = instructions[j].opcode
+            if opcode is None:
+                continue
+            return j if instructions[j].is_code else None
+        return None
+
+    def __next_labels(self, instructions, i):
+        """Labels of the addresses control reaches by falling through from instruction i"""
+        labels = set()
+        for j in range(i + 1, len(instructions)):
+            instr = instructions[j]
+            if instr.opcode is None or instr.opcode is Opcode.EQUATE:
+                continue
+            if instr.label is not None:
+                labels.add(instr.label)
+            # a NOP1 does nothing, the label after it is reached the same way
+            if instr.opcode is not Opcode.NOP1:
+                break
+        return labels
+
+    def __branches_next(self, instructions, i):
+        for j in range(i + 1, len(instructions)):
+            opcode = instructions[j].opcode
+            if opcode is not None:
+                return opcode in CONDITIONAL
+        return False
+
+    def __referenced(self, instructions):
+        referenced = set()
+        for instr in instructions:
+            if instr.opcode is not None and instr.opcode is not Opcode.EQUATE:
+                referenced.add(instr.symbol)
+        return referenced
+
+    def __rename(self, instr, renamed):
+        target = renamed.get(instr.symbol)
+        if target is None:
+            return
+        while target in renamed:
+            target = renamed[target]
+        instr.operand = target
@@ -0,0 +1,286 @@
+"""
+    Loop counters kept in the X register. The code of a statement only
+    uses X for array indexes and the right operand of runtime routines,
+    between two statements of a loop it can hold a variable instead: the
+    test compares it with CPWX, v = v + e becomes ADDX e and arr[v] only
+    needs ASLX. The visitors generate a loop as usual, the allocator then
+    rewrites its instructions one statement at a time.
+"""
+
+import ast
+from ir.Instruction import CONDITIONAL, UNCONDITIONAL, Instruction, Mode, Opcode
+
+# what X holds: the variable, twice the variable (the byte offset of an index), None for anything else
+VALUE = 'value'
+DOUBLE = 'double'
+
+# arrays up to this many bytes: twice an index that is in bounds still fits 16 bits, ASRX gets it back
+SCALE_LIMIT = 0x8000
+
+X_WRITERS = frozenset({Opcode.LDWX, Opcode.LDBX, Opcode.ADDX, Opcode.SUBX, Opcode.ANDX, Opcode.ORX, Opcode.NEGX, Opcode.NOTX,
+                       Opcode.ASLX, Opcode.ASRX, Opcode.ROLX, Opcode.RORX, Opcode.CALL})
+MEMORY_WRITERS = frozenset({Opcode.STWA, Opcode.STWX, Opcode.STBA, Opcode.STBX, Opcode.DECI})
+INDEXED = frozenset({Mode.X, Mode.SX, Mode.SFX})
+# branch on 'right - left' instead of 'left - right'
+MIRRORED = {Opcode.BRLT: Opcode.BRGT, Opcode.BRGT: Opcode.BRLT, Opcode.BRLE: Opcode.BRGE, Opcode.BRGE: Opcode.BRLE, Opcode.BREQ: Opcode.BREQ, Opcode.BRNE: Opcode.BRNE}
+INCREMENTS = {Opcode.ADDA: Opcode.ADDX, Opcode.SUBA: Opcode.SUBX}
+
+def array_sizes_fit(node, size):
+    """Every array node indexes is at most SCALE_LIMIT bytes, size(name) gives the bytes of an array"""
+    return all(size(n.value.id) <= SCALE_LIMIT for n in ast.walk(node) if isinstance(n, ast.Subscript))
+
+class RegisterAllocator():
+    """
+        Shared by the visitors of one compilation. A loop keeps the
+        variable of its test in X when the rewrite saves cycles: X is
+        loaded before the loop, stored back after it, and in between
+        memory is only brought up to date before the statements that use
+        it (calls, I/O, assignments, leaving the loop). report gets one
+        line per loop.
+    """
+
+    def __init__(self) -> None:
+        self.report = []
+        self.loops = 0
+
+    def allocate(self, instructions, start, bounds, candidates, scaled, where):
+        """
+            instructions[start:] is a whole loop: the test up to bounds[0],
+            the body statements between the next bounds, then the branch
+            back and the end label. candidates are (name, operand) of the
+            test, the best one replaces the loop in place. scaled is True
+            when the arrays of the loop allow an index to stay in X.
+        """
+        loop = instructions[start:]
+        bounds = [b - start for b in bounds]
+        best = None
+        for name, operand in candidates:
+            rewrite = self.__rewrite(loop, bounds, operand, scaled)
+            if rewrite is not None and rewrite[1] + rewrite[2] > 0 and (best is None or rewrite[1] + rewrite[2] > best[1][1] + best[1][2]):
+                best = (name, rewrite)
+        if best is None:
+            return False
+        name, (code, accesses, _) = best
+        instructions[start:] = code
+        self.loops += 1
+        self.report.append(f'registers: {name} in X in the loop at {where}, {accesses} memory accesses saved per iteration')
+        return True
+
+    ####
+    ## Loop level
+    ####
+
+    def __rewrite(self, loop, bounds, operand, scaled):
+        """(instructions, memory accesses saved, instructions saved) per iteration, None when the test does not fit"""
+        test = self.__test(loop[:bounds[0]], operand)
+        if test is None:
+            return None
+        statements = [Statement(loop[a:b], operand, scaled) for a, b in zip(bounds, bounds[1:])]
+        # memory is behind at the test when the body ends behind
+        behind = self.__syncs(statements, False)[0]
+        if behind:
+            behind, syncs = self.__syncs(statements, True)
+        else:
+            syncs = self.__syncs(statements, False)[1]
+        code = [Instruction(Opcode.LDWX, *operand, comment = 'loop variable in X').at(test[0])] + test
+        for statement, sync in zip(statements, syncs):
+            if sync:
+                code.append(Instruction(Opcode.STWX, *operand).at(statement.instructions[0]))
+            code.extend(statement.instructions)
+        code.extend(loop[bounds[-1]:])
+        if behind:
+            code.append(Instruction(Opcode.STWX, *operand).at(code[-1]))
+        accesses = 1 + sum(s.accesses for s in statements) - sum(syncs)
+        executed = 1 + sum(s.executed for s in statements) - sum(syncs)
+        return code, accesses, executed
+
+    def __test(self, test, operand):
+        """LDWA v, CPWA e (or LDWA e, CPWA v), BRcc end becomes CPWX e, BRcc end"""
+        if len(test) != 3 or test[0].opcode is not Opcode.LDWA or test[1].opcode is not Opcode.CPWA or test[1].label is not None:
+            return None
+        load, compare, branch = test
+        if same(load, operand) and not same(compare, operand) and compare.mode not in INDEXED:
+            value, opcode = compare, branch.opcode
+        elif same(compare, operand) and not same(load, operand) and load.mode not in INDEXED and branch.opcode in MIRRORED:
+            value, opcode = load, MIRRORED[branch.opcode]
+        else:
+            return None
+        return [Instruction(Opcode.CPWX, value.operand, value.mode, load.label, compare.comment).at(load),
+                Instruction(opcode, branch.operand, branch.mode, branch.label, branch.comment).at(branch)]
+
+    def __syncs(self, statements, behind):
+        """(memory behind at the end, whether X is stored before each statement)"""
+        syncs = []
+        for statement in statements:
+            sync = behind and statement.memory and not statement.increment
+            syncs.append(sync)
+            if statement.increment:
+                behind = True
+            elif sync:
+                behind = False
+        return behind, syncs
+
+class Statement():
+    """
+        One statement of the loop body rewritten for X holding the
+        variable on entry, X holds it again on exit. v = v +/- e becomes
+        a single ADDX or SUBX, in any other statement the LDWX of the
+        variable are left out while X still holds it.
+    """
+
+    def __init__(self, instructions, operand, scaled) -> None:
+        self.operand = operand
+        self.scaled = scaled
+        self.instructions = []  # rewritten statement
+        self.memory = False     # reads or writes the variable in memory, which must be up to date
+        self.increment = False  # v = v +/- e done in X, memory is behind afterwards
+        self.accesses = 0       # memory accesses saved
+        self.executed = 0       # instructions saved
+        self.__carried = None   # label of an instruction that is left out
+        increment = self.__increment(instructions)
+        if increment is not None:
+            self.instructions = [increment]
+            self.increment = True
+            self.accesses = self.executed = 2
+        else:
+            self.__rewrite(instructions)
+
+    ####
+    ## Helper functions
+    ####
+
+    def __rewrite(self, statement):
+        operand = self.operand
+        labels = {ins.label: i for i, ins in enumerate(statement) if ins.label is not None}
+        backward = {ins.symbol for i, ins in enumerate(statement) if is_branch(ins) and labels.get(ins.symbol, len(statement)) <= i}
+        forward = {}    # label -> what X holds on the branches to it
+        state = VALUE
+        flows = True
+        i = 0
+        while i < len(statement):
+            ins = statement[i]
+            if ins.opcode is None:
+                self.instructions.append(ins)
+                i += 1
+                continue
+            if ins.label is not None:
+                if ins.label in backward:
+                    state = None
+                else:
+                    states = forward.pop(ins.label, []) + ([state] if flows else [])
+                    state = states[0] if states and all(s == states[0] for s in states) else None
+            flows = ins.opcode not in UNCONDITIONAL
+            pair = i + 1 < len(statement) and statement[i + 1].opcode is Opcode.ASLX and statement[i + 1].label is None
+            if ins.opcode is Opcode.LDWX and same(ins, operand) and pair and self.scaled and not flags_used(statement, i + 1):
+                # LDWX v, ASLX: the byte offset of arr[v]
+                if state == VALUE:
+                    self.__leave_out(ins)
+                    self.__emit(statement[i + 1])
+                    self.__saved(1, 1)
+                elif state == DOUBLE:
+                    self.__leave_out(ins)
+                    self.__saved(1, 2)
+                else:
+                    self.__emit(ins)
+                    self.__emit(statement[i + 1])
+                    self.memory = True
+                state = DOUBLE
+                i += 2
+                continue
+            if ins.opcode is Opcode.LDWX and same(ins, operand) and not flags_used(statement, i):
+                if state == VALUE:
+                    self.__leave_out(ins)
+                    self.__saved(1, 1)
+                elif state == DOUBLE:
+                    self.__leave_out(ins)
+                    self.__emit(Instruction(Opcode.ASRX).at(ins))
+                    self.__saved(1, 0)
+                else:
+                    self.__emit(ins)
+                    self.memory = True
+                state = VALUE
+                i += 1
+                continue
+            self.__emit(ins)
+            if same(ins, operand):
+                self.memory = True
+                if ins.opcode in MEMORY_WRITERS and not (ins.opcode is Opcode.STWX and state == VALUE):
+                    state = None
+            if ins.opcode in X_WRITERS:
+                if ins.opcode is Opcode.ASLX and state == VALUE and self.scaled:
+                    state = DOUBLE
+                elif ins.opcode is Opcode.ASRX and state == DOUBLE:
+                    state = VALUE
+                elif ins.opcode is Opcode.LDWX and same(ins, operand):
+                    state = VALUE
+                else:
+                    state = None
+            if is_branch(ins):
+                if ins.symbol in labels:
+                    if ins.symbol not in backward:
+                        forward.setdefault(ins.symbol, []).append(state)
+                else:
+                    # leaving the loop, the variable is read from memory afterwards
+                    self.memory = True
+            i += 1
+
+        # X holds the variable again when the next statement starts
+        if state == DOUBLE:
+            self.__emit(Instruction(Opcode.ASRX).at(statement[-1]))
+            self.__saved(0, -1)
+        elif state != VALUE:
+            self.__emit(Instruction(Opcode.LDWX, *operand).at(statement[-1]))
+            self.memory = True
+            self.__saved(-1, -1)
+        elif self.__carried is not None:
+            self.instructions.append(Instruction(Opcode.NOP1, label = self.__carried).at(statement[-1]))
+
+    def __increment(self, statement):
+        """ADDX e or SUBX e for the three instructions of v = v +/- e, None for any other statement"""
+        operand = self.operand
+        if len(statement) != 3 or any(ins.label is not None for ins in statement):
+            return None
+        load, update, store = statement
+        if load.opcode is not Opcode.LDWA or update.opcode not in INCREMENTS or store.opcode is not Opcode.STWA or not same(store, operand):
+            return None
+        if same(load, operand) and not same(update, operand) and update.mode not in INDEXED:
+            value = update
+        elif update.opcode is Opcode.ADDA and same(update, operand) and not same(load, operand) and load.mode not in INDEXED:
+            value = load
+        else:
+            return None
+        return Instruction(INCREMENTS[update.opcode], value.operand, value.mode, comment = store.comment).at(store)
+
+    def __emit(self, ins):
+        if self.__carried is not None:
+            if ins.label is None:
+                ins = ins.copy()
+                ins.label = self.__carried
+            else:
+                self.instructions.append(Instruction(Opcode.NOP1, label = self.__carried).at(ins))
+            self.__carried = None
+        self.instructions.append(ins)
+
+    def __leave_out(self, ins):
+        """The label of an instruction that is not emitted goes to the next one"""
+        if ins.label is not None:
+            if self.__carried is not None:
+                self.instructions.append(Instruction(Opcode.NOP1, label = self.__carried).at(ins))
+            self.__carried = ins.label
+
+    def __saved(self, accesses, executed):
+        self.accesses += accesses
+        self.executed += executed
+
+def same(instruction, operand):
+    return instruction.operand == operand[0] and instruction.mode is operand[1]
+
+def is_branch(instruction):
+    return instruction.opcode is Opcode.BR or instruction.opcode in CONDITIONAL
+
+def flags_used(statement, i):
+    """The instruction after statement[i] branches on the status bits"""
+    for ins in statement[i + 1:]:
+        if ins.opcode is not None:
+            return ins.opcode in CONDITIONAL
+    return False
@@ -0,0 +1,198 @@
+"""
+    Where a simulated program spends its time. The CPU hands every
+    instruction it executes to the profiler:
+
+        profiler = HotspotProfiler(compiler.mapping)
+        run(text, stdin, profiler = profiler)
+        print('\\n'.join(profiler.report()))
+
+    The cost of an instruction is the one of ExecutionResult.cycles, one
+    unit plus one per data memory access, so the costs add up to the
+    cycles of the run. With a source map (Compiler.mapping) the costs are
+    also given per python line.
+"""
+
+from bisect import bisect_left
+from ir.Instruction import CONDITIONAL
+
+# the simulator's instructions carry their mnemonic as text
+CONDITIONAL_MNEMONICS = frozenset(opcode.value for opcode in CONDITIONAL)
+
+class HotspotProfiler():
+    """
+        Execution counts and costs per instruction, per labeled block, per
+        function (the CALL targets, runtime routines included) and per
+        source line, how often each conditional branch is taken, and the
+        cost of every call stack for flame graphs.
+    """
+
+    def __init__(self, source_map = None, root = 'tl', source_lines = None) -> None:
+        self.root = root                    # name of the code that runs outside of any call
+        self.source_lines = source_lines    # lines of the python source, quoted in the report
+        self.positions = {}                 # address -> (line, column) of the source
+        if source_map is not None:
+            for _, address, line, column in source_map['mappings']:
+                self.positions[address] = (line, column)
+        self.instructions = {}  # address -> assembled instruction, the executed ones
+        self.counts = {}        # address -> executions
+        self.costs = {}         # address -> cost
+        self.taken = {}         # address of a conditional branch -> executions that branched
+        self.calls = {}         # function -> calls
+        self.exclusive = {}     # function -> cost of its own instructions
+        self.stacks = {}        # 'tl;f;g' -> cost of the instructions run with that call stack
+        self.total = 0
+        self.__inclusive = {}   # function -> cost of the returned calls
+        self.__stack = [(root, 0)]  # (function, total when it was called)
+        self.__key = root
+        self.__calling = False  # the instruction is the first one of a call
+        self.__labeled = []     # addresses of the executed labeled instructions, sorted, built by report
+        self.__labels = {}      # label -> its address, built by report
+
+    def executed(self, instr, next_pc, cost):
+        """Called by the CPU after each instruction, next_pc is where the program goes on"""
+        address = instr.address
+        if self.__calling:
+            self.__enter(instr.label if instr.label is not None else f'{address:#06x}')
+        if address not in self.instructions:
+            self.instructions[address] = instr
+        self.counts[address] = self.counts.get(address, 0) + 1
+        self.costs[address] = self.costs.get(address, 0) + cost
+        self.total += cost
+        function = self.__stack[-1][0]
+        self.exclusive[function] = self.exclusive.get(function, 0) + cost
+        self.stacks[self.__key] = self.stacks.get(self.__key, 0) + cost
+        mnemonic = instr.mnemonic
+        if mnemonic in CONDITIONAL_MNEMONICS:
+            if next_pc != (address + instr.size) & 0xFFFF:
+                self.taken[address] = self.taken.get(address, 0) + 1
+        elif mnemonic == 'CALL':
+            self.__calling = True
+        elif mnemonic == 'RET' and len(self.__stack) > 1:
+            self.__leave()
+
+    def inclusive(self):
+        """function -> cost of its calls, callees included, the calls still running count until now"""
+        costs = dict(self.__inclusive)
+        open_calls = set()
+        for function, start in self.__stack:
+            if function not in open_calls:
+                open_calls.add(function)
+                costs[function] = costs.get(function, 0) + self.total - start
+        return costs
+
+    def lines(self):
+        """source line -> (instructions executed, cost)"""
+        lines = {}
+        for address, count in self.counts.items():
+            position = self.positions.get(address)
+            if position is not None:
+                executed, cost = lines.get(position[0], (0, 0))
+                lines[position[0]] = (executed + count, cost + self.costs[address])
+        return lines
+
+    def blocks(self):
+        """label -> (entries, cost of the instructions from the label to the next one)"""
+        blocks = {}
+        label = None
+        for address in sorted(self.instructions):
+            instr = self.instructions[address]
+            if instr.label is not None:
+                label = instr.label
+                blocks[label] = (self.counts[address], 0)
+            if label is not None:
+                entries, cost = blocks[label]
+                blocks[label] = (entries, cost + self.costs[address])
+        return blocks
+
+    ####
+    ## Output
+    ####
+
+    def collapsed(self):
+        """Lines of a collapsed stack file (flamegraph.pl, speedscope), the cost of every call stack"""
+        return [f'{stack} {cost}' for stack, cost in sorted(self.stacks.items())]
+
+    def report(self, top = 10):
+        """Lines of the report, the top entries of every table"""
+        total = self.total or 1
+        self.__index()
+        lines = [f'cost: {self.total} cycles, {sum(self.counts.values())} instructions']
+
+        inclusive = self.inclusive()
+        lines.append(f'{"function":16} {"calls":>8} {"inclusive":>10} {"%":>6} {"exclusive":>10} {"%":>6}')
+        for function in sorted(inclusive, key = lambda f: (-inclusive[f], f))[:top]:
+            exclusive = self.exclusive.get(function, 0)
+            calls = self.calls.get(function, 1 if function == self.root else 0)
+            lines.append(f'{function:16} {calls:>8} {inclusive[function]:>10} {percent(inclusive[function], total):>6} {exclusive:>10} {percent(exclusive, total):>6}')
+
+        blocks = self.blocks()
+        lines.append(f'{"label":16} {"entries":>8} {"cost":>10} {"%":>6} {"line":>6}')
+        for label, (entries, cost) in sorted(blocks.items(), key = lambda b: (-b[1][1], b[0]))[:top]:
+            lines.append(f'{label:16} {entries:>8} {cost:>10} {percent(cost, total):>6} {self.__line(self.__address(label)):>6}')
+
+        branches = [a for a in self.counts if self.instructions[a].mnemonic in CONDITIONAL_MNEMONICS]
+        lines.append(f'{"branch":16} {"taken":>8} {"not taken":>10} {"taken %":>8} {"line":>6}')
+        for address in sorted(branches, key = lambda a: (-self.counts[a], a))[:top]:
+            taken = self.taken.get(address, 0)
+            lines.append(f'{self.__name(address):16} {taken:>8} {self.counts[address] - taken:>10} {percent(taken, self.counts[address]):>8} {self.__line(address):>6}')
+
+        if self.positions:
+            source = self.lines()
+            lines.append(f'{"line":>6} {"executed":>10} {"cost":>10} {"%":>6}  source')
+            for line, (executed, cost) in sorted(source.items(), key = lambda l: (-l[1][1], l[0]))[:top]:
+                lines.append(f'{line:>6} {executed:>10} {cost:>10} {percent(cost, total):>6}  {self.__quote(line)}')
+
+        lines.append(f'{"instruction":16} {"count":>8} {"cost":>10} {"%":>6} {"line":>6}  code')
+        for address in sorted(self.counts, key = lambda a: (-self.costs[a], a))[:top]:
+            instr = self.instructions[address]
+            code = f'{instr.mnemonic} {instr.operand},{instr.mode}' if instr.mode is not None else instr.mnemonic
+            lines.append(f'{self.__name(address):16} {self.counts[address]:>8} {self.costs[address]:>10} {percent(self.costs[address], total):>6} {self.__line(address):>6}  {code}')
+        return lines
+
+    ####
+    ## Helper functions
+    ####
+
+    def __enter(self, function):
+        self.__calling = False
+        self.calls[function] = self.calls.get(function, 0) + 1
+        self.__stack.append((function, self.total))
+        self.__key = f'{self.__key};{function}'
+
+    def __leave(self):
+        function, start = self.__stack.pop()
+        self.__key = self.__key.rpartition(';')[0]
+        # a recursive call is already counted by the outermost one
+        if all(f != function for f, _ in self.__stack):
+            self.__inclusive[function] = self.__inclusive.get(function, 0) + self.total - start
+
+    def __index(self):
+        """Sorted addresses of the labeled instructions, once per report instead of a scan per row"""
+        self.__labeled = sorted(a for a, i in self.instructions.items() if i.label is not None)
+        self.__labels = {self.instructions[a].label: a for a in self.__labeled}
+
+    def __address(self, label):
+        return self.__labels[label]
+
+    def __name(self, address):
+        """Label of the instruction, or the closest label before it and the offset"""
+        instr = self.instructions[address]
+        if instr.label is not None:
+            return instr.label
+        before = bisect_left(self.__labeled, address)
+        if before == 0:
+            return f'{address:#06x}'
+        start = self.__labeled[before - 1]
+        return f'{self.instructions[start].label}+{address - start}'
+
+    def __line(self, address):
+        position = self.positions.get(address)
+        return position[0] if position is not None else '-'
+
+    def __quote(self, line):
+        if self.source_lines is None or not 0 < line <= len(self.source_lines):
+            return ''
+        return self.source_lines[line - 1].strip()
+
+def percent(part, whole):
+    return f'{100 * part / whole:.1f}' if whole else '-'
@@ -0,0 +1,158 @@
+"""
+    Where a compilation spends its time and memory. The compiler measures
+    every stage it runs (parsing, analysis, each pass, code generation,
+    output formatting) when it has a profiler:
+
+        profiler = StageProfiler(hooks = [print])
+        Compiler(profiler = profiler).translate(input_file, root_node)
+        print('\\n'.join(profile_table(profiler.records)))
+
+    Memory is traced with tracemalloc only while a stage runs, the times
+    of a traced stage include its overhead.
+"""
+
+import ast
+import json
+import time
+import tracemalloc
+
+class StageRecord():
+    """Measures of one stage of one compilation, nodes and instructions are None when the stage has neither"""
+    __slots__ = ('input_file', 'stage', 'wall', 'cpu', 'peak', 'nodes', 'instructions')
+
+    def __init__(self, input_file, stage, wall, cpu, peak = None, nodes = None, instructions = None) -> None:
+        self.input_file = input_file
+        self.stage = stage
+        self.wall = wall                # seconds
+        self.cpu = cpu                  # seconds of CPU time of the process
+        self.peak = peak                # most bytes allocated at once during the stage, None without memory tracing
+        self.nodes = nodes              # AST nodes of the module after the stage
+        self.instructions = instructions # instructions the CPU executes in what the stage produced
+
+    def as_dict(self):
+        return {'file': self.input_file, 'stage': self.stage, 'wall_ms': round(self.wall * 1000, 3), 'cpu_ms': round(self.cpu * 1000, 3),
+                'peak_bytes': self.peak, 'ast_nodes': self.nodes, 'instructions': self.instructions}
+
+    def __repr__(self):
+        return f'StageRecord({self.input_file}: {self.stage} {self.wall * 1000:.3f} ms)'
+
+class StageProfiler():
+    """
+        Collects a StageRecord per stage, across compilations. Every hook
+        is called with each record as soon as its stage ends.
+    """
+
+    def __init__(self, memory = True, hooks = ()) -> None:
+        self.memory = memory
+        self.hooks = list(hooks)
+        self.records = []
+
+    def stage(self, name, input_file = None):
+        return Stage(self, name, input_file)
+
+    def add(self, record):
+        self.records.append(record)
+        for hook in self.hooks:
+            hook(record)
+
+class Stage():
+    """
+        Context manager measuring one stage. The stage sets ast to the
+        module it changed or instructions to the IR it produced, they are
+        counted once the measures are taken.
+    """
+
+    def __init__(self, profiler, name, input_file) -> None:
+        self.profiler = profiler
+        self.name = name
+        self.input_file = input_file
+        self.ast = None
+        self.instructions = None
+        self.__wall = 0
+        self.__cpu = 0
+        self.__base = 0
+        self.__traced = False   # tracemalloc was started for this stage
+
+    def __enter__(self):
+        if self.profiler.memory:
+            if tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+                self.__base = tracemalloc.get_traced_memory()[0]
+            else:
+                tracemalloc.start()
+                self.__traced = True
+        self.__cpu = time.process_time()
+        self.__wall = time.perf_counter()
+        return self
+
+    def __exit__(self, kind, value, traceback):
+        wall = time.perf_counter() - self.__wall
+        cpu = time.process_time() - self.__cpu
+        peak = None
+        if self.profiler.memory:
+            peak = max(0, tracemalloc.get_traced_memory()[1] - self.__base)
+            if self.__traced:
+                tracemalloc.stop()
+        if kind is None:
+            nodes = sum(1 for _ in ast.walk(self.ast)) if self.ast is not None else None
+            instructions = sum(1 for i in self.instructions if i.is_code) if self.instructions is not None else None
+            self.profiler.add(StageRecord(self.input_file, self.name, wall, cpu, peak, nodes, instructions))
+        return False
+
+class NoStage():
+    """Stage of a compilation without a profiler, measures nothing"""
+
+    def __init__(self) -> None:
+        self.ast = None
+        self.instructions = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, kind, value, traceback):
+        return False
+
+####
+## Output
+####
+
+def profile_table(records):
+    """Lines of a table with one row per stage, the stages of several compilations are added up"""
+    stages = {}
+    for record in records:
+        total = stages.get(record.stage)
+        if total is None:
+            stages[record.stage] = StageRecord(None, record.stage, record.wall, record.cpu, record.peak, record.nodes, record.instructions)
+            continue
+        total.wall += record.wall
+        total.cpu += record.cpu
+        total.peak = max_of(total.peak, record.peak)
+        total.nodes = sum_of(total.nodes, record.nodes)
+        total.instructions = sum_of(total.instructions, record.instructions)
+    files = len({record.input_file for record in records})
+    lines = [f'{"stage":16} {"wall ms":>10} {"cpu ms":>10} {"peak KiB":>10} {"AST nodes":>10} {"instructions":>12}']
+    for total in stages.values():
+        lines.append(f'{total.stage:16} {total.wall * 1000:10.2f} {total.cpu * 1000:10.2f} {kib(total.peak):>10} {blank(total.nodes):>10} {blank(total.instructions):>12}')
+    wall = sum(s.wall for s in stages.values())
+    cpu = sum(s.cpu for s in stages.values())
+    peak = None
+    for total in stages.values():
+        peak = max_of(peak, total.peak)
+    lines.append(f'{f"total ({files} files)" if files > 1 else "total":16} {wall * 1000:10.2f} {cpu * 1000:10.2f} {kib(peak):>10}')
+    return lines
+
+def profile_json(records):
+    """One JSON object per line and per record"""
+    return [json.dumps(record.as_dict(), sort_keys=True) for record in records]
+
+def kib(size):
+    return f'{size / 1024:.1f}' if size is not None else '-'
+
+def blank(value):
+    return value if value is not None else '-'
+
+def max_of(a, b):
+    return b if a is None else a if b is None else max(a, b)
+
+def sum_of(a, b):
+    return b if a is None else a if b is None else a + b
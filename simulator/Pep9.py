@@ -0,0 +1,679 @@
+"""
+    Pep/9 assembler and CPU simulator.
+
+    The assembler understands the source the compiler emits (and the hand
+    written programs in _samples): labels, comments, the usual addressing
+    modes and the .BLOCK/.WORD/.BYTE/.ASCII/.ADDRSS/.EQUATE/.END directives.
+    It also takes the compiler IR directly, skipping text altogether.
+    The CPU executes the assembled program with scripted stdin and counts
+    instructions and data memory accesses, so programs can be compared
+    without the Pep/9 IDE.
+"""
+
+import argparse
+import sys
+
+MEMORY_SIZE = 0x10000
+STACK_TOP = 0xFB8F      # initial user stack pointer of the Pep/9 operating system
+CHAR_IN = 0xFC15        # memory mapped input device
+CHAR_OUT = 0xFC16       # memory mapped output device
+
+PREDEFINED_SYMBOLS = {'charIn': CHAR_IN, 'charOut': CHAR_OUT}
+
+# mnemonic -> opcode, unary instructions are a single byte
+UNARY = {
+    'STOP': 0x00, 'RET': 0x01, 'RETTR': 0x02, 'MOVSPA': 0x03, 'MOVFLGA': 0x04, 'MOVAFLG': 0x05,
+    'NOTA': 0x06, 'NOTX': 0x07, 'NEGA': 0x08, 'NEGX': 0x09, 'ASLA': 0x0A, 'ASLX': 0x0B,
+    'ASRA': 0x0C, 'ASRX': 0x0D, 'ROLA': 0x0E, 'ROLX': 0x0F, 'RORA': 0x10, 'RORX': 0x11,
+    'NOP0': 0x26, 'NOP1': 0x27,
+}
+# branches only accept immediate and indexed addressing, encoded on one bit
+BRANCHES = {
+    'BR': 0x12, 'BRLE': 0x14, 'BRLT': 0x16, 'BREQ': 0x18, 'BRNE': 0x1A, 'BRGE': 0x1C,
+    'BRGT': 0x1E, 'BRV': 0x20, 'BRC': 0x22, 'CALL': 0x24,
+}
+# everything else takes a three bit addressing mode
+NON_UNARY = {
+    'NOP': 0x28, 'DECI': 0x30, 'DECO': 0x38, 'HEXO': 0x40, 'STRO': 0x48, 'ADDSP': 0x50,
+    'SUBSP': 0x58, 'ADDA': 0x60, 'ADDX': 0x68, 'SUBA': 0x70, 'SUBX': 0x78, 'ANDA': 0x80,
+    'ANDX': 0x88, 'ORA': 0x90, 'ORX': 0x98, 'CPWA': 0xA0, 'CPWX': 0xA8, 'CPBA': 0xB0,
+    'CPBX': 0xB8, 'LDWA': 0xC0, 'LDWX': 0xC8, 'LDBA': 0xD0, 'LDBX': 0xD8, 'STWA': 0xE0,
+    'STWX': 0xE8, 'STBA': 0xF0, 'STBX': 0xF8,
+}
+MODES = {'i': 0, 'd': 1, 'n': 2, 's': 3, 'sf': 4, 'x': 5, 'sx': 6, 'sfx': 7}
+BRANCH_MODES = {'i': 0, 'x': 1}
+# instructions that only read memory through their operand, an immediate makes no sense for the others
+NO_IMMEDIATE = {'DECI', 'STRO', 'STWA', 'STWX', 'STBA', 'STBX'}
+
+class AssemblerError(Exception):
+    pass
+
+class SimulationError(Exception):
+    pass
+
+class Instruction():
+    """One assembled instruction, operand is already resolved to a number"""
+    __slots__ = ('address', 'mnemonic', 'operand', 'mode', 'size', 'label', 'line')
+
+    def __init__(self, address, mnemonic, operand, mode, size, label, line) -> None:
+        self.address = address
+        self.mnemonic = mnemonic
+        self.operand = operand
+        self.mode = mode
+        self.size = size
+        self.label = label
+        self.line = line
+
+class Program():
+    """Result of the assembler: memory image, symbols and the decoded instructions by address"""
+
+    def __init__(self, memory, symbols, instructions, size) -> None:
+        self.memory = memory
+        self.symbols = symbols
+        self.instructions = instructions
+        self.size = size
+
+####
+## Assembler
+####
+
+class Assembler():
+
+    def assemble(self, source):
+        """source is assembly text or a list of IR instructions (ir.Instruction)"""
+        statements = self.__ir_statements(source) if not isinstance(source, str) else self.__text_statements(source)
+
+        # first pass: addresses and symbols
+        symbols = dict(PREDEFINED_SYMBOLS)
+        address = 0
+        located = []
+        for label, mnemonic, value, mode, number in statements:
+            if mnemonic == '.EQUATE':
+                if label is None:
+                    raise AssemblerError(f'line {number}: .EQUATE needs a label')
+                symbols[label] = self.__number(value, {}, number)
+                continue
+            if label is not None:
+                if label in symbols and label not in PREDEFINED_SYMBOLS:
+                    raise AssemblerError(f'line {number}: duplicate symbol {label}')
+                symbols[label] = address
+            located.append((address, label, mnemonic, value, mode, number))
+            address += self.__size(mnemonic, value, number)
+        if address > MEMORY_SIZE:
+            raise AssemblerError(f'program does not fit in memory ({address} bytes)')
+        end = address
+
+        # second pass: resolve operands and build the memory image
+        memory = bytearray(MEMORY_SIZE)
+        instructions = {}
+        for address, label, mnemonic, value, mode, number in located:
+            if mnemonic == '.END':
+                continue
+            if mnemonic[0] == '.':
+                self.__directive(memory, address, mnemonic, value, symbols, number)
+                continue
+            operand, mode = self.__operand(mnemonic, value, mode, symbols, number)
+            if mnemonic in UNARY:
+                memory[address] = UNARY[mnemonic]
+                size = 1
+            else:
+                opcode = BRANCHES[mnemonic] + BRANCH_MODES[mode] if mnemonic in BRANCHES else NON_UNARY[mnemonic] + MODES[mode]
+                memory[address] = opcode
+                memory[address + 1] = (operand >> 8) & 0xFF
+                memory[address + 2] = operand & 0xFF
+                size = 3
+            instructions[address] = Instruction(address, mnemonic, operand, mode, size, label, number)
+        return Program(memory, symbols, instructions, end)
+
+    def __text_statements(self, source):
+        """(label, mnemonic, value, mode, line) of every line of assembly text"""
+        statements = []
+        for number, line in enumerate(source.splitlines(), start=1):
+            statement = self.__parse_line(line, number)
+            if statement is None:
+                continue
+            statements.append(statement)
+            if statement[1] == '.END':
+                break
+        return statements
+
+    def __ir_statements(self, instructions):
+        """(label, mnemonic, value, mode, index) of IR instructions, no text is parsed"""
+        statements = []
+        for number, instr in enumerate(instructions, start=1):
+            if instr.opcode is None:
+                continue
+            mnemonic = instr.opcode.value
+            mode = instr.mode.value if instr.mode is not None else None
+            statements.append((instr.label, mnemonic, instr.operand, mode, number))
+            if mnemonic == '.END':
+                break
+        return statements
+
+    def __parse_line(self, line, number):
+        code = self.__strip_comment(line).strip()
+        if not code:
+            return None
+        label = None
+        head = code.split(None, 1)[0]
+        if head.endswith(':'):
+            label = head[:-1]
+            code = code[len(head):].strip()
+            if not code:
+                raise AssemblerError(f'line {number}: label {label} without an instruction')
+        parts = code.split(None, 1)
+        mnemonic = parts[0].upper()
+        args = parts[1].strip() if len(parts) > 1 else ''
+        if mnemonic[0] == '.':
+            return label, mnemonic, args, None, number
+        if mnemonic not in UNARY and mnemonic not in BRANCHES and mnemonic not in NON_UNARY:
+            raise AssemblerError(f'line {number}: unknown mnemonic {parts[0]}')
+        if not args:
+            return label, mnemonic, None, None, number
+        value, _, mode = args.rpartition(',')
+        if not value:
+            # branches default to immediate addressing
+            value, mode = args, 'i' if mnemonic in BRANCHES else None
+        return label, mnemonic, value.strip(), mode.strip().lower() if mode else None, number
+
+    def __strip_comment(self, line):
+        quote = None
+        escaped = False
+        for i, c in enumerate(line):
+            if escaped:
+                escaped = False
+            elif c == '\\':
+                escaped = True
+            elif quote:
+                if c == quote:
+                    quote = None
+            elif c in '\'"':
+                quote = c
+            elif c == ';':
+                return line[:i]
+        return line
+
+    def __size(self, mnemonic, args, number):
+        if mnemonic in UNARY:
+            return 1
+        if mnemonic[0] != '.':
+            return 3
+        match mnemonic:
+            case '.BLOCK':
+                return self.__number(args, {}, number)
+            case '.WORD' | '.ADDRSS':
+                return 2
+            case '.BYTE':
+                return 1
+            case '.ASCII':
+                return len(self.__string(args, number))
+            case '.END':
+                return 0
+            case _:
+                raise AssemblerError(f'line {number}: unsupported directive {mnemonic}')
+
+    def __directive(self, memory, address, mnemonic, args, symbols, number):
+        match mnemonic:
+            case '.WORD' | '.ADDRSS':
+                value = self.__number(args, symbols, number) & 0xFFFF
+                memory[address] = value >> 8
+                memory[address + 1] = value & 0xFF
+            case '.BYTE':
+                memory[address] = self.__number(args, symbols, number) & 0xFF
+            case '.ASCII':
+                data = self.__string(args, number)
+                memory[address:address + len(data)] = data
+            # .BLOCK is already zeroed
+
+    def __operand(self, mnemonic, value, mode, symbols, number):
+        if mnemonic in UNARY:
+            if value is not None:
+                raise AssemblerError(f'line {number}: {mnemonic} takes no operand')
+            return 0, None
+        if value is None:
+            raise AssemblerError(f'line {number}: {mnemonic} needs an operand')
+        if mode is None:
+            raise AssemblerError(f'line {number}: {mnemonic} needs an addressing mode')
+        allowed = BRANCH_MODES if mnemonic in BRANCHES else MODES
+        if mode not in allowed or (mode == 'i' and mnemonic in NO_IMMEDIATE):
+            raise AssemblerError(f'line {number}: illegal addressing mode {mode} for {mnemonic}')
+        return self.__number(value, symbols, number) & 0xFFFF, mode
+
+    def __number(self, text, symbols, number):
+        if isinstance(text, int):
+            return text
+        text = text.strip()
+        try:
+            if text.startswith(("'", '"')):
+                data = self.__string(text, number)
+                if len(data) != 1:
+                    raise AssemblerError(f'line {number}: bad character constant {text}')
+                return data[0]
+            if text.lower().startswith('0x'):
+                return int(text, 16)
+            if text.lstrip('+-').isdigit():
+                return int(text)
+        except ValueError:
+            raise AssemblerError(f'line {number}: bad number {text}')
+        if text in symbols:
+            return symbols[text]
+        raise AssemblerError(f'line {number}: undefined symbol {text}')
+
+    def __string(self, text, number):
+        text = text.strip()
+        if len(text) < 2 or text[0] not in '\'"' or text[-1] != text[0]:
+            raise AssemblerError(f'line {number}: bad string {text}')
+        try:
+            return text[1:-1].encode().decode('unicode_escape').encode('latin-1')
+        except UnicodeError:
+            raise AssemblerError(f'line {number}: bad string {text}')
+
+####
+## CPU
+####
+
+class ExecutionResult():
+
+    def __init__(self, output, instructions, memory_reads, memory_writes, counts, program) -> None:
+        self.output = output
+        self.instructions = instructions
+        self.memory_reads = memory_reads
+        self.memory_writes = memory_writes
+        self.counts = counts        # execution count per instruction address
+        self.program = program
+
+    @property
+    def cycles(self):
+        """Simple cost model: one unit per executed instruction plus one per data memory access"""
+        return self.instructions + self.memory_reads + self.memory_writes
+
+    def mnemonic_counts(self):
+        counts = {}
+        for address, count in self.counts.items():
+            mnemonic = self.program.instructions[address].mnemonic
+            counts[mnemonic] = counts.get(mnemonic, 0) + count
+        return counts
+
+    def report(self):
+        lines = [
+            f'instructions:  {self.instructions}',
+            f'memory reads:  {self.memory_reads}',
+            f'memory writes: {self.memory_writes}',
+            f'cycles:        {self.cycles}',
+        ]
+        for mnemonic, count in sorted(self.mnemonic_counts().items(), key=lambda c: (-c[1], c[0])):
+            lines.append(f'  {mnemonic:<8}{count}')
+        return '\n'.join(lines)
+
+def to_signed(value):
+    return value - 0x10000 if value & 0x8000 else value
+
+class CPU():
+    """Executes a Program; DECI/DECO/HEXO/STRO are handled natively instead of through the OS traps"""
+
+    def __init__(self, program, stdin='', max_steps=10_000_000, profiler=None) -> None:
+        self.program = program
+        # sees every executed instruction (a HotspotProfiler), None to only count them
+        self.profiler = profiler
+        self.memory = bytearray(program.memory)
+        self.stdin = stdin
+        self.max_steps = max_steps
+        self.a = self.x = 0
+        self.sp = STACK_TOP
+        self.pc = 0
+        self.n = self.z = self.v = self.c = 0
+        self.reads = 0
+        self.writes = 0
+        self.__input_pos = 0
+        self.__output = []
+
+    def run(self):
+        instructions = self.program.instructions
+        profiler = self.profiler
+        counts = {}
+        steps = 0
+        while True:
+            instr = instructions.get(self.pc)
+            if instr is None:
+                # memory is zeroed, so running off the end of the program executes STOP
+                if self.memory[self.pc] == 0:
+                    break
+                raise SimulationError(f'executing data at address {self.pc:#06x}')
+            steps += 1
+            if steps > self.max_steps:
+                raise SimulationError(f'exceeded {self.max_steps} instructions')
+            counts[self.pc] = counts.get(self.pc, 0) + 1
+            self.pc = (self.pc + instr.size) & 0xFFFF
+            if profiler is None:
+                if self.__execute(instr):
+                    break
+                continue
+            accesses = self.reads + self.writes
+            stop = self.__execute(instr)
+            # the cost of ExecutionResult.cycles
+            profiler.executed(instr, self.pc, 1 + self.reads + self.writes - accesses)
+            if stop:
+                break
+        return ExecutionResult(''.join(self.__output), steps, self.reads, self.writes, counts, self.program)
+
+    def __execute(self, instr):
+        """Execute one instruction, returns True on STOP"""
+        m = instr.mnemonic
+        match m:
+            case 'LDWA':
+                self.a = self.__word_operand(instr)
+                self.__nz(self.a)
+            case 'LDWX':
+                self.x = self.__word_operand(instr)
+                self.__nz(self.x)
+            case 'STWA':
+                self.__write_word(self.__address(instr), self.a)
+            case 'STWX':
+                self.__write_word(self.__address(instr), self.x)
+            case 'ADDA':
+                self.a = self.__add(self.a, self.__word_operand(instr))
+            case 'ADDX':
+                self.x = self.__add(self.x, self.__word_operand(instr))
+            case 'SUBA':
+                self.a = self.__sub(self.a, self.__word_operand(instr))
+            case 'SUBX':
+                self.x = self.__sub(self.x, self.__word_operand(instr))
+            case 'CPWA' | 'CPWX':
+                self.__sub(self.a if m == 'CPWA' else self.x, self.__word_operand(instr))
+                self.n ^= self.v # the comparison result is correct even on overflow
+            case 'BR':
+                self.pc = self.__branch_target(instr)
+            case 'BRLE':
+                if self.n or self.z:
+                    self.pc = self.__branch_target(instr)
+            case 'BRLT':
+                if self.n:
+                    self.pc = self.__branch_target(instr)
+            case 'BREQ':
+                if self.z:
+                    self.pc = self.__branch_target(instr)
+            case 'BRNE':
+                if not self.z:
+                    self.pc = self.__branch_target(instr)
+            case 'BRGE':
+                if not self.n:
+                    self.pc = self.__branch_target(instr)
+            case 'BRGT':
+                if not self.n and not self.z:
+                    self.pc = self.__branch_target(instr)
+            case 'BRV':
+                if self.v:
+                    self.pc = self.__branch_target(instr)
+            case 'BRC':
+                if self.c:
+                    self.pc = self.__branch_target(instr)
+            case 'CALL':
+                target = self.__branch_target(instr)
+                self.sp = (self.sp - 2) & 0xFFFF
+                self.__write_word(self.sp, self.pc)
+                self.pc = target
+            case 'RET':
+                self.pc = self.__read_word(self.sp)
+                self.sp = (self.sp + 2) & 0xFFFF
+            case 'SUBSP':
+                self.sp = self.__sub(self.sp, self.__word_operand(instr))
+            case 'ADDSP':
+                self.sp = self.__add(self.sp, self.__word_operand(instr))
+            case 'ANDA' | 'ANDX' | 'ORA' | 'ORX':
+                value = self.__word_operand(instr)
+                register = self.a if m[-1] == 'A' else self.x
+                register = register & value if m.startswith('AND') else register | value
+                self.__nz(register)
+                self.__set_register(m, register)
+            case 'LDBA' | 'LDBX':
+                # only the low byte is loaded, the high one stays
+                value = self.__byte_operand(instr)
+                register = self.a if m[-1] == 'A' else self.x
+                self.__set_register(m, (register & 0xFF00) | value)
+                self.n = 0
+                self.z = int(value == 0)
+            case 'STBA' | 'STBX':
+                register = self.a if m[-1] == 'A' else self.x
+                self.__write_byte(self.__address(instr), register & 0xFF)
+            case 'CPBA' | 'CPBX':
+                register = self.a if m[-1] == 'A' else self.x
+                result = ((register & 0xFF) - self.__byte_operand(instr)) & 0xFF
+                self.n = result >> 7
+                self.z = int(result == 0)
+                self.v = self.c = 0
+            case 'ASLA' | 'ASLX':
+                register = self.a if m[-1] == 'A' else self.x
+                result = (register << 1) & 0xFFFF
+                self.c = register >> 15
+                self.v = int((register ^ result) >> 15)
+                self.__nz(result)
+                self.__set_register(m, result)
+            case 'ASRA' | 'ASRX':
+                register = self.a if m[-1] == 'A' else self.x
+                self.c = register & 1
+                result = (register >> 1) | (register & 0x8000)
+                self.__nz(result)
+                self.__set_register(m, result)
+            case 'ROLA' | 'ROLX':
+                register = self.a if m[-1] == 'A' else self.x
+                result = ((register << 1) | self.c) & 0xFFFF
+                self.c = register >> 15
+                self.__set_register(m, result)
+            case 'RORA' | 'RORX':
+                register = self.a if m[-1] == 'A' else self.x
+                result = (register >> 1) | (self.c << 15)
+                self.c = register & 1
+                self.__set_register(m, result)
+            case 'NEGA' | 'NEGX':
+                register = self.a if m[-1] == 'A' else self.x
+                result = (-register) & 0xFFFF
+                self.v = int(register == 0x8000)
+                self.__nz(result)
+                self.__set_register(m, result)
+            case 'NOTA' | 'NOTX':
+                result = ~(self.a if m[-1] == 'A' else self.x) & 0xFFFF
+                self.__nz(result)
+                self.__set_register(m, result)
+            case 'MOVSPA':
+                self.a = self.sp
+            case 'MOVFLGA':
+                self.a = (self.n << 3) | (self.z << 2) | (self.v << 1) | self.c
+            case 'MOVAFLG':
+                self.n, self.z, self.v, self.c = (self.a >> 3) & 1, (self.a >> 2) & 1, (self.a >> 1) & 1, self.a & 1
+            case 'DECI':
+                value = self.__read_decimal()
+                self.v = int(not -32768 <= value <= 32767)
+                value &= 0xFFFF
+                self.__nz(value)
+                self.__write_word(self.__address(instr), value)
+            case 'DECO':
+                self.__output.append(str(to_signed(self.__word_operand(instr))))
+            case 'HEXO':
+                self.__output.append(f'{self.__word_operand(instr):04X}')
+            case 'STRO':
+                address = self.__address(instr)
+                while True:
+                    byte = self.__read_byte(address)
+                    if byte == 0:
+                        break
+                    self.__output.append(chr(byte))
+                    address = (address + 1) & 0xFFFF
+            case 'STOP':
+                return True
+            case 'NOP0' | 'NOP1' | 'NOP':
+                pass
+            case _:
+                raise SimulationError(f'unsupported instruction {m} at line {instr.line}')
+        return False
+
+    ####
+    ## Helper functions
+    ####
+
+    def __set_register(self, mnemonic, value):
+        if mnemonic[-1] == 'A':
+            self.a = value
+        else:
+            self.x = value
+
+    def __nz(self, value):
+        self.n = value >> 15
+        self.z = int(value == 0)
+
+    def __add(self, left, right, carry = 0):
+        total = left + right + carry
+        result = total & 0xFFFF
+        self.c = total >> 16
+        self.v = int(((left ^ result) & (right ^ result)) >> 15)
+        self.__nz(result)
+        return result
+
+    def __sub(self, left, right):
+        # Pep/9 subtracts by adding the one's complement plus one, C = 1 means there was no borrow
+        return self.__add(left, ~right & 0xFFFF, 1)
+
+    def __address(self, instr):
+        """Effective address of a memory operand"""
+        operand = instr.operand
+        match instr.mode:
+            case 'd':
+                return operand
+            case 's':
+                return (self.sp + operand) & 0xFFFF
+            case 'x':
+                return (operand + self.x) & 0xFFFF
+            case 'sx':
+                return (self.sp + operand + self.x) & 0xFFFF
+            case 'n':
+                return self.__read_word(operand)
+            case 'sf':
+                return self.__read_word((self.sp + operand) & 0xFFFF)
+            case 'sfx':
+                return (self.__read_word((self.sp + operand) & 0xFFFF) + self.x) & 0xFFFF
+        raise SimulationError(f'illegal addressing mode {instr.mode} for {instr.mnemonic} at line {instr.line}')
+
+    def __word_operand(self, instr):
+        if instr.mode == 'i':
+            return instr.operand
+        return self.__read_word(self.__address(instr))
+
+    def __byte_operand(self, instr):
+        if instr.mode == 'i':
+            return instr.operand & 0xFF
+        return self.__read_byte(self.__address(instr))
+
+    def __branch_target(self, instr):
+        if instr.mode == 'x':
+            return self.__read_word((instr.operand + self.x) & 0xFFFF)
+        return instr.operand
+
+    def __read_word(self, address):
+        self.reads += 1
+        return (self.memory[address] << 8) | self.memory[(address + 1) & 0xFFFF]
+
+    def __write_word(self, address, value):
+        self.writes += 1
+        self.memory[address] = (value >> 8) & 0xFF
+        self.memory[(address + 1) & 0xFFFF] = value & 0xFF
+
+    def __read_byte(self, address):
+        self.reads += 1
+        if address == CHAR_IN:
+            if self.__input_pos >= len(self.stdin):
+                raise SimulationError('input exhausted')
+            self.__input_pos += 1
+            return ord(self.stdin[self.__input_pos - 1]) & 0xFF
+        return self.memory[address]
+
+    def __write_byte(self, address, value):
+        self.writes += 1
+        if address == CHAR_OUT:
+            self.__output.append(chr(value))
+        else:
+            self.memory[address] = value
+
+    def __read_decimal(self):
+        text = self.stdin
+        pos = self.__input_pos
+        while pos < len(text) and text[pos].isspace():
+            pos += 1
+        start = pos
+        if pos < len(text) and text[pos] in '+-':
+            pos += 1
+        while pos < len(text) and text[pos].isdigit():
+            pos += 1
+        if pos == start or not text[start:pos].lstrip('+-'):
+            raise SimulationError('DECI: no decimal number in input' if pos < len(text) else 'input exhausted')
+        self.__input_pos = pos
+        return int(text[start:pos])
+
+####
+## Convenience API and command line
+####
+
+def assemble(source):
+    return Assembler().assemble(source)
+
+def run(source, stdin='', max_steps=10_000_000, profiler=None):
+    """Assemble and execute a Pep/9 program (text or IR instructions), returns an ExecutionResult"""
+    return CPU(assemble(source), stdin, max_steps, profiler).run()
+
+def main():
+    parser = argparse.ArgumentParser(description='Assemble and run a Pep/9 program')
+    parser.add_argument('file', help='Pep/9 source (.pep) or python program (.py) to compile first')
+    parser.add_argument('-i', '--input', default='', help='text fed to DECI/charIn')
+    parser.add_argument('--input-file', help='read the program input from a file')
+    parser.add_argument('--max-steps', type=int, default=10_000_000)
+    parser.add_argument('--hotspots', nargs='?', type=int, const=10, metavar='N', help='profile the run: the N (default: 10) costliest functions, labels, branches, source lines and instructions on stderr')
+    parser.add_argument('--flamegraph', metavar='PATH', help='profile the run and write the cost of every call stack as a collapsed stack file')
+    parser.add_argument('--source-map', metavar='PATH', help='source map of a .pep file for the profile (default: the .pep.map next to it)')
+    args = parser.parse_args()
+
+    with open(args.file) as f:
+        source = f.read()
+    profiler = None
+    if args.hotspots is not None or args.flamegraph:
+        source, profiler = profiled(args.file, source, args.source_map)
+    elif args.file.endswith('.py'):
+        from compiler import compile_program
+        source = compile_program(source, args.file)
+    stdin = args.input
+    if args.input_file:
+        with open(args.input_file) as f:
+            stdin = f.read()
+    try:
+        result = run(source, stdin, args.max_steps, profiler)
+    except (AssemblerError, SimulationError) as e:
+        print(f'error: {e}', file=sys.stderr)
+        sys.exit(1)
+    print(result.output)
+    print(result.report(), file=sys.stderr)
+    if args.hotspots is not None:
+        print('\n'.join(profiler.report(args.hotspots)), file=sys.stderr)
+    if args.flamegraph:
+        with open(args.flamegraph, 'w') as f:
+            f.write('\n'.join(profiler.collapsed()) + '\n')
+
+def profiled(path, source, map_path = None):
+    """(program text, HotspotProfiler) of a .pep or .py file, with its source map when there is one"""
+    import json
+    import os
+    from profiling.HotspotProfiler import HotspotProfiler
+    if path.endswith('.py'):
+        from compiler import Compiler
+        compiler = Compiler(source_map=True)
+        text = '\n'.join(compiler.translate(path, compiler.parse(source, path))) + '\n'
+        return text, HotspotProfiler(compiler.mapping, source_lines=source.splitlines())
+    map_path = map_path or os.path.splitext(path)[0] + '.pep.map'
+    if not os.path.isfile(map_path):
+        return source, HotspotProfiler()
+    with open(map_path) as f:
+        mapping = json.load(f)
+    lines = None
+    if os.path.isfile(mapping['file']):
+        with open(mapping['file']) as f:
+            lines = f.read().splitlines()
+    return source, HotspotProfiler(mapping, source_lines=lines)
+
+if __name__ == '__main__':
+    main()
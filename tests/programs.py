@@ -0,0 +1,36 @@
+"""
+    Helpers of the tests: python programs are compiled, run in the built-in
+    Pep/9 simulator and what they print is compared with what CPython
+    prints. DECO writes the numbers one after the other, so the values
+    CPython prints are joined without separator too.
+"""
+
+from compiler import Compiler
+from simulator.Pep9 import run
+
+# the code the visitors generate, without any optimization pass
+UNOPTIMIZED = {'inline_budget': 0, 'fold_constants': False, 'optimize_loops': False, 'registers': False, 'branches': False,
+               'byte_arrays': False, 'tail_calls': False, 'prune': False, 'peephole': False}
+
+MAX_STEPS = 2_000_000
+
+def python_output(source, inputs = ()):
+    """What CPython prints running source, input() returns the inputs one after the other"""
+    values = iter(inputs)
+    printed = []
+    scope = {'__name__': '__main__', 'input': lambda: str(next(values)), 'print': lambda value: printed.append(str(value))}
+    try:
+        exec(compile(source, '<test>', 'exec'), scope)
+    except SystemExit:
+        pass
+    return ''.join(printed)
+
+def compile_run(source, inputs = (), **options):
+    """(compiler, ExecutionResult) of source compiled with options and run in the simulator"""
+    compiler = Compiler(**options)
+    text = '\n'.join(compiler.translate('<test>', compiler.parse(source))) + '\n'
+    return compiler, run(text, ' '.join(str(v) for v in inputs), MAX_STEPS)
+
+def compiled_output(source, inputs = (), **options):
+    """What the compiled program prints in the simulator"""
+    return compile_run(source, inputs, **options)[1].output
@@ -0,0 +1,61 @@
+import ast
+import pytest
+from analysis.ProgramAnalysis import ProgramAnalysis
+
+SOURCE = '''size = 3
+total = 0
+arr_ = [0] * 4
+def grow(a, b):
+    global total
+    k = a + b
+    buf_ = [0] * 5
+    if k > 2:
+        k += 1
+        total = total + k
+    return k
+def show(v):
+    w = grow(v, size)
+    print(w)
+i = 0
+while i < size:
+    show(i)
+    i = i + 1
+total = grow(size, 1)
+'''
+
+def analyze(source):
+    module = ast.parse(source)
+    return module, ProgramAnalysis().analyze(module)
+
+def test_function_summaries():
+    _, analysis = analyze(SOURCE)
+    assert list(analysis.functions) == ['grow', 'show']
+    grow, show = analysis.functions['grow'], analysis.functions['show']
+    assert grow.params == ['a', 'b'] and grow.declared_globals == {'total'}
+    assert list(grow.locals) == ['k', 'buf_'] and grow.returns
+    assert grow.calls == [] and show.calls == ['grow', 'print']
+    assert not show.returns and list(show.locals) == ['w']
+    assert grow.is_array('buf_') and not grow.is_array('k')
+    assert grow.local_size('buf_') == 10 and grow.local_size('k') == 2
+
+def test_globals():
+    module, analysis = analyze(SOURCE)
+    assert analysis.assignment_counts == {'size': 1, 'total': 2, 'arr_': 1, 'i': 2}
+    assert analysis.assigned_in_functions == {'total'}
+    assert [n.targets[0].id for n in analysis.global_assignments] == ['size', 'total', 'arr_', 'total', 'i', 'i', 'total']
+    # the constants and the zeroed array are allocated initialized, i = 0 as well
+    initialized = [n for n in module.body if id(n) in analysis.initializers()]
+    assert [n.targets[0].id for n in initialized] == ['size', 'total', 'arr_', 'i']
+
+def test_calls_and_frames():
+    _, analysis = analyze(SOURCE)
+    assert analysis.top_level_calls == ['show', 'grow']
+    assert analysis.signatures() == {'grow': (2, True), 'show': (1, False)}
+    # two arguments and the return value of grow
+    assert analysis.call_area('show') == 6 and analysis.call_area() == 6 and analysis.call_area('grow') == 0
+
+def test_unsupported():
+    with pytest.raises(ValueError):
+        analyze('def f():\n    def g():\n        return 1\n    return 2\n')
+    with pytest.raises(ValueError):
+        analyze('a = b = 1\n')
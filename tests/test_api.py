@@ -0,0 +1,44 @@
+import io
+import os
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from compiler import compile_source, compile_to
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROGRAMS = [
+    'x = 3\ny = x + 4\nprint(y)\n',
+    'def add(a, b):\n    c = a + b\n    return c\nn = int(input())\nk = 2\nr = add(n, k)\nprint(r)\n',
+    'i = 0\nwhile i < 3:\n    if i == 1:\n        print(i)\n    i = i + 1\n',
+]
+
+class CountingFile(io.StringIO):
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.writes = 0
+
+    def write(self, text):
+        self.writes += 1
+        return super().write(text)
+
+def test_same_program_as_the_command_line(tmp_path):
+    for i, source in enumerate(PROGRAMS):
+        path = tmp_path / f'program{i}.py'
+        path.write_text(source)
+        cli = subprocess.run([sys.executable, os.path.join(ROOT, 'translator.py'), '-f', str(path)], capture_output=True, text=True, check=True)
+        assert compile_source(source, str(path)) == cli.stdout
+
+def test_compile_to_writes_once():
+    out = CountingFile()
+    compile_to(out, PROGRAMS[1], 'add.py')
+    assert out.writes == 1
+    assert out.getvalue() == compile_source(PROGRAMS[1], 'add.py')
+    assert out.getvalue().startswith('; Translating add.py\n')
+
+def test_compilations_in_threads():
+    expected = [compile_source(source) for source in PROGRAMS]
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(compile_source, PROGRAMS * 20))
+    assert results == expected * 20
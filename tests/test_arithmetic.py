@@ -0,0 +1,47 @@
+import pytest
+from programs import UNOPTIMIZED, compile_run, compiled_output, python_output
+
+# operands read from the input, so the operations run in the routines
+PAIRS = [(a, b) for a in (17, -17, 16, -16, 0, 1, -1, 255) for b in (5, -5, 1, -1, 16, -16, 3)]
+
+RUNTIME = '''a = int(input())
+b = int(input())
+print(a * b)
+print(a // b)
+print(a % b)
+'''
+
+# constant powers of two are shifts and masks instead of calls
+POWERS = '''a = int(input())
+print(a * 8)
+print(a // 8)
+print(a % 8)
+print(a // 1)
+print(a % 1)
+print(a * -4)
+print(a // -4)
+print(a % -4)
+'''
+
+@pytest.mark.parametrize('options', [{}, UNOPTIMIZED], ids=['optimized', 'unoptimized'])
+@pytest.mark.parametrize('a, b', PAIRS)
+def test_routines_floor_like_python(a, b, options):
+    assert compiled_output(RUNTIME, (a, b), **options) == python_output(RUNTIME, (a, b))
+
+@pytest.mark.parametrize('options', [{}, UNOPTIMIZED], ids=['optimized', 'unoptimized'])
+@pytest.mark.parametrize('a', [0, 1, 7, 8, 9, -1, -7, -8, -9, 1000, -1000])
+def test_powers_of_two_floor_like_python(a, options):
+    assert compiled_output(POWERS, (a,), **options) == python_output(POWERS, (a,))
+
+def test_products_wrap_to_16_bits():
+    source = 'a = int(input())\nb = int(input())\nprint(a * b)\nprint(a * 64)\n'
+    assert compiled_output(source, (300, 200)) == '-5536' + '19200'
+
+def test_routines_are_linked_when_used():
+    result = compile_run(RUNTIME, (7, 2))[1]
+    assert result.output == '1431'
+    assert {'_mul', '_div', '_mod'} <= set(result.program.symbols)
+    result = compile_run('a = int(input())\nb = int(input())\nprint(a + b)\nprint(a * 4)\n', (7, 2))[1]
+    assert result.output == '928'
+    assert not {'_mul', '_div', '_mod'} & set(result.program.symbols)
+    assert result.mnemonic_counts()['ASLA'] == 2
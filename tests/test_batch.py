@@ -0,0 +1,76 @@
+import os
+from compiler import compile_source
+from translator import collect_inputs, output_paths, process_batch
+
+def write(path, text = 'x = 1\nprint(x)\n'):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(text)
+
+def single_file(path):
+    """What -f prints for path"""
+    with open(path) as f:
+        return compile_source(f.read(), path)
+
+def test_directories_and_patterns(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write('a/one.py')
+    write('a/b/two.py')
+    write('a/notes.txt')
+    write('c/three.py')
+    assert collect_inputs(['a']) == [os.path.join('a', 'b', 'two.py'), os.path.join('a', 'one.py')]
+    assert collect_inputs(['c/*.py', 'a/one.py', 'missing']) == [os.path.join('a', 'one.py'), os.path.join('c', 'three.py')]
+
+def test_outputs_mirror_the_inputs(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert output_paths([os.path.join('a', 'b', 'two.py')], 'build') == [os.path.join('build', 'a', 'b', 'two.pep')]
+
+PROGRAMS = {
+    'globals.py': 'x = 3\ny = x + 4\nprint(y)\n',
+    'calls/add.py': 'def add(a, b):\n    c = a + b\n    return c\nn = int(input())\nk = 2\nr = add(n, k)\nprint(r)\n',
+    'calls/loop.py': 'i = 0\nwhile i < 3:\n    print(i)\n    i = i + 1\n',
+}
+
+def test_batch_matches_single_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for name, source in PROGRAMS.items():
+        write(os.path.join('src', name), source)
+    inputs = collect_inputs(['src'])
+    assert process_batch(['src'], 'build', 2) == 0
+    for path, output in zip(inputs, output_paths(inputs, 'build')):
+        with open(output) as f:
+            assert f.read() == single_file(path), path
+
+def test_failures_are_reported(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    write('src/good.py')
+    write('src/bad.py', 'def f(:\n')
+    assert process_batch(['src'], 'build', 1) == 1
+    out = capsys.readouterr().out
+    assert 'FAILED ' + os.path.join('src', 'bad.py') in out
+    assert '2 files, 1 compiled, 1 failed' in out
+    assert os.path.exists(os.path.join('build', 'src', 'good.pep'))
+
+def test_same_names_in_different_directories(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write('a/main.py')
+    write('b/main.py')
+    write('b/c/main.py')
+    inputs = collect_inputs(['a', 'b'])
+    outputs = output_paths(inputs, 'build')
+    assert outputs == [os.path.join('build', 'a', 'main.pep'), os.path.join('build', 'b', 'c', 'main.pep'), os.path.join('build', 'b', 'main.pep')]
+    assert len(set(outputs)) == len(outputs)
+
+def test_inputs_outside_of_the_working_directory(tmp_path, monkeypatch):
+    write(str(tmp_path / 'src' / 'x' / 'main.py'))
+    write(str(tmp_path / 'src' / 'y' / 'main.py'))
+    work = tmp_path / 'work'
+    work.mkdir()
+    monkeypatch.chdir(work)
+    inputs = collect_inputs([os.path.join('..', 'src')])
+    assert output_paths(inputs, 'build') == [os.path.join('build', 'x', 'main.pep'), os.path.join('build', 'y', 'main.pep')]
+
+def test_equivalent_paths_are_one_input(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write('a/main.py')
+    assert collect_inputs(['a', './a/main.py', 'a/../a/*.py']) == [os.path.join('a', 'main.py')]
@@ -0,0 +1,78 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import pytest
+from benchmarks.Runner import compare, measure, sample_programs
+from benchmarks.StressPrograms import STRESS_PROGRAMS, long_names, many_functions, many_statements, nested_loops
+from programs import compile_run, compiled_output, python_output
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# small versions of the stress programs, with what they read
+SMALL = {
+    'many_functions': (many_functions(6), 3),
+    'many_statements': (many_statements(40), 7),
+    'long_names': (long_names(12), 11),
+    'nested_loops': (nested_loops(3, 4), 2),
+}
+
+@pytest.mark.parametrize('name', SMALL)
+def test_stress_programs_match_python(name):
+    source, value = SMALL[name]
+    assert compiled_output(source, (value,)) == python_output(source, (value,))
+
+def test_stress_programs_are_deterministic():
+    for generate, _ in STRESS_PROGRAMS.values():
+        assert generate(1) == generate(1)
+        assert len(generate(2)) > len(generate(1))
+
+def test_long_names_keeps_every_global():
+    compiler, result = compile_run(long_names(12), (11,))
+    assert not any(line.startswith('call graph: removed global') for line in compiler.report)
+    labels = [label for label in result.program.symbols if label.startswith('global')]
+    assert len(labels) == 12
+
+def test_samples_run_with_their_input():
+    measured = 0
+    for name, source, stdin in sample_programs():
+        if stdin is None:
+            continue
+        metrics = measure(source, stdin, 1, 1_000_000, {})
+        assert 'error' not in metrics, name
+        assert metrics['output'] == python_output(source, stdin.split()), name
+        assert metrics['executed_instructions'] <= metrics['cycles']
+        measured += 1
+    assert measured > 10
+
+def results(tmp_path, name, **metrics):
+    path = tmp_path / f'{name}.json'
+    path.write_text(json.dumps({'benchmarks': {'program': metrics}}))
+    return str(path)
+
+def test_compare_flags_regressions(tmp_path, capsys):
+    base = results(tmp_path, 'base', size_bytes=100, compile_seconds=1.0, output='12')
+    same = results(tmp_path, 'same', size_bytes=100, compile_seconds=1.05, output='12')
+    bigger = results(tmp_path, 'bigger', size_bytes=101, compile_seconds=1.0, output='12')
+    slower = results(tmp_path, 'slower', size_bytes=100, compile_seconds=1.5, output='12')
+    wrong = results(tmp_path, 'wrong', size_bytes=90, compile_seconds=1.0, output='13')
+    def run(new):
+        return compare(argparse.Namespace(base=base, new=new, threshold=10.0, verbose=False))
+    assert run(same) == 0
+    assert run(bigger) == 1
+    assert run(slower) == 1
+    assert run(wrong) == 1
+    assert 'REGRESSION output changed' in capsys.readouterr().out
+
+def test_byte_arrays_can_be_turned_off(tmp_path):
+    sizes = {}
+    for flags in ([], ['--no-byte-arrays']):
+        path = tmp_path / 'results.json'
+        subprocess.run([sys.executable, '-m', 'benchmarks.Runner', 'run', '--filter', 'eratosthenes.py', '--stress-scale', '0', '--repeat', '1', '-o', str(path)] + flags,
+                       cwd=ROOT, capture_output=True, text=True, check=True)
+        results = json.loads(path.read_text())
+        assert results['options']['byte_arrays'] == (not flags)
+        sizes[bool(flags)] = results['benchmarks']['5_arrays/eratosthenes.py']['size_bytes']
+    # the sieve is stored in words
+    assert sizes[True] > sizes[False]
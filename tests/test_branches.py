@@ -0,0 +1,99 @@
+import re
+import pytest
+from programs import compile_run, python_output
+
+# name -> program, n is read so the loops are not folded away
+PROGRAMS = {
+    'nested loops': '''n = int(input())
+i = 0
+while i < n:
+    j = n
+    while j >= i:
+        j = j - 3
+    print(j)
+    i = i + 2
+''',
+    'long test': '''n = int(input())
+k = 0
+while k * k + k * 2 - n < 7:
+    k = k + 1
+print(k)
+''',
+    'every comparison': '''n = int(input())
+a = n
+while a > 0:
+    a = a - 4
+b = n
+while b != 0:
+    b = b - 1
+c = 0
+while c <= n:
+    c = c + 5
+d = -n
+while d < n:
+    d = d + 3
+e = n
+while e == n:
+    e = e + 1
+print(a)
+print(b)
+print(c)
+print(d)
+print(e)
+''',
+    'branches in the body': '''n = int(input())
+i = 0
+evens = 0
+while i < n:
+    if i % 2 == 0:
+        evens = evens + 1
+    else:
+        if i > 5:
+            print(i)
+    i = i + 1
+print(evens)
+''',
+    'loop in a function': '''def collatz(v):
+    steps = 0
+    while v != 1:
+        if v % 2 == 0:
+            v = v // 2
+        else:
+            v = 3 * v + 1
+        steps = steps + 1
+    return steps
+n = int(input())
+i = 1
+while i <= n:
+    print(collatz(i))
+    i = i + 1
+''',
+}
+
+INPUTS = (0, 1, 5, 12)
+
+def branch_counts(report):
+    line = next(line for line in report if line.startswith('branches:'))
+    return [int(count) for count in re.findall(r'\d+', line)]
+
+@pytest.mark.parametrize('name', PROGRAMS)
+def test_rotated_loops_match_python(name):
+    source = PROGRAMS[name]
+    for n in INPUTS:
+        compiler, result = compile_run(source, (n,))
+        plain = compile_run(source, (n,), branches = False)[1]
+        assert result.output == plain.output == python_output(source, (n,)), n
+        assert result.instructions <= plain.instructions
+    assert branch_counts(compiler.report)[0] == source.count('while ')
+
+def test_branch_rules_fire():
+    totals = [0, 0, 0]
+    for source in PROGRAMS.values():
+        counts = branch_counts(compile_run(source, (1,))[0].report)
+        totals = [total + count for total, count in zip(totals, counts)]
+    rotated, threaded, compares = totals
+    assert rotated > 0 and threaded > 0 and compares > 0
+
+def test_no_branch_optimizations():
+    compiler, _ = compile_run(PROGRAMS['nested loops'], (3,), branches = False)
+    assert not any(line.startswith('branches:') for line in compiler.report)
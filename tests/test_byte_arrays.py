@@ -0,0 +1,79 @@
+import sys
+import pytest
+from programs import compile_run, python_output
+from translator import compiler_options, process_cli
+
+# flags_, loc_ and digit_ only hold values of 0..255, big_ does not
+INFERRED = '''flags_ = [0] * 60
+big_ = [0] * 4
+def mods(k):
+    loc_ = [0] * 10
+    i = 0
+    while i < 10:
+        loc_[i] = i * k % 7
+        i = i + 1
+    return loc_[4] - loc_[9] * 10
+n = int(input())
+i = 2
+while i < 60:
+    flags_[i] = 1
+    i = i + 1
+i = 2
+while i * i < 60:
+    if flags_[i] == 1:
+        j = i * i
+        while j < 60:
+            flags_[j] = 0
+            j = j + i
+    i = i + 1
+count = 0
+i = 0
+while i < 60:
+    count = count + flags_[i]
+    i = i + 1
+print(count)
+print(flags_[n] - 5)
+print(mods(n))
+digit_ = [0] * 5
+digit_[0] = n % 256
+digit_[1] = digit_[0]
+big_[0] = 1000
+big_[1] = n
+print(digit_[1])
+print(big_[0] + big_[1])
+'''
+
+# the annotation forces byte storage, a store keeps the low byte
+ANNOTATED = '''buffer: bytearray = [0] * 4
+n = int(input())
+buffer[2] = n
+print(buffer[2])
+print(buffer[3])
+'''
+
+@pytest.mark.parametrize('n', [0, 1, 7, 13, 59])
+def test_inferred_byte_arrays_match_python(n):
+    expected = python_output(INFERRED, (n,))
+    compiler, result = compile_run(INFERRED, (n,))
+    assert result.output == expected
+    words, unchanged = compile_run(INFERRED, (n,), byte_arrays = False)
+    assert unchanged.output == expected
+    assert 'byte arrays: flags_ stored in bytes, 60 bytes saved' in compiler.report
+    assert 'byte arrays: loc_ in mods stored in bytes, 10 bytes saved' in compiler.report
+    assert 'byte arrays: digit_ stored in bytes, 5 bytes saved' in compiler.report
+    assert not any(line.startswith('byte arrays: big_') for line in compiler.report)
+    assert not any(line.startswith('byte arrays:') for line in words.report)
+
+@pytest.mark.parametrize('n', [0, 1, 255, 256, 300, -1, -300])
+def test_annotated_byte_arrays_keep_the_low_byte(n):
+    compiler, result = compile_run(ANNOTATED, (n,))
+    assert result.output == str(n & 255) + '0'
+    assert 'byte arrays: buffer stored in bytes, 4 bytes saved' in compiler.report
+    # words keep the value python prints
+    assert compile_run(ANNOTATED, (n,), byte_arrays = False)[1].output == python_output(ANNOTATED, (n,))
+
+def test_no_byte_arrays_option(monkeypatch):
+    monkeypatch.setattr(sys, 'argv', ['translator.py', '-f', 'program.py', '--no-byte-arrays'])
+    assert compiler_options(process_cli())['byte_arrays'] is False
+    monkeypatch.setattr(sys, 'argv', ['translator.py', '-f', 'program.py'])
+    assert compiler_options(process_cli())['byte_arrays'] is True
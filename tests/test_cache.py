@@ -0,0 +1,90 @@
+import os
+import shutil
+import subprocess
+import sys
+import pytest
+import translator
+from cache.CompilationCache import CompilationCache
+from compiler import Compiler, compile_source, compiler_version
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SOURCE = 'x = 3\ny = x + 4\nprint(y)\n'
+
+def test_miss_then_hit(tmp_path, monkeypatch):
+    cache = CompilationCache(str(tmp_path), compiler_version())
+    first = translator.cached_compile(cache, SOURCE, 'a.py', Compiler())
+    assert (cache.hits, cache.misses) == (0, 1)
+    # a hit does not compile anything
+    monkeypatch.setattr(translator, 'compile_text', lambda source, input_file, compiler: pytest.fail('compiled on a hit'))
+    assert translator.cached_compile(cache, SOURCE, 'a.py', Compiler()) == first
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_hit_is_the_compiled_program(tmp_path):
+    cache = CompilationCache(str(tmp_path), compiler_version())
+    translator.cached_compile(cache, SOURCE, 'a.py', Compiler())
+    assert translator.cached_compile(cache, SOURCE, 'a.py', Compiler()) == compile_source(SOURCE, 'a.py')
+
+def test_options_are_part_of_the_key(tmp_path):
+    cache = CompilationCache(str(tmp_path), compiler_version())
+    optimized = translator.cached_compile(cache, SOURCE, 'a.py', Compiler())
+    plain = translator.cached_compile(cache, SOURCE, 'a.py', Compiler(peephole = False))
+    assert (cache.hits, cache.misses) == (0, 2)
+    assert plain == compile_source(SOURCE, 'a.py', peephole = False) != optimized
+    assert Compiler(peephole_rules = ['unreachable', 'store_load']).options() == Compiler(peephole_rules = ['store_load', 'unreachable']).options()
+
+def test_key_covers_every_part(tmp_path):
+    cache = CompilationCache(str(tmp_path), '1')
+    key = cache.key(SOURCE, 'fold=True', 'a.py')
+    assert cache.key(SOURCE, 'fold=True', 'a.py') == key
+    assert cache.key(SOURCE + '\n', 'fold=True', 'a.py') != key
+    assert cache.key(SOURCE, 'fold=False', 'a.py') != key
+    assert cache.key(SOURCE, 'fold=True', 'b.py') != key
+    assert CompilationCache(str(tmp_path), '2').key(SOURCE, 'fold=True', 'a.py') != key
+    # the parts are separated, moving text from one to the next changes the key
+    assert cache.key('c', 'ab') != cache.key('bc', 'a')
+
+def test_eviction_removes_the_least_recently_used(tmp_path):
+    cache = CompilationCache(str(tmp_path), '1', max_size=250)
+    keys = [cache.key(str(i)) for i in range(4)]
+    for age, key in enumerate(keys):
+        cache.put(key, 'x' * 100)
+        os.utime(os.path.join(str(tmp_path), key + '.pep'), (1000 + age, 1000 + age))
+    # reading the oldest entry makes it the most recently used
+    assert cache.get(keys[0]) == 'x' * 100
+    assert cache.evict() == 2
+    assert cache.get(keys[1]) is None and cache.get(keys[2]) is None
+    assert cache.get(keys[0]) is not None and cache.get(keys[3]) is not None
+    assert cache.evict() == 0
+
+def test_batch_counts_hits(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    os.mkdir('src')
+    for name in ('a', 'b'):
+        with open(os.path.join('src', name + '.py'), 'w') as f:
+            f.write(SOURCE)
+    config = ('cache', 64 * 1024 * 1024)
+    assert translator.process_batch(['src'], 'build', 1, config) == 0
+    assert 'cache: 0 hits, 2 misses' in capsys.readouterr().out
+    assert translator.process_batch(['src'], 'build', 1, config) == 0
+    assert 'cache: 2 hits, 0 misses' in capsys.readouterr().out
+
+def test_single_file_counts_hits(tmp_path):
+    path = tmp_path / 'a.py'
+    path.write_text(SOURCE)
+    command = [sys.executable, os.path.join(ROOT, 'translator.py'), '-f', str(path), '--cache-dir', str(tmp_path / 'cache')]
+    first = subprocess.run(command, capture_output=True, text=True, check=True)
+    assert first.stderr == '; cache: 0 hits, 1 misses, 0 evicted\n'
+    second = subprocess.run(command, capture_output=True, text=True, check=True)
+    assert second.stderr == '; cache: 1 hits, 0 misses, 0 evicted\n'
+    assert first.stdout == second.stdout == compile_source(SOURCE, str(path))
+
+def test_version_covers_the_fragment_format(tmp_path):
+    # the fragments the cache stores are only valid for the code that wrote them
+    tree = tmp_path / 'tree'
+    shutil.copytree(ROOT, tree, ignore=shutil.ignore_patterns('.git', 'tests', '__pycache__', '.pepcache'))
+    command = [sys.executable, '-c', 'from compiler import compiler_version; print(compiler_version())']
+    before = subprocess.run(command, cwd=tree, capture_output=True, text=True, check=True).stdout
+    with open(tree / 'cache' / 'FragmentCache.py', 'a') as f:
+        f.write('# changed\n')
+    assert subprocess.run(command, cwd=tree, capture_output=True, text=True, check=True).stdout != before
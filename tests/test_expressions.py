@@ -0,0 +1,64 @@
+import pytest
+from programs import UNOPTIMIZED, compiled_output, python_output
+
+# sq and add have no side effects, any evaluation order gives python's result
+FUNCTIONS = '''def sq(v):
+    return v * v
+def add(u, w):
+    return u + w
+'''
+
+PROGRAMS = {
+    'chain': 'a = int(input())\nb = a - 3\nprint(a - b + 7 - (a + b) - -2)\n',
+    'products': 'a = int(input())\nb = a + 1\nprint(a * b - (a - b) * (b + 2) // 3 % 5)\n',
+    # more subtrees that need the accumulator than there are registers
+    'deep': 'a = int(input())\nb = a * 2\nprint((a * b + 1) * (b * b - a) - (a * a + b * 3) * (b - a * 2 + 9) // (a + 1))\n',
+    'calls': 'a = int(input())\nprint(sq(a) - add(a, sq(a + 1)) * 2 + add(sq(2), a // 2))\n',
+    'array elements': 'arr_ = [0] * 6\ni = 0\na = int(input())\nwhile i < 6:\n    arr_[i] = i * a - i\n    i = i + 1\nprint(arr_[1] * arr_[5] - arr_[arr_[2] % 6] + arr_[5 - 1])\n',
+    'inside a function': 'def f(k):\n    t = k * 3\n    return (k + t) * (t - k) - sq(k - t) // (k + 1)\na = int(input())\nprint(f(a))\nprint(f(a + 2) - f(a))\n',
+    'augmented': 'a = int(input())\nb = 10\nb += a * 3\nb -= a - (b - 1)\nb *= 2\nb //= 3\nb %= 7\nprint(b)\n',
+}
+
+@pytest.mark.parametrize('options', [{}, UNOPTIMIZED], ids=['optimized', 'unoptimized'])
+@pytest.mark.parametrize('name', PROGRAMS)
+def test_expressions_match_python(name, options):
+    source = FUNCTIONS + PROGRAMS[name]
+    for value in (0, 3, 5, -4):
+        assert compiled_output(source, (value,), **options) == python_output(source, (value,)), value
+
+# a and b print when they are called, m changes a global
+EFFECTS = '''g = 1
+def a(x):
+    print(1)
+    return x
+def b(x):
+    print(2)
+    return x + 1
+def m(v):
+    global g
+    g = g + v
+    return g
+'''
+
+ORDERED = {
+    'compare': 'x = 2\nif a(x) < b(x) + 1:\n    print(9)\n',
+    'chain': 'x = 2\nprint(a(x) - (b(x) * b(x)))\n',
+    'product': 'x = 3\nprint(a(x) * b(x))\nprint(a(x) // b(x))\n',
+    'global read before a call': 'print(g + m(5))\nprint(g - m(2) * 2)\n',
+    'compare with a global': 'if g < m(3):\n    print(9)\nif m(1) > g:\n    print(8)\n',
+    'element store': 'arr_ = [0] * 4\narr_[a(1)] = b(1)\nprint(arr_[1])\nprint(arr_[2])\n',
+    'arguments': 'def t(u, w):\n    print(u)\n    print(w)\n    return u - w\nprint(t(a(1), b(1)))\nprint(t(g, m(4)))\n',
+    'inside a function': 'def f(y):\n    global g\n    k = y + 1\n    print(g + m(k) + k)\n    print(a(y) - b(k))\n    return k\nprint(f(3))\n',
+}
+
+@pytest.mark.parametrize('options', [{}, UNOPTIMIZED], ids=['optimized', 'unoptimized'])
+@pytest.mark.parametrize('name', ORDERED)
+def test_operands_are_evaluated_left_to_right(name, options):
+    source = EFFECTS + ORDERED[name]
+    assert compiled_output(source, **options) == python_output(source)
+
+def test_review_repro():
+    source = EFFECTS + 'x = 2\nif a(x) < b(x) + 1:\n    print(9)\nprint(a(x) - (b(x) * b(x)))\n'
+    assert python_output(source) == '129122-7'
+    assert compiled_output(source) == '129122-7'
+    assert compiled_output(source, **UNOPTIMIZED) == '129122-7'
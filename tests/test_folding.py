@@ -0,0 +1,72 @@
+import pytest
+from programs import UNOPTIMIZED, compile_run, compiled_output, python_output
+from visitors.Expressions import to_word
+
+# (left, operator, right), every case folds to a single constant
+OPERATIONS = [
+    (30000, '+', 30000),
+    (-32768, '-', 1),
+    (200, '*', 300),
+    (-7, '//', 2),
+    (7, '//', -2),
+    (-7, '%', 3),
+    (7, '%', -3),
+    (-7, '%', -3),
+    (32767, '*', 32767),
+]
+
+def ids(case):
+    return ' '.join(str(part) for part in case)
+
+@pytest.mark.parametrize('case', OPERATIONS, ids=ids)
+def test_folding_wraps_like_the_runtime(case):
+    left, operator, right = case
+    folded = f'print({left} {operator} {right})\n'
+    # the same operation on values the program reads, so nothing folds
+    runtime = f'a = int(input())\nb = int(input())\nprint(a {operator} b)\n'
+    expected = str(to_word(eval(f'{left} {operator} {right}')))
+    compiler, result = compile_run(folded)
+    assert result.output == expected
+    # a negative operand is an operation folded too
+    operations = 1 + (left < 0) + (right < 0)
+    assert f'constant folding: {operations} operations folded, 0 reads propagated' in compiler.report
+    assert compiled_output(folded, **UNOPTIMIZED) == expected
+    assert compiled_output(runtime, (left, right)) == expected
+    assert compiled_output(runtime, (left, right), **UNOPTIMIZED) == expected
+
+def test_every_operation_wraps():
+    # python only wraps the result, the program after every operation
+    source = '_BIG = 30000\nbig = _BIG + _BIG\nprint(big)\nhalf = big // 2\nprint(half)\nprint((30000 + 30000) // 7)\n'
+    expected = '-5536-2768-791'
+    compiler, result = compile_run(source)
+    assert result.output == expected
+    assert 'constant folding: big = -5536 (line 2)' in compiler.report
+    assert 'constant folding: half = -2768 (line 4)' in compiler.report
+    assert compiled_output(source, **UNOPTIMIZED) == expected
+
+def test_propagated_constants_match_python():
+    source = '''_SIZE = 10
+step = _SIZE // 3
+limit = _SIZE * step - 4
+def scale(v):
+    return v * step + limit
+total = 0
+i = 0
+while i < _SIZE:
+    total = total + scale(i) % 7
+    i = i + 1
+print(step)
+print(limit)
+print(total)
+print(-limit // step)
+'''
+    compiler, result = compile_run(source)
+    assert result.output == python_output(source)
+    assert 'constant folding: limit = 26 (line 3)' in compiler.report
+    assert compiled_output(source, **UNOPTIMIZED) == python_output(source)
+
+def test_globals_assigned_twice_are_not_folded():
+    source = 'n = 4\nprint(n * 2)\nn = n + 1\nprint(n * 2)\ndef f():\n    global k\n    k = 3\nk = 1\nf()\nprint(k + 1)\n'
+    compiler, result = compile_run(source)
+    assert result.output == python_output(source) == '8104'
+    assert not any(line.startswith(('constant folding: n =', 'constant folding: k =')) for line in compiler.report)
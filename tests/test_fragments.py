@@ -0,0 +1,56 @@
+import ast
+from cache.CompilationCache import CompilationCache
+from cache.FragmentCache import FragmentCache
+from compiler import Compiler
+import translator
+from programs import MAX_STEPS, python_output
+from simulator.Pep9 import run
+
+def functions(changed = 0):
+    # every function has a loop and a call to _mul, changed edits the constant of the first one
+    source = [f'def f{k}(a):\n    s = 0\n    while a > 0:\n        s = s + a * {k + 3 + changed * (k == 0)}\n        a = a - 1\n    return s\n' for k in range(5)]
+    source.append('n = int(input())\n')
+    source.extend(f'print(f{k}(n))\n' for k in range(5))
+    source.append('i = 0\nwhile i < n:\n    i = i + 2\nprint(i)\n')
+    return ''.join(source)
+
+def translate(compiler, source):
+    return '\n'.join(compiler.translate('<test>', ast.parse(source))) + '\n'
+
+def fragments_line(compiler):
+    return next(line for line in compiler.report if line.startswith('fragments:'))
+
+def test_unchanged_functions_are_reused():
+    compiler = Compiler(inline_budget = 0, fragments = FragmentCache())
+    text = translate(compiler, functions())
+    assert fragments_line(compiler) == 'fragments: 0 functions reused, 5 generated'
+    assert translate(compiler, functions()) == text == translate(Compiler(inline_budget = 0), functions())
+    assert fragments_line(compiler) == 'fragments: 5 functions reused, 0 generated'
+    # only the edited function is generated again
+    edited = translate(compiler, functions(changed = 1))
+    assert fragments_line(compiler) == 'fragments: 4 functions reused, 1 generated'
+    for source, program in ((functions(), text), (functions(changed = 1), edited)):
+        assert run(program, '4', MAX_STEPS).output == python_output(source, (4,))
+
+def test_fragments_on_disk(tmp_path):
+    compiler = Compiler(inline_budget = 0, fragments = FragmentCache(CompilationCache(str(tmp_path), 'v1')))
+    text = translate(compiler, functions())
+    # another process only has the entries of the store
+    compiler = Compiler(inline_budget = 0, fragments = FragmentCache(CompilationCache(str(tmp_path), 'v1')))
+    assert translate(compiler, functions()) == text
+    assert fragments_line(compiler) == 'fragments: 5 functions reused, 0 generated'
+
+def test_register_option_is_part_of_the_key():
+    fragments = FragmentCache()
+    translate(Compiler(inline_budget = 0, fragments = fragments), functions())
+    compiler = Compiler(inline_budget = 0, registers = False, fragments = fragments)
+    assert translate(compiler, functions()) == translate(Compiler(inline_budget = 0, registers = False), functions())
+    assert fragments_line(compiler) == 'fragments: 0 functions reused, 5 generated'
+
+def test_cache_miss_reuses_the_functions(tmp_path):
+    cache = CompilationCache(str(tmp_path), 'v1')
+    translator.cached_compile(cache, functions(), 'a.py', Compiler(inline_budget = 0))
+    compiler = Compiler(inline_budget = 0)
+    text = translator.cached_compile(cache, functions(changed = 1), 'a.py', compiler)
+    assert fragments_line(compiler) == 'fragments: 4 functions reused, 1 generated'
+    assert text == translator.compile_text(functions(changed = 1), 'a.py', Compiler(inline_budget = 0))
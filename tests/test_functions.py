@@ -0,0 +1,19 @@
+from programs import UNOPTIMIZED, compiled_output, python_output
+
+def test_functions_with_the_same_names():
+    # the locals and parameters of both functions have the same .EQUATE names, at other offsets
+    source = '''def twice(a):
+    r = a + a
+    return r
+def plus(a, b):
+    s = a
+    r = s + b
+    return r
+x = int(input())
+y = twice(x)
+z = plus(y, x)
+print(y)
+print(z)
+'''
+    assert compiled_output(source, (7,)) == python_output(source, (7,)) == '1421'
+    assert compiled_output(source, (7,), **UNOPTIMIZED) == '1421'
@@ -0,0 +1,73 @@
+from compiler import Compiler
+from profiling.HotspotProfiler import HotspotProfiler
+from simulator.Pep9 import run
+
+# f runs n times, each call loops k times
+SOURCE = '''def f(k):
+    s = 0
+    while k > 0:
+        s = s + k
+        k = k - 1
+    return s
+n = int(input())
+t = 0
+i = 0
+while i < n:
+    t = t + f(3)
+    i = i + 1
+print(t)
+'''
+
+def profile(n):
+    compiler = Compiler(source_map = True, inline_budget = 0)
+    text = '\n'.join(compiler.translate('a.py', compiler.parse(SOURCE, 'a.py'))) + '\n'
+    profiler = HotspotProfiler(compiler.mapping, source_lines = SOURCE.splitlines())
+    result = run(text, str(n), profiler = profiler)
+    return profiler, result
+
+def test_costs_add_up_to_the_cycles():
+    profiler, result = profile(4)
+    assert result.output == '24'
+    assert profiler.total == result.cycles == sum(profiler.costs.values())
+    assert sum(profiler.counts.values()) == result.instructions
+    assert sum(cost for _, cost in profiler.lines().values()) <= profiler.total
+    assert sum(int(line.rsplit(' ', 1)[1]) for line in profiler.collapsed()) == profiler.total
+
+def test_calls_and_branches():
+    profiler, _ = profile(4)
+    assert profiler.calls == {'f': 4}
+    inclusive = profiler.inclusive()
+    assert inclusive['tl'] == profiler.total
+    assert inclusive['f'] == profiler.exclusive['f'] == profiler.total - profiler.exclusive['tl']
+    assert {line.split()[0] for line in profiler.collapsed()} == {'tl', 'tl;f'}
+    # the rotated loops branch back while their test holds
+    branches = {profiler.instructions[address].mnemonic: (count, profiler.taken.get(address, 0)) for address, count in profiler.counts.items()}
+    assert branches['BRGT'] == (12, 8)     # while k > 0, 3 times per call
+    assert branches['BRLT'] == (4, 3)      # while i < n
+
+def test_blocks_and_lines():
+    profiler, result = profile(4)
+    blocks = profiler.blocks()
+    assert blocks['f'][0] == 4
+    assert sorted(entries for label, (entries, _) in blocks.items() if label.startswith('body_')) == [4, 12]
+    lines = profiler.lines()
+    # 4 instructions per execution of s = s + k, 1 for k = k - 1 (SUBX) and i = i + 1
+    assert lines[4][0] == 48 and lines[5][0] == 12 and lines[12][0] == 4
+    assert lines[7] == (1, 2)
+    report = profiler.report(top = 3)
+    assert report[0] == f'cost: {profiler.total} cycles, {result.instructions} instructions'
+    assert any(line.split()[:2] == ['4', '48'] and line.endswith('s = s + k') for line in report)
+
+def test_instructions_are_named_after_the_closest_label():
+    profiler, _ = profile(4)
+    report = profiler.report(top = len(profiler.counts))
+    rows = report[report.index(next(line for line in report if line.startswith('instruction'))) + 1:]
+    labeled = {address: instr.label for address, instr in profiler.instructions.items() if instr.label is not None}
+    expected = set()
+    for address in profiler.counts:
+        start = max((a for a in labeled if a <= address), default = None)
+        if start is None:
+            expected.add(f'{address:#06x}')
+        else:
+            expected.add(labeled[start] if start == address else f'{labeled[start]}+{address - start}')
+    assert {row.split()[0] for row in rows} == expected
@@ -0,0 +1,71 @@
+import pytest
+from programs import UNOPTIMIZED, compile_run, compiled_output, python_output
+
+LEAVES = '''def t(u, w):
+    return u * 10 + w
+def sq(u):
+    s = u * u
+    return s
+def show(u):
+    print(u)
+'''
+
+def test_leaf_functions_are_inlined():
+    source = LEAVES + 'x = int(input())\ny = t(x, 3)\nprint(y)\ny += sq(x)\nprint(y)\nshow(y)\n'
+    compiler, result = compile_run(source, (4,))
+    assert result.output == python_output(source, (4,))
+    assert 'inlining: t inlined at 1 call sites' in compiler.report
+    assert 'inlining: sq inlined at 1 call sites' in compiler.report
+    assert 'inlining: show inlined at 1 call sites' in compiler.report
+    # the callees have no caller left and are not generated
+    assert not {'t', 'sq', 'show'} & set(result.program.symbols)
+    assert compiled_output(source, (4,), **UNOPTIMIZED) == result.output
+
+def test_inlined_in_a_function():
+    source = LEAVES + 'def f(k):\n    r = sq(k)\n    return t(r, k)\nv = int(input())\nz = f(v)\nprint(z)\n'
+    for inputs in ((2,), (-3,)):
+        compiler, result = compile_run(source, inputs)
+        assert result.output == python_output(source, inputs)
+        assert 'inlining: sq inlined at 1 call sites' in compiler.report
+
+def test_functions_that_call_or_declare_globals_are_not_inlined():
+    source = 'g = 1\ndef bump(v):\n    global g\n    g = g + v\n    return g\ndef outer(v):\n    return bump(v) + 1\nx = 2\ny = outer(x)\nprint(y)\nprint(g)\n'
+    compiler, result = compile_run(source)
+    assert result.output == python_output(source)
+    assert 'inlining: bump' not in ' '.join(compiler.report)
+    assert 'inlining: outer' not in ' '.join(compiler.report)
+
+def test_budget():
+    source = LEAVES + 'x = 5\ny = t(x, 3)\nprint(y)\n'
+    compiler, result = compile_run(source, inline_budget = 3)
+    assert result.output == python_output(source)
+    assert not any(line.startswith('inlining:') for line in compiler.report)
+
+# m changes g, so a name argument read before a call sees the old value
+ORDERED_FUNCTIONS = '''g = 1
+def m(v):
+    global g
+    g = g + v
+    return g
+def t(u, w):
+    return u * 10 + w
+def sq(u):
+    return u * u
+'''
+
+# calls that are whole statements, the ones the inliner replaces
+ORDERED = {
+    'global before a call': 'x = 3\ny = t(g, m(x))\nprint(y)\nprint(g)\n',
+    'nested calls': 'x = 3\ny = t(g, t(m(x), 0))\nprint(y)\nprint(g)\n',
+    'local before a call': 'def f(k):\n    r = t(k, sq(k) + m(k))\n    return r\nprint(f(2))\nprint(g)\n',
+    'constant arguments': 'print(t(4, 2))\nz = t(-1, sq(3))\nprint(z)\n',
+    'assigned parameter': 'def h(p):\n    p = p + 1\n    return p * 2\nx = 5\ny = h(x)\nprint(y)\nprint(x)\n',
+}
+
+@pytest.mark.parametrize('name', ORDERED)
+def test_inlined_calls_read_their_arguments_in_order(name):
+    source = ORDERED_FUNCTIONS + ORDERED[name]
+    compiler, result = compile_run(source)
+    assert result.output == python_output(source)
+    assert any(line.startswith('inlining:') for line in compiler.report)
+    assert compiled_output(source, inline_budget = 0) == result.output
@@ -0,0 +1,32 @@
+import pytest
+from compiler import compile_program, compile_source
+from ir.Instruction import Instruction, Mode, Opcode, comment, parse, program_size
+from simulator.Pep9 import assemble, run
+
+SOURCE = 'x = int(input())\ny = x * 3 + 1\nif y > 10:\n    print(y)\n'
+
+@pytest.mark.parametrize('text', ['LDWA 5,i', 'STWA x,d', 'BR loop', 'CALL _mul', 'LDWA -2,sfx', 'ASLA', '.BLOCK 4', '.EQUATE 6', 'DECO 0,s\t; result'])
+def test_text_round_trip(text):
+    assert parse(text).text() == text
+
+def test_operands_and_sizes():
+    load = parse('ldwa 3, s')
+    assert (load.opcode, load.operand, load.mode, load.symbol) == (Opcode.LDWA, 3, Mode.S, None)
+    branch = parse('BRLT end_l_1', 'loop')
+    assert (branch.label, branch.mode, branch.symbol) == ('loop', Mode.I, 'end_l_1')
+    assert comment('note').text() == '; note' and not comment('note').is_code
+    assert [parse(t).size() for t in ('STOP', 'LDWA 1,i', '.WORD 3', '.BLOCK 6', '.EQUATE 2')] == [1, 3, 2, 6, 0]
+    assert not Instruction(Opcode.BLOCK, 2).is_code
+
+def test_copy_is_independent():
+    original = parse('LDWA x,d', 'a')
+    copy = original.copy()
+    copy.label = 'b'
+    assert original.label == 'a' and copy.text() == original.text()
+
+def test_text_and_ir_are_the_same_program():
+    program = compile_program(SOURCE)
+    text = compile_source(SOURCE)
+    assert program_size(program) == assemble(program).size == assemble(text).size
+    for value in (1, 5):
+        assert run(program, str(value)).output == run(text, str(value)).output == ('16' if value == 5 else '')
@@ -0,0 +1,39 @@
+from analysis.SymbolTable import MAX_LENGTH, SymbolTable
+from programs import compile_run, python_output
+from simulator.Pep9 import assemble
+
+def test_scopes_avoid_the_global_labels():
+    table = SymbolTable(reserved = ['main'])
+    table.define('counter', 'global')
+    table.define('counter_of_items', 'global')
+    table.assign_labels()
+    first, second = table.scope(), table.scope()
+    assert first.unique('counter') == second.unique('counter') == 'counter2'
+    assert first.unique('main') == 'main2'
+    # counter_ is the label of counter_of_items
+    assert first.unique('counter_of_items') == 'counter3'
+    assert first.unique('value') == second.unique('value') == 'value'
+
+def test_scopes_ignore_the_linked_frames():
+    table = SymbolTable(reserved = ['tl'])
+    table.define('total', 'global')
+    table.assign_labels()
+    # linking takes program-wide labels for the frames of the earlier functions
+    for _ in range(50):
+        table.unique('value')
+    scope = table.scope()
+    assert scope.unique('value') == 'value'
+    assert scope.unique('total') == 'total2'
+
+def test_long_names_in_many_functions():
+    # every function has the same long locals, their .EQUATEs are renamed for the whole program
+    functions = [f'def function_number_{k}(parameter_value):\n    accumulated_total = parameter_value + {k}\n    return accumulated_total * 2\n' for k in range(60)]
+    calls = [f'print(function_number_{k}(accumulated_total))\n' for k in range(0, 60, 7)]
+    source = ''.join(functions) + 'accumulated_total = 3\n' + ''.join(calls)
+    compiler, result = compile_run(source, inline_budget = 0)
+    assert result.output == python_output(source)
+    text = '\n'.join(compiler.translate('<test>', compiler.parse(source)))
+    # the assembler rejects a label defined twice
+    assemble(text)
+    labels = [line.split(':')[0] for line in text.splitlines() if '.EQUATE' in line or '.BLOCK' in line or '.WORD' in line]
+    assert labels and all(len(label) <= MAX_LENGTH for label in labels)
@@ -0,0 +1,78 @@
+import pytest
+from programs import UNOPTIMIZED, compile_run, compiled_output, python_output
+
+# name -> source, n is read so nothing folds
+PROGRAMS = {
+    'hoisted invariant': '''n = int(input())
+k = n + 3
+total = 0
+i = 0
+while i < n:
+    total = total + (k * 7 - n)
+    i = i + 1
+print(total)
+''',
+    'reduced product': '''n = int(input())
+k = n + 3
+total = 0
+i = 0
+while i < n:
+    total = total + i * k
+    i = i + 1
+print(total)
+''',
+    'nested loops': '''n = int(input())
+total = 0
+i = 0
+while i < n:
+    j = 0
+    while j < n:
+        total = total + i * 5 + (n - 1) * 3 + j
+        j = j + 2
+    i = i + 1
+print(total)
+''',
+    'in a function': '''def f(n, k):
+    s = 0
+    i = n
+    while i > 0:
+        s = s + i * k + k // 4
+        i = i - 1
+    return s
+n = int(input())
+print(f(n, n + 5))
+''',
+}
+
+@pytest.mark.parametrize('name', PROGRAMS)
+def test_optimized_loops_match_python(name):
+    source = PROGRAMS[name]
+    for n in (0, 1, 4, 9):
+        compiler, result = compile_run(source, (n,))
+        assert result.output == python_output(source, (n,)), n
+        assert compiled_output(source, (n,), **UNOPTIMIZED) == result.output
+
+def loops_line(compiler):
+    return next(line for line in compiler.report if line.startswith('loops:'))
+
+def test_invariants_are_hoisted():
+    compiler, result = compile_run(PROGRAMS['hoisted invariant'], (20,))
+    assert loops_line(compiler) == 'loops: 0 products reduced, 1 expressions hoisted'
+    # the product is computed once instead of 20 times
+    plain = compile_run(PROGRAMS['hoisted invariant'], (20,), optimize_loops = False)[1]
+    assert result.mnemonic_counts()['CALL'] == 1 < plain.mnemonic_counts()['CALL']
+    assert result.instructions < plain.instructions
+
+def test_products_are_reduced():
+    compiler, result = compile_run(PROGRAMS['reduced product'], (20,))
+    # the increment k * 1 of the new variable is hoisted too
+    assert loops_line(compiler) == 'loops: 1 products reduced, 1 expressions hoisted'
+    plain = compile_run(PROGRAMS['reduced product'], (20,), optimize_loops = False)[1]
+    assert result.mnemonic_counts()['CALL'] == 1 < plain.mnemonic_counts()['CALL']
+    assert result.instructions < plain.instructions
+
+def test_loops_that_change_the_invariant_are_left_alone():
+    source = 'n = int(input())\nk = 2\ni = 0\nt = 0\nwhile i < n:\n    t = t + k * 3\n    k = k + i\n    i = i + 1\nprint(t)\n'
+    compiler, result = compile_run(source, (6,))
+    assert result.output == python_output(source, (6,))
+    assert loops_line(compiler) == 'loops: 0 products reduced, 0 expressions hoisted'
@@ -0,0 +1,81 @@
+import os
+import pytest
+from programs import UNOPTIMIZED, compile_run, compiled_output, python_output
+from visitors.Expressions import to_word
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '_samples', '5_arrays', 'fib_memo.py')
+
+# the no-op decorator of the sample, python runs the functions as they are
+MEMO = '''def memo(size):
+    def decorate(function):
+        return function
+    return decorate
+'''
+
+# the parameter is assigned, the table uses a copy of the argument
+STEPS = MEMO + '''@memo(40)
+def steps(n):
+    count = 0
+    while n > 1:
+        if n % 2 == 0:
+            n = n // 2
+        else:
+            n = 3 * n + 1
+        count = count + 1
+    return count
+def longest(limit):
+    best = 0
+    i = 1
+    while i < limit:
+        s = steps(i) + steps(i)
+        if s > best:
+            best = s
+        i = i + 1
+    return best
+n = int(input())
+print(steps(n))
+print(longest(n))
+'''
+
+# negative arguments and arguments past the table are computed every time
+TRIANGLES = MEMO + '''@memo(8)
+def tri(n):
+    if n <= 0:
+        return n
+    return n + tri(n - 1)
+n = int(input())
+print(tri(n))
+print(tri(-n))
+print(tri(n + 10))
+'''
+
+def read_sample():
+    with open(SAMPLE) as file:
+        return file.read()
+
+@pytest.mark.parametrize('options', [{}, UNOPTIMIZED], ids=['optimized', 'unoptimized'])
+# fib(23) is the last one that fits in a word, fib(26) is past the table
+@pytest.mark.parametrize('n', [0, 1, 2, 10, 23, 26])
+def test_sample_matches_python(n, options):
+    source = read_sample()
+    assert compiled_output(source, (n,), **options) == str(to_word(int(python_output(source, (n,)))))
+
+def test_table_saves_the_recursion():
+    source = read_sample()
+    memoized = compile_run(source, (20,))[1]
+    # without the decorator nor its definition
+    plain = compile_run(source.split('@memo(25)\n')[1], (20,))[1]
+    assert memoized.output == plain.output == python_output(source, (20,))
+    assert memoized.instructions * 20 < plain.instructions
+
+@pytest.mark.parametrize('options', [{}, UNOPTIMIZED], ids=['optimized', 'unoptimized'])
+@pytest.mark.parametrize('source', [STEPS, TRIANGLES], ids=['assigned parameter', 'outside the table'])
+def test_memo_functions_match_python(source, options):
+    for n in (0, 1, 3, 7, 27):
+        assert compiled_output(source, (n,), **options) == python_output(source, (n,)), n
+
+@pytest.mark.parametrize('body', ['def f(a, b):\n    return a + b\n', 'def f(a):\n    print(a)\n    return a\n',
+                                  'def f(a):\n    global g\n    g = a\n    return a\ng = 0\n'], ids=['two arguments', 'output', 'global'])
+def test_unsupported_memo_functions(body):
+    with pytest.raises(ValueError):
+        compile_run(MEMO + '@memo(4)\n' + body + 'print(f(1))\n')
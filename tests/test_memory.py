@@ -0,0 +1,78 @@
+import pytest
+from analysis.MemoryFootprint import MemoryFootprint
+from compiler import Compiler
+from ir.Instruction import parse
+from programs import python_output
+from simulator.Pep9 import CPU, STACK_TOP, assemble
+
+class StackWatcher():
+    """Profiler of the CPU that only keeps the lowest stack pointer"""
+
+    def __init__(self) -> None:
+        self.cpu = None
+        self.lowest = STACK_TOP
+
+    def executed(self, instr, next_pc, cost):
+        self.lowest = min(self.lowest, self.cpu.sp)
+
+NESTED = '''def inner(a):
+    t = a * 3
+    u = t + 1
+    return u
+def outer(a, b):
+    s = inner(a) + b
+    return s
+n = int(input())
+print(outer(n, 2))
+'''
+
+RECURSIVE = '''def total(n):
+    if n <= 0:
+        return 0
+    return n + total(n - 1) - 1
+n = int(input())
+print(total(n))
+'''
+
+def footprint(source):
+    compiler = Compiler(inline_budget = 0)
+    lines = compiler.translate('<test>', compiler.parse(source))
+    return MemoryFootprint(compiler.generate('<test>', compiler.parse(source))), '\n'.join(lines) + '\n', compiler.report
+
+def test_stack_bound_is_the_deepest_stack():
+    memory, text, report = footprint(NESTED)
+    watcher = StackWatcher()
+    watcher.cpu = CPU(assemble(text), '5', profiler = watcher)
+    assert watcher.cpu.run().output == python_output(NESTED, (5,))
+    assert memory.stack == STACK_TOP - watcher.lowest > 0
+    assert memory.size == assemble(text).size
+    assert memory.free == STACK_TOP - memory.size - memory.stack
+    assert report[-len(memory.report()):] == memory.report()
+    assert memory.calls['outer'] == ['inner']
+
+def test_recursion_is_unbounded():
+    memory, _, report = footprint(RECURSIVE)
+    assert memory.stack is None and memory.recursive == ['total']
+    assert any(line.startswith('memory: total is recursive') for line in report)
+
+def program(data):
+    # tl calls f, whose frame is 100 bytes, data bytes of static memory after the code
+    text = [(None, 'BR tl'), ('big', f'.BLOCK {data}'), ('tl', 'SUBSP 4,i'), (None, 'CALL f'), (None, 'ADDSP 4,i'), (None, 'STOP'),
+            ('f', 'SUBSP 100,i'), (None, 'ADDSP 100,i'), (None, 'RET')]
+    return MemoryFootprint([parse(code, label) for label, code in text])
+
+def test_stack_colliding_with_the_program():
+    code = program(0).size
+    assert program(0).stack == 4 + 2 + 100
+    fits = program(STACK_TOP - code - 106)
+    assert fits.free == 0
+    fits.check()
+    # the program fits, its stack does not
+    collides = program(STACK_TOP - code - 105)
+    assert collides.size < STACK_TOP and collides.free == -1
+    with pytest.raises(ValueError, match = 'stack of 106 bytes'):
+        collides.check()
+
+def test_compiler_rejects_a_program_too_big():
+    with pytest.raises(ValueError):
+        Compiler().generate('<test>', Compiler().parse('a_ = [0] * 20000\nb_ = [0] * 20000\nn = int(input())\na_[n] = n\nb_[n] = n\nprint(a_[n] + b_[n])\n'))
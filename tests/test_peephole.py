@@ -0,0 +1,65 @@
+import pytest
+from ir.Instruction import parse
+from optimizers.Peephole import PeepholeOptimizer
+from programs import compile_run
+
+def optimize(rule, lines, keep_labels = ()):
+    """(label, text) lines after rule, and the number of instructions it removed"""
+    optimizer = PeepholeOptimizer([rule], keep_labels)
+    result = optimizer.optimize([parse(text, label) for label, text in lines])
+    return [(i.label, i.text()) for i in result], optimizer.removed
+
+def test_store_load():
+    code = [(None, 'STWA x,d'), (None, 'LDWA x,d'), (None, 'DECO x,d')]
+    assert optimize('store_load', code) == ([(None, 'STWA x,d'), (None, 'DECO x,d')], 1)
+    # another operand, a label (reached from elsewhere), a branch on the flags of the load
+    for code in ([(None, 'STWA x,d'), (None, 'LDWA y,d')],
+                 [(None, 'STWA x,d'), ('l', 'LDWA x,d')],
+                 [(None, 'STWA x,d'), (None, 'LDWA x,d'), (None, 'BREQ l')],
+                 [(None, 'STWX x,d'), (None, 'LDWA x,d')]):
+        assert optimize('store_load', code) == (code, 0)
+
+def test_branch_to_next():
+    code = [(None, 'BR next'), (None, '; comment'), ('skip', 'NOP1'), ('next', 'DECO x,d'), (None, 'BRLT l'), ('l', 'STOP')]
+    assert optimize('branch_to_next', code) == ([(None, '; comment'), ('skip', 'NOP1'), ('next', 'DECO x,d'), ('l', 'STOP')], 2)
+    code = [(None, 'BR l'), (None, 'DECO x,d'), ('l', 'STOP')]
+    assert optimize('branch_to_next', code) == (code, 0)
+
+def test_unreachable():
+    code = [(None, 'BR l'), (None, 'DECO x,d'), (None, 'STOP'), ('x', '.BLOCK 2'), ('l', 'RET'), (None, 'DECO x,d')]
+    assert optimize('unreachable', code) == ([(None, 'BR l'), ('x', '.BLOCK 2'), ('l', 'RET')], 3)
+
+def test_nop_labels():
+    # the label moves onto the next instruction
+    code = [(None, 'BR a'), ('a', 'NOP1'), (None, 'DECO x,d')]
+    assert optimize('nop_labels', code) == ([(None, 'BR a'), ('a', 'DECO x,d')], 1)
+    # the next instruction has a label already, the branches are renamed
+    code = [(None, 'BRLT a'), ('a', 'NOP1'), ('b', 'DECO x,d'), (None, 'BR b')]
+    assert optimize('nop_labels', code) == ([(None, 'BRLT b'), ('b', 'DECO x,d'), (None, 'BR b')], 1)
+    # unreferenced sentinels go, kept labels stay
+    code = [('a', 'NOP1'), ('tl', 'NOP1'), ('b', 'DECO x,d')]
+    assert optimize('nop_labels', code, ['tl']) == ([('tl', 'NOP1'), ('b', 'DECO x,d')], 1)
+
+def test_rules_are_checked():
+    with pytest.raises(ValueError):
+        PeepholeOptimizer(['store_load', 'no_such_rule'])
+    assert PeepholeOptimizer().rules == list(PeepholeOptimizer.RULES)
+
+def test_report_and_output():
+    source = 'x = int(input())\ny = x + 1\nif y > 3:\n    print(y)\nelse:\n    print(x)\n'
+    for value in (1, 5):
+        compiler, result = compile_run(source, (value,))
+        plain_compiler, plain = compile_run(source, (value,), peephole = False)
+        assert result.output == plain.output == str(value + 1 if value + 1 > 3 else value)
+        assert result.instructions < plain.instructions
+    line = next(line for line in compiler.report if line.startswith('peephole:'))
+    removed = int(line.split()[2])
+    assert line == f'peephole: removed {removed} instructions' and removed > 0
+    assert not any(line.startswith('peephole:') for line in plain_compiler.report)
+
+def test_nop_label_renamed_onto_a_nop_label():
+    code = [(None, 'BR a'), ('a', 'NOP1'), ('b', 'NOP1'), (None, 'DECO x,d'), (None, 'STOP')]
+    result, _ = optimize('nop_labels', code)
+    targets = [instr.split()[1] for _, instr in result if instr.startswith('BR')]
+    labels = {label for label, _ in result}
+    assert targets == ['b'] and 'b' in labels
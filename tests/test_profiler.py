@@ -0,0 +1,62 @@
+import json
+import os
+import subprocess
+import sys
+from compiler import Compiler
+from profiling.StageProfiler import StageProfiler, profile_json, profile_table
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SOURCE = '''def f(a):
+    s = 0
+    while a > 0:
+        s = s + a
+        a = a - 1
+    return s
+n = int(input())
+print(f(n))
+'''
+
+STAGES = ['parse', 'analysis', 'inlining', 'folding', 'loops', 'prune', 'bytes', 'globals', 'functions', 'top_level', 'branches', 'peephole', 'memory', 'emit']
+
+def profile(**options):
+    profiler = StageProfiler(**options)
+    compiler = Compiler(profiler = profiler)
+    compiler.translate('a.py', compiler.parse(SOURCE, 'a.py'))
+    return profiler
+
+def test_every_stage_is_recorded():
+    seen = []
+    profiler = profile(hooks = [seen.append])
+    assert [record.stage for record in profiler.records] == STAGES
+    assert seen == profiler.records
+    for record in profiler.records:
+        assert record.input_file == 'a.py'
+        assert record.wall >= 0 and record.cpu >= 0 and record.peak >= 0
+    stages = {record.stage: record for record in profiler.records}
+    assert stages['parse'].nodes > 0 and stages['parse'].instructions is None
+    assert stages['functions'].instructions > 0 and stages['functions'].nodes is None
+    # the peephole pass only removes instructions
+    assert 0 < stages['peephole'].instructions <= stages['branches'].instructions
+
+def test_without_memory_tracing():
+    profiler = profile(memory = False)
+    assert all(record.peak is None for record in profiler.records)
+
+def test_outputs():
+    records = profile().records + profile().records
+    lines = profile_table(records)
+    assert len(lines) == len(STAGES) + 2
+    assert lines[1].split()[0] == 'parse' and lines[-1].startswith('total')
+    parsed = [json.loads(line) for line in profile_json(records)]
+    assert len(parsed) == 2 * len(STAGES)
+    assert set(parsed[0]) == {'file', 'stage', 'wall_ms', 'cpu_ms', 'peak_bytes', 'ast_nodes', 'instructions'}
+
+def test_cli_profile(tmp_path):
+    path = tmp_path / 'a.py'
+    path.write_text(SOURCE)
+    output = tmp_path / 'profile.jsonl'
+    cli = subprocess.run([sys.executable, os.path.join(ROOT, 'translator.py'), '-f', str(path), '--profile', 'json', '--profile-file', str(output)],
+                         capture_output=True, text=True, check=True)
+    assert cli.stdout.startswith('; Translating') and cli.stderr == ''
+    assert [json.loads(line)['stage'] for line in output.read_text().splitlines()] == STAGES
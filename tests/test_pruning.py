@@ -0,0 +1,47 @@
+from programs import UNOPTIMIZED, compile_run, compiled_output, python_output
+
+SOURCE = '''def used(a):
+    return helper(a) + 1
+def helper(a):
+    return a * 2
+def unused(a):
+    return only_unused(a)
+def only_unused(a):
+    return a
+n = int(input())
+dead = n + 1
+kept = int(input())
+r = used(n)
+print(r)
+'''
+
+def test_dead_functions_and_globals_are_removed():
+    compiler, result = compile_run(SOURCE, (4, 5))
+    assert result.output == python_output(SOURCE, (4, 5))
+    assert 'call graph: removed function unused (line 5)' in compiler.report
+    assert 'call graph: removed function only_unused (line 7)' in compiler.report
+    assert 'call graph: removed global dead' in compiler.report
+    labels = result.program.symbols
+    assert 'unused' not in labels and 'only_un' not in labels and 'dead' not in labels
+    assert 'used' in labels and 'helper' in labels
+    # input is read even though kept is never printed
+    assert 'call graph: removed global kept' not in compiler.report
+    assert result.instructions < compile_run(SOURCE, (4, 5), prune=False)[1].instructions
+
+def test_nothing_removed_without_pruning():
+    compiler, result = compile_run(SOURCE, (4, 5), **UNOPTIMIZED)
+    assert result.output == python_output(SOURCE, (4, 5))
+    assert not any(line.startswith('call graph:') for line in compiler.report)
+    assert 'unused' in result.program.symbols
+
+def test_globals_read_by_reachable_functions_are_kept():
+    source = 'base = 7\nunread = 3\ndef f(x):\n    return x + base\nv = int(input())\nr = f(v)\nprint(r)\n'
+    compiler, result = compile_run(source, (2,), fold_constants=False)
+    assert result.output == python_output(source, (2,)) == '9'
+    assert 'call graph: removed global unread' in compiler.report
+    assert 'call graph: removed global base' not in compiler.report
+
+def test_side_effects_keep_the_assignment():
+    source = 'def f(x):\n    print(x)\n    return x\nd = 10\nq = int(input())\nignored = f(q)\nalso = d // q\nprint(d)\n'
+    for inputs in ((3,), (5,)):
+        assert compiled_output(source, inputs) == python_output(source, inputs)
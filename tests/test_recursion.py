@@ -0,0 +1,164 @@
+import os
+import subprocess
+import sys
+import pytest
+from compiler import Compiler, compile_source
+from programs import UNOPTIMIZED, compile_run, python_output
+from visitors.Expressions import to_word
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name -> (source, inputs), n is read so nothing folds
+PROGRAMS = {
+    'tail call': ('''def count(n, acc):
+    if n == 0:
+        return acc
+    return count(n - 1, acc + n)
+n = int(input())
+print(count(n, 0))
+''', (0, 1, 200)),
+    'swapped parameters': ('''def gcd(a, b):
+    if b == 0:
+        return a
+    return gcd(b, a % b)
+a = int(input())
+print(gcd(a, 84))
+print(gcd(84, a))
+''', (0, 1, 36, 97, 1071)),
+    'sum accumulator': ('''def total(n):
+    if n <= 0:
+        return 0
+    return n + total(n - 1)
+n = int(input())
+print(total(n))
+''', (0, 1, 100)),
+    'call on the left': ('''def total(n):
+    if n <= 0:
+        return 0
+    return total(n - 1) + n * 2
+n = int(input())
+print(total(n))
+''', (0, 1, 100)),
+    'product accumulator': ('''def fact(n):
+    if n <= 1:
+        return 1
+    return n * fact(n - 1)
+n = int(input())
+print(fact(n))
+''', (0, 1, 5, 7)),
+    'two returns': ('''def digits(n, k):
+    if n < 10:
+        return k + 1
+    if n % 2 == 0:
+        return digits(n // 10, k + 1)
+    return digits(n // 10, k + 1)
+n = int(input())
+print(digits(n, 0))
+''', (0, 9, 10, 32767)),
+}
+
+# tail calls with additions only, every CALL left is the first one
+WITHOUT_ROUTINES = ('tail call', 'sum accumulator')
+
+@pytest.mark.parametrize('options', [{}, UNOPTIMIZED], ids=['optimized', 'unoptimized'])
+@pytest.mark.parametrize('name', PROGRAMS)
+def test_rewritten_recursion_matches_python(name, options):
+    source, inputs = PROGRAMS[name]
+    for value in inputs:
+        compiler, result = compile_run(source, (value,), **options)
+        assert result.output == python_output(source, (value,)), value
+        if name in WITHOUT_ROUTINES and not options:
+            assert result.mnemonic_counts()['CALL'] == 1
+
+@pytest.mark.parametrize('name', WITHOUT_ROUTINES)
+def test_deep_recursion_keeps_the_stack(name):
+    # a single frame for 3000 levels, the sum wraps to 16 bits
+    source, _ = PROGRAMS[name]
+    compiler, result = compile_run(source, (3000,))
+    assert result.output == str(to_word(3000 * 3001 // 2))
+    assert result.mnemonic_counts()['CALL'] == 1
+
+def test_other_recursion_still_calls():
+    source = '''def fib(n):
+    if n < 2:
+        return n
+    return fib(n - 1) + fib(n - 2)
+def total(n):
+    if n <= 0:
+        return 0
+    return n + total(n - 1) - 1
+n = int(input())
+print(fib(n))
+print(total(n))
+'''
+    compiler, result = compile_run(source, (12,))
+    assert result.output == python_output(source, (12,))
+    assert result.mnemonic_counts()['CALL'] > 12
+
+# the recursion changes c, python reads it after the call returns
+CHANGED_GLOBALS = {
+    'global declared': '''c = 0
+def f(n):
+    global c
+    c = c + 1
+    if n == 0:
+        return 0
+    return f(n - 1) + c
+print(f(3))
+''',
+    'global changed by a callee': '''c = 0
+def bump():
+    global c
+    c = c + 1
+    return c
+def f(n):
+    x = bump()
+    if n == 0:
+        return 0
+    return f(n - 1) + c
+print(f(3))
+''',
+    'global array element': '''c_ = [0] * 2
+def f(n):
+    c_[0] = c_[0] + 1
+    if n == 0:
+        return 0
+    return f(n - 1) + c_[0]
+print(f(3))
+''',
+}
+
+@pytest.mark.parametrize('options', [{}, UNOPTIMIZED], ids=['optimized', 'unoptimized'])
+@pytest.mark.parametrize('name', CHANGED_GLOBALS)
+def test_accumulator_reads_globals_after_the_call(name, options):
+    source = CHANGED_GLOBALS[name]
+    compiler, result = compile_run(source, **options)
+    assert result.output == python_output(source) == '12'
+    # every level calls
+    assert result.mnemonic_counts()['CALL'] >= 4
+
+def test_globals_nothing_changes_are_accumulated():
+    source = '''k = int(input())
+def f(n):
+    if n == 0:
+        return 0
+    return f(n - 1) + k
+print(f(500))
+'''
+    compiler, result = compile_run(source, (7,))
+    assert result.output == python_output(source, (7,))
+    assert result.mnemonic_counts()['CALL'] == 1
+
+def test_tail_calls_can_be_turned_off():
+    source, _ = PROGRAMS['tail call']
+    compiler, result = compile_run(source, (50,), tail_calls = False)
+    assert result.output == python_output(source, (50,))
+    assert result.mnemonic_counts()['CALL'] == 51
+
+def test_no_tail_calls_flag(tmp_path):
+    source, _ = PROGRAMS['sum accumulator']
+    path = tmp_path / 'total.py'
+    path.write_text(source)
+    cli = subprocess.run([sys.executable, os.path.join(ROOT, 'translator.py'), '-f', str(path), '--no-cache', '--no-tail-calls'], capture_output=True, text=True, check=True)
+    assert cli.stdout == compile_source(source, str(path), tail_calls = False) != compile_source(source, str(path))
+    assert Compiler(tail_calls = False).options() != Compiler().options()
@@ -0,0 +1,80 @@
+import pytest
+from programs import UNOPTIMIZED, compile_run, compiled_output, python_output
+
+# name -> source, n is read so nothing folds
+PROGRAMS = {
+    'counter': '''n = int(input())
+total = 0
+i = 0
+while i < n:
+    total = total + i
+    i = i + 1
+print(total)
+print(i)
+''',
+    'down counter': '''n = int(input())
+total = 0
+while n > 0:
+    total = total + n
+    n = n - 2
+print(total)
+print(n)
+''',
+    'array index': '''a_ = [0] * 10
+n = int(input())
+i = 0
+while i < 10:
+    a_[i] = i + n
+    i = i + 1
+j = 0
+s = 0
+while j < 10:
+    s = s + a_[j]
+    j = j + 1
+print(s)
+''',
+    'call in the loop': '''def twice(v):
+    return v + v
+n = int(input())
+i = 0
+s = 0
+while i < n:
+    s = s + twice(i)
+    print(i)
+    i = i + 1
+print(s)
+''',
+    'in a function': '''def count(n):
+    c = 0
+    k = 0
+    while k < n:
+        c = c + 3
+        k = k + 1
+    return c
+n = int(input())
+print(count(n))
+''',
+}
+
+@pytest.mark.parametrize('name', PROGRAMS)
+def test_loops_in_x_match_python(name):
+    source = PROGRAMS[name]
+    for n in (0, 1, 5):
+        compiler, result = compile_run(source, (n,))
+        assert result.output == python_output(source, (n,)), n
+        assert compiled_output(source, (n,), **UNOPTIMIZED) == result.output
+
+def test_counter_lives_in_x():
+    source = PROGRAMS['counter']
+    compiler, result = compile_run(source, (50,))
+    assert any(line.startswith('registers: i in X in the loop at') for line in compiler.report)
+    plain = compile_run(source, (50,), registers = False)[1]
+    assert result.output == plain.output
+    assert result.memory_reads + result.memory_writes < plain.memory_reads + plain.memory_writes
+    assert result.cycles < plain.cycles
+    assert 'CPWX' in result.mnemonic_counts()
+
+def test_nothing_allocated_without_registers():
+    compiler, result = compile_run(PROGRAMS['counter'], (5,), registers = False)
+    assert not any(line.startswith('registers:') for line in compiler.report)
+    assert 'CPWX' not in result.mnemonic_counts()
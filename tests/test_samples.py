@@ -0,0 +1,39 @@
+import ast
+import glob
+import os
+import pytest
+from compiler import Compiler
+from programs import UNOPTIMIZED, compiled_output, python_output
+
+SAMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '_samples')
+
+# what the samples read
+INPUTS = {
+    'add_sub': [10], 'factorial': [5], 'fibonnaci': [10], 'mult': [6, 7], 'gcd': [12, 18], 'smart_mult': [6, 7],
+    'call_param': [5], 'call_return': [5], 'call_void': [5], 'factorial_rec': [5], 'fib_rec': [10],
+    'eratosthenes': [30], 'eratosthenes_local': [30], 'fibo_cached': [10],
+    'global_read': [1, 3, 10, 20, 30], 'test': [5, 6, 7, 8, 9], 'fib_memo': [20],
+}
+
+# python the compiler rejects: a string, an array whose length is a variable
+UNSUPPORTED = {'1_global/testlol.py', '5_arrays/local_read.py'}
+
+def samples():
+    paths = sorted(glob.glob(os.path.join(SAMPLES, '*', '*.py')))
+    return [os.path.relpath(p, SAMPLES).replace(os.sep, '/') for p in paths]
+
+def read(sample):
+    with open(os.path.join(SAMPLES, sample)) as f:
+        return f.read()
+
+@pytest.mark.parametrize('options', [{}, UNOPTIMIZED], ids=['optimized', 'unoptimized'])
+@pytest.mark.parametrize('sample', [s for s in samples() if s not in UNSUPPORTED])
+def test_sample_prints_what_python_prints(sample, options):
+    source = read(sample)
+    inputs = INPUTS.get(os.path.splitext(os.path.basename(sample))[0], [])
+    assert compiled_output(source, inputs, **options) == python_output(source, inputs)
+
+@pytest.mark.parametrize('sample', sorted(UNSUPPORTED))
+def test_unsupported_sample_is_rejected(sample):
+    with pytest.raises(ValueError):
+        Compiler().translate(sample, ast.parse(read(sample)))
@@ -0,0 +1,95 @@
+import pytest
+from simulator.Pep9 import AssemblerError, SimulationError, assemble, run
+
+def test_input_arithmetic_and_output():
+    source = '''\t\tDECI a,d
+\t\tLDWA a,d
+\t\tADDA 5,i
+\t\tSUBA b,d
+\t\tSTWA a,d
+\t\tDECO a,d
+\t\tSTOP
+a:\t\t.BLOCK 2
+b:\t\t.WORD 2
+\t\t.END
+'''
+    result = run(source, '-10')
+    assert result.output == '-7'
+    assert result.instructions == 7
+    assert result.memory_reads == 3 and result.memory_writes == 2
+
+def test_loop_and_branches():
+    # counts down from 3 with X, one DECO per iteration
+    source = '''\t\tLDWX 3,i
+loop:\t\tSTWX n,d
+\t\tDECO n,d
+\t\tSUBX 1,i
+\t\tBRGT loop
+\t\tSTOP
+n:\t\t.BLOCK 2
+\t\t.END
+'''
+    result = run(source)
+    assert result.output == '321'
+    assert result.mnemonic_counts() == {'LDWX': 1, 'STWX': 3, 'DECO': 3, 'SUBX': 3, 'BRGT': 3, 'STOP': 1}
+
+def test_stack_and_calls():
+    source = '''\t\tSUBSP 2,i
+\t\tLDWA 20,i
+\t\tSTWA 0,s
+\t\tCALL double
+\t\tDECO 0,s
+\t\tADDSP 2,i
+\t\tSTOP
+double:\t\tLDWA 2,s
+\t\tASLA
+\t\tSTWA 2,s
+\t\tRET
+\t\t.END
+'''
+    assert run(source).output == '40'
+
+def test_indexed_and_bytes():
+    source = '''\t\tLDWX 2,i
+\t\tLDWA 7,i
+\t\tSTWA arr,x
+\t\tLDWA 0,i
+\t\tLDBA text,d
+\t\tSTBA charOut,d
+\t\tLDWX 1,i
+\t\tLDBA text,x
+\t\tSTBA charOut,d
+\t\tLDWX 2,i
+\t\tDECO arr,x
+\t\tDECO arr,d
+\t\tSTOP
+arr:\t\t.BLOCK 4
+text:\t\t.ASCII "ok"
+\t\t.END
+'''
+    assert run(source).output == 'ok70'
+
+def test_equates_and_words():
+    source = '''size:\t\t.EQUATE 3
+\t\tLDWA size,i
+\t\tADDA w,d
+\t\tSTWA w,d
+\t\tDECO w,d
+\t\tSTOP
+w:\t\t.WORD -32768
+\t\t.END
+'''
+    assert run(source).output == '-32765'
+
+def test_program_size_is_its_end_address():
+    # without .END, the last statement is not where the program ends
+    assert assemble('\t\tSTOP\n\t\t.BLOCK 4\n').size == 5
+    assert assemble('\t\tSTOP\n\t\t.BLOCK 4\n\t\t.END\n').size == 5
+
+def test_errors():
+    with pytest.raises(AssemblerError):
+        assemble('\t\tLDWA missing,d\n\t\t.END\n')
+    with pytest.raises(AssemblerError):
+        assemble('\t\tFOO 1,i\n\t\t.END\n')
+    with pytest.raises(SimulationError):
+        run('loop:\t\tBR loop\n\t\t.END\n', max_steps=100)
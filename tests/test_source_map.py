@@ -0,0 +1,65 @@
+import json
+import os
+import subprocess
+import sys
+import pytest
+from compiler import Compiler
+from simulator.Pep9 import assemble
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SOURCE = '''def f(a):
+    s = 0
+    while a > 0:
+        s = s + a * 3
+        a = a - 1
+    return s
+n = int(input())
+i = 0
+while i < n:
+    print(f(i))
+    i = i + 1
+'''
+
+def translate(**options):
+    compiler = Compiler(source_map = True, **options)
+    lines = compiler.translate('a.py', compiler.parse(SOURCE, 'a.py'))
+    return lines, compiler.mapping
+
+@pytest.mark.parametrize('options', [{}, {'source_comments': True}, {'inline_budget': 0}], ids=['plain', 'comments', 'not inlined'])
+def test_mappings_point_at_the_instructions(options):
+    lines, mapping = translate(**options)
+    program = assemble('\n'.join(lines) + '\n')
+    assert mapping['file'] == 'a.py' and mapping['mappings']
+    source_lines = SOURCE.splitlines()
+    for row, address, line, column in mapping['mappings']:
+        instruction = program.instructions[address]
+        # the text line of the mapping is the one the assembler read at that address
+        assert instruction.line == row
+        assert lines[row - 1].split(':')[-1].split()[0] == instruction.mnemonic
+        assert 0 < line <= len(source_lines) and source_lines[line - 1][column:].strip()
+    for label, address in mapping['labels'].items():
+        assert program.symbols[label] == address
+
+def test_statements_are_mapped_to_their_lines():
+    lines, mapping = translate(inline_budget = 0)
+    mapped = {line for _, _, line, _ in mapping['mappings']}
+    # the prologue is on the def line, i = 0 is the initial value of the .WORD
+    assert mapped == {1, 2, 3, 4, 5, 6, 7, 9, 10, 11}
+    columns = {line: column for _, _, line, column in mapping['mappings']}
+    assert columns[4] == 8 and columns[10] == 4 and columns[7] == 0
+
+def test_source_comments():
+    lines, _ = translate(source_comments = True)
+    assert '; line 7: n = int(input())' in lines
+    assert '; line 10: print(f(i))' in lines
+    # comments do not change the code
+    plain, _ = translate()
+    assert [line for line in lines if not line.startswith('; line')] == plain
+
+def test_cli_writes_the_map(tmp_path):
+    path = tmp_path / 'a.py'
+    path.write_text(SOURCE)
+    subprocess.run([sys.executable, os.path.join(ROOT, 'translator.py'), '-f', str(path), '--source-map'], capture_output=True, text=True, check=True)
+    mapping = json.loads((tmp_path / 'a.pep.map').read_text())
+    assert mapping == translate()[1] | {'file': str(path)}
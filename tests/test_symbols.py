@@ -0,0 +1,54 @@
+import os
+import subprocess
+import sys
+import pytest
+from analysis.SymbolTable import ARRAY, CONSTANT, GLOBAL, MAX_LENGTH, SymbolTable
+from programs import compiled_output, python_output
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# long names share their first 8 characters, one short name is such a prefix
+LONG_NAMES = '''counter_of_apples = int(input())
+counter_of_pears = counter_of_apples + 1
+counter = counter_of_pears * 2
+counter_of_plums = counter + counter_of_apples
+print(counter_of_apples)
+print(counter_of_pears)
+print(counter)
+print(counter_of_plums)
+'''
+
+def test_labels_fit_and_are_unique():
+    table = SymbolTable(reserved = ['tl', 'counter2'])
+    for name in ('counter_of_apples', 'x', 'counter_of_pears', 'counter', 'counter_of_plums'):
+        table.define(name, GLOBAL)
+    table.assign_labels()
+    labels = {name: table.label(name) for name in table.symbols}
+    # names that fit keep theirs, the rest skip every taken or reserved label
+    assert labels == {'counter_of_apples': 'counter_', 'x': 'x', 'counter_of_pears': 'counter3', 'counter': 'counter', 'counter_of_plums': 'counter4'}
+    assert all(len(label) <= MAX_LENGTH for label in labels.values())
+    assert table.label('undefined') == 'undefined'
+
+def test_kinds():
+    table = SymbolTable()
+    table.define('n', CONSTANT, 3)
+    table.define('arr_', ARRAY, size = 4)
+    table.define('arr_', ARRAY, size = 8)
+    assert table['arr_'].size == 8 and table['n'].value == 3
+    assert [s.name for s in table.of_kind(ARRAY)] == ['arr_']
+    with pytest.raises(ValueError):
+        table.define('n', ARRAY, size = 4)
+
+def test_long_names_match_python():
+    for value in (1, 20):
+        assert compiled_output(LONG_NAMES, (value,)) == python_output(LONG_NAMES, (value,))
+
+def test_same_program_in_every_process(tmp_path):
+    path = tmp_path / 'names.py'
+    path.write_text(LONG_NAMES)
+    outputs = set()
+    for seed in ('1', '2', '3'):
+        environment = dict(os.environ, PYTHONHASHSEED=seed)
+        cli = subprocess.run([sys.executable, os.path.join(ROOT, 'translator.py'), '-f', str(path), '--no-cache'], capture_output=True, text=True, check=True, env=environment)
+        outputs.add(cli.stdout)
+    assert len(outputs) == 1
@@ -1,51 +1,220 @@
 import argparse
 import ast
-from visitors.GlobalVariables import GlobalVariableExtraction
-from visitors.TopLevelProgram import TopLevelProgram
-from visitors.FuncDef import FuncDef
-from generators.StaticMemoryAllocation import StaticMemoryAllocation
-from generators.EntryPoint import EntryPoint
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from cache.CompilationCache import CompilationCache
+from cache.FragmentCache import FragmentCache
+from compiler import Compiler, compiler_version
+from optimizers.Inliner import DEFAULT_BUDGET
+from optimizers.Peephole import PeepholeOptimizer
+from profiling.StageProfiler import StageProfiler, profile_json, profile_table
 
 def main():
-    input_file, print_ast = process_cli()
+    args = process_cli()
+    # a report, a profile or a source map needs an actual compilation, so it bypasses the cache
+    cache_config = None if args['no_cache'] or args['report'] or args['profile'] or args['source_map'] else (args['cache_dir'], args['cache_size'] * 1024 * 1024)
+    options = compiler_options(args)
+    if args['batch']:
+        sys.exit(process_batch(args['batch'], args['output_dir'], args['jobs'], cache_config, options, args['profile'], args['profile_file'], bool(args['source_map'])))
+    input_file, print_ast = args['f'], args['ast_only']
     with open(input_file) as f:
         source = f.read()
-    node = ast.parse(source)
     if print_ast:
-        print(ast.dump(node, indent=2))
+        print(ast.dump(ast.parse(source), indent=2))
     else:
-        process(input_file, node)
+        cache = open_cache(cache_config)
+        profiler = StageProfiler() if args['profile'] else None
+        compiler = Compiler(**options, source_map=bool(args['source_map']), profiler=profiler)
+        sys.stdout.write(cached_compile(cache, source, input_file, compiler))
+        if args['source_map']:
+            write_source_map(compiler.mapping, args['source_map'] if args['source_map'] is not True else map_path(input_file))
+        if cache:
+            # stdout is the program, the cache statistics go with the report lines
+            evicted = cache.evict()
+            print(f'; cache: {cache.hits} hits, {cache.misses} misses, {evicted} evicted', file=sys.stderr)
+        if args['report']:
+            for line in compiler.report:
+                print(f'; {line}', file=sys.stderr)
+        if profiler:
+            write_profile(profiler.records, args['profile'], args['profile_file'])
     
 def process_cli():
     """"Process Command Line Interface options"""
     parser = argparse.ArgumentParser()
     parser.add_argument('-f', help='filename to compile (.py)')
     parser.add_argument('--ast-only', default=False, action='store_true')
+    parser.add_argument('--batch', nargs='+', metavar='PATH', help='directories or glob patterns to compile, one .pep per .py file')
+    parser.add_argument('-o', '--output-dir', default='build', help='where batch mode writes the .pep files (default: build)')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='number of worker processes in batch mode')
+    parser.add_argument('--no-cache', default=False, action='store_true', help='always recompile, ignoring the compilation cache')
+    parser.add_argument('--cache-dir', default='.pepcache', help='compilation cache directory (default: .pepcache)')
+    parser.add_argument('--cache-size', type=int, default=64, help='compilation cache size limit in MB (default: 64)')
+    parser.add_argument('--inline-budget', type=int, default=DEFAULT_BUDGET, metavar='NODES', help=f'largest function body inlined at its call sites, 0 disables inlining (default: {DEFAULT_BUDGET})')
+    parser.add_argument('--no-fold', default=False, action='store_true', help='disable constant folding and propagation')
+    parser.add_argument('--no-loop-opt', default=False, action='store_true', help='disable the while loop optimizations (hoisting, induction variables)')
+    parser.add_argument('--no-registers', default=False, action='store_true', help='keep loop counters in memory instead of the X register')
+    parser.add_argument('--no-branch-opt', default=False, action='store_true', help='keep the loop layout, the jumps and the compares the visitors generate')
+    parser.add_argument('--no-tail-calls', default=False, action='store_true', help='keep self tail calls and accumulator recursion as calls instead of loops')
+    parser.add_argument('--no-byte-arrays', default=False, action='store_true', help='store every array element in a word, even when its values fit in a byte')
+    parser.add_argument('--no-prune', default=False, action='store_true', help='keep the functions and globals the program never uses')
+    parser.add_argument('--no-peephole', default=False, action='store_true', help='disable the peephole optimizer')
+    parser.add_argument('--peephole-rules', help='comma separated peephole rules to apply (default: all)')
+    parser.add_argument('--report', default=False, action='store_true', help='print what the optimization passes did on stderr')
+    parser.add_argument('--profile', nargs='?', const='table', choices=['table', 'json'], help='measure every compilation stage (time, CPU, peak memory, AST nodes, instructions), as a table or as JSON lines (default: table)')
+    parser.add_argument('--profile-file', metavar='PATH', help='where --profile writes, stderr by default')
+    parser.add_argument('--source-comments', default=False, action='store_true', help='precede the code of every statement with its python line as a comment')
+    parser.add_argument('--source-map', nargs='?', const=True, metavar='PATH', help='write where every instruction comes from (pep line, address, python line and column) as JSON, next to the input as .pep.map by default, next to every .pep in batch mode')
     args = vars(parser.parse_args())
-    return args['f'], args['ast_only']
-
-def process(input_file, root_node):
-    print(f'; Translating {input_file}')
-    extractor = GlobalVariableExtraction()
-    extractor.visit(root_node)
-    memory_alloc = StaticMemoryAllocation(extractor.results, extractor.results_const, extractor.results_priv, extractor.results_arrays)
-    print('; Branching to top level (tl) instructions')
-    print('\t\tBR tl')
-    memory_alloc.generate()
-    # function definitions
-    func_level = FuncDef(extractor.name_mapping)
-    # visit all func defn nodes
-    for i in root_node.body:
-        if (isinstance(i, ast.FunctionDef)):
-            func_level.visit(i)
-    ep_f = EntryPoint(func_level.finalize())
-    ep_f.generate_f()
-
-
-    top_level = TopLevelProgram('tl', extractor.name_mapping, func_level.actual_arguments, func_level.ret_name)
-    top_level.visit(root_node)
-    ep = EntryPoint(top_level.finalize())
-    ep.generate() 
+    if not args['f'] and not args['batch']:
+        parser.error('one of -f or --batch is required')
+    if args['batch'] and args['source_map'] not in (None, True):
+        parser.error('--source-map takes no path in batch mode')
+    if args['peephole_rules']:
+        unknown = set(args['peephole_rules'].split(',')) - set(PeepholeOptimizer.RULES)
+        if unknown:
+            parser.error(f'unknown peephole rules {", ".join(sorted(unknown))}, choose from {", ".join(PeepholeOptimizer.RULES)}')
+    return args
+
+def compiler_options(args):
+    """Keyword arguments of Compiler from the command line options"""
+    rules = args['peephole_rules'].split(',') if args['peephole_rules'] else None
+    return {'peephole': not args['no_peephole'], 'peephole_rules': rules, 'fold_constants': not args['no_fold'], 'prune': not args['no_prune'], 'inline_budget': args['inline_budget'], 'optimize_loops': not args['no_loop_opt'], 'registers': not args['no_registers'], 'branches': not args['no_branch_opt'], 'byte_arrays': not args['no_byte_arrays'], 'tail_calls': not args['no_tail_calls'], 'source_comments': args['source_comments']}
+
+####
+## Compilation cache
+####
+
+def open_cache(cache_config):
+    if cache_config is None:
+        return None
+    directory, max_size = cache_config
+    return CompilationCache(directory, compiler_version(), max_size)
+
+def cached_compile(cache, source, input_file, compiler):
+    """Compile source, on a cache hit no AST work is done at all, on a miss only the functions that changed are generated"""
+    if cache is None:
+        return compile_text(source, input_file, compiler)
+    key = cache.key(source, compiler.options(), input_file)
+    text = cache.get(key)
+    if text is None:
+        compiler.fragments = FragmentCache(cache)
+        text = compile_text(source, input_file, compiler)
+        cache.put(key, text)
+    return text
+
+def compile_text(source, input_file, compiler):
+    return '\n'.join(compiler.translate(input_file, compiler.parse(source, input_file))) + '\n'
+
+def write_profile(records, form, path = None):
+    lines = profile_table(records) if form == 'table' else profile_json(records)
+    if path is None:
+        for line in lines:
+            print(line, file=sys.stderr)
+    else:
+        with open(path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+def map_path(path):
+    """Source map of a .pep file, or of a .py file whose program goes to stdout: name.pep.map"""
+    return os.path.splitext(path)[0] + '.pep.map'
+
+def write_source_map(mapping, path):
+    with open(path, 'w') as f:
+        json.dump(mapping, f)
+        f.write('\n')
+
+####
+## Batch mode
+####
+
+def collect_inputs(paths):
+    """Expand directories and glob patterns into a sorted list of .py files"""
+    files = set()
+    for path in paths:
+        matches = glob.glob(path, recursive=True) or [path]
+        for match in matches:
+            if os.path.isdir(match):
+                files.update(os.path.normpath(f) for f in glob.glob(os.path.join(match, '**', '*.py'), recursive=True))
+            elif match.endswith('.py') and os.path.isfile(match):
+                files.add(os.path.normpath(match))
+    return sorted(files)
+
+def output_paths(inputs, output_dir):
+    """The .pep file of every input, the tree of the inputs is mirrored in output_dir"""
+    absolute = [os.path.abspath(i) for i in inputs]
+    root = os.getcwd()
+    if any(os.path.relpath(path, root).split(os.sep)[0] == os.pardir for path in absolute):
+        # some files are outside of the working directory, the tree starts where all the inputs meet
+        root = os.path.commonpath([os.path.dirname(path) for path in absolute])
+    return [os.path.join(output_dir, os.path.splitext(os.path.relpath(path, root))[0] + '.pep') for path in absolute]
+
+def compile_file(input_file, output_file, cache_config, options, profile = False, source_map = False):
+    """Compile one file inside a worker, returns (input_file, error or None, cache hits, cache misses, stage records)
+
+    Every call builds its own visitors, so no state leaks between two
+    compilations that happen to run in the same worker process.
+    """
+    cache = open_cache(cache_config)
+    profiler = StageProfiler() if profile else None
+    try:
+        with open(input_file) as f:
+            source = f.read()
+        compiler = Compiler(**options, source_map=source_map, profiler=profiler)
+        text = cached_compile(cache, source, input_file, compiler)
+        os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+        with open(output_file, 'w') as f:
+            f.write(text)
+        if source_map:
+            write_source_map(compiler.mapping, map_path(output_file))
+        error = None
+    except Exception as e:
+        error = f'{type(e).__name__}: {e}'
+    records = profiler.records if profiler else []
+    if cache is None:
+        return input_file, error, 0, 0, records
+    return input_file, error, cache.hits, cache.misses, records
+
+def process_batch(paths, output_dir, jobs, cache_config=None, options=None, profile=None, profile_file=None, source_map=False):
+    inputs = collect_inputs(paths)
+    if not inputs:
+        print('; No .py files found', file=sys.stderr)
+        return 1
+    start = time.perf_counter()
+    failures = []
+    hits = misses = 0
+    records = []
+    jobs = max(1, jobs or 1)
+    outputs = output_paths(inputs, output_dir)
+    # hand out work in chunks so thousands of small files don't pay one round trip each
+    chunksize = max(1, len(inputs) // (jobs * 4))
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        configs = [cache_config] * len(inputs)
+        option_sets = [options or {}] * len(inputs)
+        profiles = [bool(profile)] * len(inputs)
+        maps = [source_map] * len(inputs)
+        for input_file, error, file_hits, file_misses, file_records in pool.map(compile_file, inputs, outputs, configs, option_sets, profiles, maps, chunksize=chunksize):
+            hits += file_hits
+            misses += file_misses
+            records.extend(file_records)
+            if error:
+                failures.append((input_file, error))
+    elapsed = time.perf_counter() - start
+
+    for input_file, error in failures:
+        print(f'FAILED {input_file}: {error}')
+    compiled = len(inputs) - len(failures)
+    rate = len(inputs) / elapsed if elapsed > 0 else float('inf')
+    print(f'{len(inputs)} files, {compiled} compiled, {len(failures)} failed in {elapsed:.2f}s ({rate:.1f} files/sec) -> {output_dir}')
+    if cache_config:
+        evicted = open_cache(cache_config).evict()
+        print(f'cache: {hits} hits, {misses} misses, {evicted} evicted')
+    if profile:
+        write_profile(records, profile, profile_file)
+    return 1 if failures else 0
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,462 @@
+import ast
+from generators.Runtime import power_of_two, reduce_power_of_two
+from ir.Instruction import Mode, Opcode, immediate, stack
+
+MULTIPLICATIVE = (ast.Mult, ast.FloorDiv, ast.Mod)
+
+# calls that do not jump to a user function
+BUILTINS = ('int', 'input', 'print', 'exit')
+
+def flatten(node, sign = 1, terms = None):
+    """Signed terms of a +/- chain, (a+b)-(c+d) gives a, b, -c, -d"""
+    if terms is None:
+        terms = []
+    if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.Add, ast.Sub)):
+        flatten(node.left, sign, terms)
+        flatten(node.right, sign if isinstance(node.op, ast.Add) else -sign, terms)
+    elif isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        flatten(node.operand, -sign if isinstance(node.op, ast.USub) else sign, terms)
+    else:
+        terms.append((sign, node))
+    return terms
+
+def to_word(value):
+    """Python int to the signed 16 bits value Pep/9 computes with"""
+    value = int(value) & 0xFFFF
+    return value - 0x10000 if value & 0x8000 else value
+
+def is_leaf(node):
+    """Values an instruction can use directly as its operand"""
+    return isinstance(node, (ast.Constant, ast.Name))
+
+def is_array_init(node):
+    """[value] * length, the only way arrays are created"""
+    return (isinstance(node, ast.BinOp) and isinstance(node.op, ast.Mult) and isinstance(node.left, ast.List)
+            and len(node.left.elts) == 1 and isinstance(node.left.elts[0], ast.Constant) and isinstance(node.right, ast.Constant))
+
+def contains_call(node):
+    """True when evaluating node calls a user function"""
+    return any(isinstance(n, ast.Call) and n.func.id not in BUILTINS for n in ast.walk(node))
+
+def is_pure(node):
+    """True when evaluating node neither calls a user function nor reads input"""
+    return not contains_call(node) and not any(is_input(n) for n in ast.walk(node))
+
+class ExpressionGenerator():
+    """
+        Code generation for expressions, shared by TopLevelProgram and FuncDef.
+
+        Pep/9 has no register to register instruction, values can only meet
+        through memory. +/- chains are flattened so every leaf is applied as
+        a memory operand, whatever the shape of the tree. Subtrees that need
+        the accumulator (calls, array reads, multiplications) are evaluated
+        first, the most demanding one first (Sethi-Ullman order), and the
+        partial result is only spilled to a stack temporary when another such
+        subtree follows. X holds the right operand of runtime routines and
+        array indexes, simple chains are computed directly in it.
+
+        A call or an input may print, read or change a global, operands are
+        only reordered when no call or input can tell (reorderable), the
+        others are evaluated left to right as python does.
+
+        Operands are (value, Mode) pairs. The owning visitor provides:
+            record(opcode, operand = None, label = None)   append an instruction
+            operand(name)           operand of a variable, e.g. ('x', Mode.D)
+            array(name)             indexed operand of an array, e.g. ('arr_', Mode.X)
+            element(name)           bytes per element of an array, 1 or 2
+            call(node)              emit a call, the result ends up in A
+            temporary(index)        operand of a stack temporary
+    """
+
+    def __init__(self, record, operand, array, element, call, temporary, runtime) -> None:
+        self.record = record
+        self.operand = operand
+        self.array = array
+        self.element = element
+        self.call = call
+        self.temporary = temporary
+        self.runtime = runtime
+        self.depth = 0          # temporaries in use
+        self.max_depth = 0      # temporaries the frame has to provide
+
+    ####
+    ## Statements level helpers
+    ####
+
+    def load(self, node):
+        """Value of node in A"""
+        self.__chain(node, 'A')
+
+    def load_index(self, node, element = 2):
+        """Byte offset of array element node in X"""
+        if isinstance(node, ast.Constant):
+            self.record(Opcode.LDWX, immediate(to_word(node.value * element)))
+            return
+        if self.x_evaluable(node):
+            self.__chain(node, 'X')
+        else:
+            self.load(node)
+            temp = self.spill()
+            self.record(Opcode.LDWX, temp)
+            self.release()
+        if element == 2:
+            self.record(Opcode.ASLX)
+
+    def load_element(self, node):
+        """Value of array element node in A, a byte is loaded in a cleared A"""
+        name = node.value.id
+        element = self.element(name)
+        self.load_index(node.slice, element)
+        if element == 2:
+            self.record(Opcode.LDWA, self.array(name))
+        else:
+            # LDBA only sets the low byte
+            self.record(Opcode.LDWA, immediate(0))
+            self.record(Opcode.LDBA, self.array(name))
+
+    def store_element(self, target, value):
+        """target[index] = value"""
+        name = target.value.id
+        element = self.element(name)
+        if self.x_evaluable(target.slice) or isinstance(target.slice, ast.Constant):
+            self.load(value)
+            self.load_index(target.slice, element) # only touches X
+        elif not self.reorderable(value, target.slice):
+            # python computes the value before the index
+            self.load(value)
+            temp = self.spill()
+            self.load_index(target.slice, element)
+            self.record(Opcode.LDWA, temp)
+            self.release()
+        else:
+            # the index needs A, keep it aside while the value is computed
+            self.load(target.slice)
+            if element == 2:
+                self.record(Opcode.ASLA)
+            temp = self.spill()
+            self.load(value)
+            self.record(Opcode.LDWX, temp)
+            self.release()
+        self.record(Opcode.STWA if element == 2 else Opcode.STBA, self.array(name))
+
+    def input_element(self, target):
+        """target[index] = int(input()), DECI reads a word so a byte goes through a temporary"""
+        name = target.value.id
+        element = self.element(name)
+        if element == 2 and is_pure(target.slice):
+            self.load_index(target.slice)
+            self.record(Opcode.DECI, self.array(name))
+            return
+        # the value is read before the index is computed
+        temp = self.temporary(self.depth)
+        self.depth += 1
+        self.max_depth = max(self.max_depth, self.depth)
+        self.record(Opcode.DECI, temp)
+        self.load_index(target.slice, element)
+        self.record(Opcode.LDWA, temp)
+        self.release()
+        self.record(Opcode.STWA if element == 2 else Opcode.STBA, self.array(name))
+
+    def compare(self, left, right):
+        """Set the status bits for 'left - right'"""
+        if is_leaf(right):
+            self.load(left)
+            self.record(Opcode.CPWA, self.__leaf(right))
+            return
+        if not self.reorderable(left, right):
+            self.load(left)
+            first = self.spill()
+            self.load(right)
+            second = self.spill()
+            self.record(Opcode.LDWA, first)
+            self.record(Opcode.CPWA, second)
+            self.release()
+            self.release()
+            return
+        self.load(right)
+        temp = self.spill()
+        self.load(left)
+        self.record(Opcode.CPWA, temp)
+        self.release()
+
+    def output(self, node):
+        """print(node)"""
+        if is_leaf(node):
+            self.record(Opcode.DECO, self.__leaf(node))
+        elif isinstance(node, ast.Subscript) and self.element(node.value.id) == 2:
+            self.load_index(node.slice)
+            self.record(Opcode.DECO, self.array(node.value.id))
+        else:
+            self.load(node)
+            temp = self.spill()
+            self.record(Opcode.DECO, temp)
+            self.release()
+
+    def call_function(self, node, returns):
+        """Write the arguments at the bottom of the frame and call, the result (if any) ends up in A"""
+        args = node.args
+        calls = [i for i, arg in enumerate(args) if contains_call(arg)]
+        # the arguments up to the last call or input are computed first, left to right, the stable ones can wait
+        ordered = max((i for i, arg in enumerate(args) if not is_pure(arg)), default = -1)
+        # a nested call writes to the same area, so the arguments computed before it are kept aside
+        spilled = {}
+        stored = set()
+        for i, arg in enumerate(args):
+            if i <= ordered and not self.stable(arg):
+                self.load(arg)
+                if any(j > i for j in calls):
+                    spilled[i] = self.spill()
+                else:
+                    self.record(Opcode.STWA, stack(2 * i))
+                    stored.add(i)
+        for i, arg in enumerate(args):
+            if i in stored:
+                continue
+            if i in spilled:
+                self.record(Opcode.LDWA, spilled[i])
+            else:
+                self.load(arg)
+            self.record(Opcode.STWA, stack(2 * i))
+        for _ in spilled:
+            self.release()
+        self.record(Opcode.CALL, immediate(node.func.id))
+        if returns:
+            self.record(Opcode.LDWA, stack(2 * len(node.args)))
+
+    def fill(self, array, node, label):
+        """Initialize every element of an array created by [value] * length"""
+        value = to_word(node.left.elts[0].value)
+        element = self.element(array)
+        self.record(Opcode.LDWX, immediate(0))
+        self.record(Opcode.LDWA, immediate(value))
+        self.record(Opcode.STWA if element == 2 else Opcode.STBA, self.array(array), label)
+        self.record(Opcode.ADDX, immediate(element))
+        self.record(Opcode.CPWX, immediate(to_word(node.right.value * element)))
+        self.record(Opcode.BRLT, immediate(label))
+
+    ####
+    ## Temporaries
+    ####
+
+    def spill(self):
+        """Store A in a fresh temporary, returns its operand"""
+        temp = self.temporary(self.depth)
+        self.depth += 1
+        self.max_depth = max(self.max_depth, self.depth)
+        self.record(Opcode.STWA, temp)
+        return temp
+
+    def release(self):
+        self.depth -= 1
+
+    ####
+    ## Evaluation order
+    ####
+
+    def stable(self, node):
+        """node only reads constants and the stack frame, no call or input can change its value"""
+        if not is_pure(node):
+            return False
+        names = {n.id for n in ast.walk(node) if isinstance(n, ast.Name)} - set(BUILTINS)
+        return all(self.operand(name)[1] in (Mode.I, Mode.S) for name in names)
+
+    def reorderable(self, first, second):
+        """Can second be evaluated before first"""
+        return self.stable(first) or self.stable(second) or (is_pure(first) and is_pure(second))
+
+    def x_evaluable(self, node):
+        """Can node be computed in X alone (without touching A)"""
+        complex_terms = [term for _, term in flatten(node) if not is_leaf(term)]
+        if not complex_terms:
+            return True
+        if len(complex_terms) > 1:
+            return False
+        term = complex_terms[0]
+        return (isinstance(term, ast.BinOp) and isinstance(term.op, MULTIPLICATIVE)
+                and power_of_two(term.right) is not None and self.x_evaluable(term.left))
+
+    def need(self, node):
+        """Number of temporaries evaluating node in A requires"""
+        if is_leaf(node):
+            return 0
+        if isinstance(node, ast.Subscript):
+            if isinstance(node.slice, ast.Constant) or self.x_evaluable(node.slice):
+                return 0
+            return max(self.need(node.slice), 1)
+        if isinstance(node, ast.Call):
+            # arguments calling functions are kept in temporaries, the others go straight to their slot
+            args = node.args
+            spilled = sum(1 for a in args if contains_call(a))
+            return max([spilled] + [self.need(a) + spilled for a in args])
+        if isinstance(node, ast.BinOp) and isinstance(node.op, MULTIPLICATIVE):
+            left, right = self.__runtime_operands(node)
+            if right is None:
+                return self.need(left)
+            if self.x_evaluable(right):
+                return self.need(left)
+            return max(self.need(right), 1 + self.need(left))
+        terms = flatten(node)
+        if len(terms) == 1 and terms[0][1] is node:
+            raise ValueError(f'Unsupported expression: {ast.dump(node)}')
+        needs = sorted((self.need(term) for _, term in terms if not is_leaf(term)), reverse=True)
+        if not needs:
+            return 0
+        return max([needs[0]] + [1 + n for n in needs[1:]])
+
+    ####
+    ## Code generation
+    ####
+
+    def __chain(self, node, register):
+        terms = []
+        constant = 0
+        for sign, term in flatten(node):
+            if isinstance(term, ast.Constant):
+                constant += sign * term.value
+            else:
+                terms.append((sign, term))
+        constant = to_word(constant)
+        if all(is_pure(term) for _, term in terms):
+            constant = self.__reordered(terms, register, constant)
+        else:
+            # left to right, the stable leaves still go last
+            self.__ordered([t for t in terms if not (is_leaf(t[1]) and self.stable(t[1]))], register)
+            for sign, term in terms:
+                if is_leaf(term) and self.stable(term):
+                    self.record(Opcode[f'{"ADD" if sign > 0 else "SUB"}{register}'], self.__leaf(term))
+        if constant > 0:
+            self.record(Opcode[f'ADD{register}'], immediate(constant))
+        elif constant < 0:
+            self.record(Opcode[f'SUB{register}'], immediate(-constant))
+
+    def __reordered(self, terms, register, constant):
+        """Terms without side effects in any order, returns the part of the constant still to add"""
+        leaves = [(sign, term) for sign, term in terms if is_leaf(term)]
+        # the most demanding subtree first, its temporaries are free again before the next one
+        atoms = sorted([(sign, term) for sign, term in terms if not is_leaf(term)], key=lambda t: -self.need(t[1]))
+
+        started = False
+        for sign, term in atoms:
+            if not started:
+                self.__atom(term, register)
+                if sign < 0:
+                    self.record(Opcode[f'NEG{register}'])
+                started = True
+                continue
+            temp = self.spill()
+            self.__atom(term, 'A')
+            if sign < 0:
+                self.record(Opcode.NEGA)
+            self.record(Opcode.ADDA, temp)
+            self.release()
+
+        if not started:
+            positive = [t for t in leaves if t[0] > 0]
+            if positive:
+                first = positive[0]
+                leaves.remove(first)
+                self.record(Opcode[f'LDW{register}'], self.__leaf(first[1]))
+            elif constant != 0 or not leaves:
+                self.record(Opcode[f'LDW{register}'], immediate(constant))
+                constant = 0
+            else:
+                first = leaves.pop(0)
+                self.record(Opcode[f'LDW{register}'], self.__leaf(first[1]))
+                self.record(Opcode[f'NEG{register}'])
+        for sign, term in leaves:
+            self.record(Opcode[f'{"ADD" if sign > 0 else "SUB"}{register}'], self.__leaf(term))
+        return constant
+
+    def __ordered(self, terms, register):
+        """Terms in source order, at least one of them"""
+        for i, (sign, term) in enumerate(terms):
+            if i == 0:
+                if is_leaf(term):
+                    self.record(Opcode[f'LDW{register}'], self.__leaf(term))
+                else:
+                    self.__atom(term, register)
+                if sign < 0:
+                    self.record(Opcode[f'NEG{register}'])
+            elif is_leaf(term):
+                self.record(Opcode[f'{"ADD" if sign > 0 else "SUB"}{register}'], self.__leaf(term))
+            else:
+                temp = self.spill()
+                self.__atom(term, 'A')
+                if sign < 0:
+                    self.record(Opcode.NEGA)
+                self.record(Opcode.ADDA, temp)
+                self.release()
+
+    def __atom(self, node, register):
+        if isinstance(node, ast.BinOp) and isinstance(node.op, MULTIPLICATIVE):
+            self.__multiplicative(node, register)
+            return
+        if register != 'A':
+            raise ValueError(f'Cannot evaluate {ast.dump(node)} in {register}')
+        if isinstance(node, ast.Subscript):
+            self.load_element(node)
+        elif isinstance(node, ast.Call):
+            self.call(node)
+        else:
+            raise ValueError(f'Unsupported expression: {ast.dump(node)}')
+
+    def __multiplicative(self, node, register):
+        left, right = self.__runtime_operands(node)
+        if right is None:
+            self.__chain(left, register)
+            for opcode, operand in reduce_power_of_two(node.op, self.__shift(node), register):
+                self.record(opcode, operand)
+            return
+        # runtime routines take the left operand in A and the right one in X
+        if self.x_evaluable(right):
+            self.load(left)
+            self.__chain(right, 'X')
+        elif not self.reorderable(left, right):
+            self.load(left)
+            first = self.spill()
+            self.load(right)
+            second = self.spill()
+            self.record(Opcode.LDWX, second)
+            self.record(Opcode.LDWA, first)
+            self.release()
+            self.release()
+        else:
+            self.load(right)
+            temp = self.spill()
+            self.load(left)
+            self.record(Opcode.LDWX, temp)
+            self.release()
+        self.record(Opcode.CALL, immediate(self.runtime.use(node.op)))
+
+    def __runtime_operands(self, node):
+        """(left, right) operands of a runtime call, right is None when a shift is enough"""
+        left, right = node.left, node.right
+        if power_of_two(right) is not None:
+            return left, None
+        if isinstance(node.op, ast.Mult):
+            if power_of_two(left) is not None:
+                return right, None
+            # multiplication commutes, the side X can compute alone goes to X
+            if not self.x_evaluable(right) and self.x_evaluable(left) and self.reorderable(left, right):
+                return right, left
+        return left, right
+
+    def __shift(self, node):
+        shift = power_of_two(node.right)
+        return shift if shift is not None else power_of_two(node.left)
+
+    def __leaf(self, node):
+        if isinstance(node, ast.Constant):
+            if not isinstance(node.value, int):
+                raise ValueError(f'Only integers are supported: {node.value!r}')
+            return immediate(to_word(node.value))
+        return self.operand(node.id)
+
+def is_input(node):
+    """input() or int(input())"""
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+        if node.func.id == 'input':
+            return True
+        if node.func.id == 'int' and len(node.args) == 1:
+            return is_input(node.args[0])
+    return False
@@ -1,162 +1,198 @@
 import ast
-
-LabeledInstruction = tuple[str, str]
+from generators.Runtime import RuntimeLibrary
+from ir.Fragment import Fragment
+from ir.Instruction import Instruction, Mode, Opcode, direct, immediate, stack
+from analysis.SymbolTable import ARRAY, memo_tables
+from analysis.TailRecursion import TailRecursion
+from optimizers.RegisterAllocator import RegisterAllocator, array_sizes_fit
+from visitors.Expressions import ExpressionGenerator, is_array_init, is_input, is_leaf
+
+# hidden locals, their names cannot clash with python names
+ACCUMULATOR = '$acc'
+MEMO_KEY = '$key'   # argument of a memoized function that assigns its parameter
 
 class FuncDef(ast.NodeVisitor):
-    
-    def __init__(self, name_mapping) -> None:
+    """
+        Every function is generated on its own, as a Fragment with local
+        labels and .EQUATE symbols, then linked: the fragment of a function
+        that did not change can come from a cache instead.
+    """
+
+    def __init__(self, symbol_table, analysis, runtime = None, registers = None, tail_calls = True) -> None:
         super().__init__()
+        self.__program = list()     # linked functions
+        self.__next_id = 0          # first label number of the next linked function
         self.__instructions = list()
-        # self.__record_instruction('NOP1', label=entry_point)
-        self.__should_save = True
-        self.__current_variable = None
+        self.__pending_label = None
         self.__elem_id = 0
+        # (line, column) of the statement being visited
+        self.__position = (None, None)
 
+        # labels of the global names, shared with the static memory allocation
+        self.symbol_table = symbol_table
 
-        # collect all function defenition nodes in AST
-        self.func_nodes = []
+        # summaries of the function definitions, from the analysis walk
+        self.analysis = analysis
+        # (number of parameters, returns a value) of every function definition
+        self.functions = analysis.signatures()
 
+        # runtime routines (multiplication, division) shared with the top level program
+        self.runtime = runtime if runtime is not None else RuntimeLibrary()
 
-        #var names, True means it has been used and so must be reassigned
-        self.names = {}
+        # keeps loop counters in X, None to leave them in memory
+        self.registers = registers
+        # self tail calls and accumulator recursion become loops
+        self.tail_calls = tail_calls
 
-        # name mapping for long var names from GlobalVariables.py
-        self.name_mapping = name_mapping
+        # what the function being generated uses, linking adds it to the shared ones
+        self.__frame_labels = None
+        self.__symbols = []
+        self.__runtime = None
+        self.__registers = None
 
-        # every function call will store it's local vars/params/ret stack addresses here, then wipe it when complete
+        # every function definition stores its local vars/params stack symbols here, wiped for the next one
         self.temp_loc_vars = {}
+        self.loc_arrays = set()
         self.func_def = False
 
-        self.actual_loc_vars = {}
-        self.actual_arguments = {}
-
-        # check if an assignment involves a func call, to know if need to increase stack size
-        self.has_call = False
-        self.ret_name = None
-
-
-    def pre_finalize(self):
-        if self.ret_name:
-            self.__record_instruction(f'STWA {self.ret_name[0:1]}ret,s')
-
-
-        if self.temp_loc_vars:
-            st = ""
-            for i in self.actual_loc_vars.values():
-                st = st + ("#"+i+" ")
-            self.__record_instruction(f'ADDSP {len(self.actual_loc_vars)*2},i\t ;pop {st}')
-        self.__instructions.append((None, 'RET'))
-                # clearing the temp_vars dict
-        self.actual_loc_vars.clear()
-        
+        # frame of the function being visited
+        self.__outgoing = 0
+        self.__ret = None
+        self.__epilogue = None
+        self.__entry = None     # label after the prologue, self tail calls branch to it
+        self.__recursion = None
+        self.__expressions = None
+        self.__summary = None
 
     def finalize(self):
-        # self.temp_loc_vars.clear()
-        return self.__instructions
+        return self.__program
+
+    def visit(self, node):
+        # the instructions of a statement carry its source position
+        if not isinstance(node, ast.stmt) or not hasattr(node, 'lineno'):
+            return super().visit(node)
+        outer = self.__position
+        self.__position = (node.lineno, node.col_offset)
+        result = super().visit(node)
+        self.__position = outer
+        return result
+
+    @property
+    def next_id(self):
+        """Label numbers from here on are free"""
+        return self.__next_id
+
+    def dependencies(self, node):
+        """What the code of a function depends on besides its AST, as text: the globals it names and the functions it calls"""
+        summary = self.analysis.functions[node.name]
+        parts = [f'{node.name}:{self.functions[node.name]}']
+        for name in sorted({*summary.reads, *summary.calls, *summary.declared_globals}):
+            if not summary.reads_global(name):
+                continue
+            if name in self.functions:
+                parts.append(f'{name}:{self.functions[name]}')
+            elif name in self.symbol_table:
+                symbol = self.symbol_table[name]
+                parts.append(f'{name}:{symbol.label}:{symbol.kind}:{symbol.size}:{symbol.element}:{self.symbol_table.is_removed(name)}')
+            else:
+                parts.append(f'{name}:{self.symbol_table.is_removed(name)}')
+        if summary.byte_arrays:
+            parts.append(f'bytes:{",".join(sorted(summary.byte_arrays))}')
+        if node.name in summary.calls:
+            # an accumulator may only read globals when the callees cannot change them
+            parts.append(f'callees pure:{self.analysis.calls_only_pure(node.name)}')
+        if summary.memo is not None:
+            parts.append(f'pure:{self.analysis.is_pure(node.name)}')
+            parts.extend(self.symbol_table[name].label for name in memo_tables(node.name))
+        return ';'.join(parts)
+
+    def generate(self, node):
+        """Fragment of one function definition"""
+        self.__instructions = list()
+        self.__elem_id = 0
+        self.__frame_labels = self.symbol_table.scope()
+        self.__symbols = []
+        self.__runtime = RuntimeLibrary()
+        self.__registers = RegisterAllocator() if self.registers is not None else None
+        self.__define(node)
+        labels = [ins.label for ins in self.__instructions if ins.label is not None and ins.opcode is not Opcode.EQUATE and ins.label != node.name]
+        report = self.__registers.report if self.__registers is not None else []
+        return Fragment(self.__instructions, self.__symbols, labels, self.__elem_id, self.__runtime.routines, report, node.lineno)
+
+    def link(self, fragment, line):
+        """Add a function to the program, line is where it starts in the source"""
+        names = {}
+        for label, base in fragment.symbols:
+            names[label] = self.symbol_table.unique(base)
+        for label in fragment.labels:
+            prefix, _, number = label.rpartition('_')
+            names[label] = f'{prefix}_{int(number) + self.__next_id}'
+        self.__next_id += fragment.ids
+        self.__program.extend(fragment.relocate(names, line))
+        for name in fragment.routines:
+            self.runtime.link(name)
+        if self.registers is not None:
+            self.registers.report.extend(fragment.report_at(line))
+            self.registers.loops += len(fragment.report)
 
     ####
     ## Handling Assignments (variable = ...)
     ####
 
     def visit_Assign(self, node):
-        # remembering the name of the target
-        self.__current_variable = node.targets[0].id
-        func_def_var = False
-
-        # check if we are assigning to a function local var
-        if self.__current_variable in self.temp_loc_vars:
-            func_def_var = True
-
-        # # if assignment value is constant, already stored as a global variable so no need to assign
-        if isinstance(node.value, ast.Constant):
-            # private nodes do not need to be assigned
-            if self.isPrivate(node.targets[0].id): 
-                return
-            
-        # check if there is a func call
-            if isinstance(node.value, ast.Call):
-                self.has_call = True
-
-
-        # visiting the left part, now knowing where to store the result
-        self.visit(node.value)
-        if self.__should_save:
-            if func_def_var:
-                self.__record_instruction(f'STWA {self.temp_loc_vars[self.__current_variable]},s')
-            else:
-                self.__record_instruction(f'STWA {self.__current_variable},d')
-        else:
-            self.__should_save = True
-        self.__current_variable = None
-        
-        if self.has_call:
-            self.__record_instruction(f'ADDSP 2,i')
-        self.has_call = False
-
-    def visit_Constant(self, node):
-        self.__record_instruction(f'LDWA {node.value},i')
-    
-    def visit_Name(self, node):
-        # check if id is too long, get name from dict
-        if len(node.id) > 8:
-            self.__record_instruction(f'LDWA {self.name_mapping[node.id]},d')
-        else:
-            if node.id in self.temp_loc_vars:
-                self.__record_instruction(f'\t\tLDWA {self.temp_loc_vars[node.id]},s')
+        if len(node.targets) != 1:
+            raise ValueError("Only unary assignments are supported")
+        target = node.targets[0]
+
+        # assigning an array element
+        if isinstance(target, ast.Subscript):
+            if is_input(node.value):
+                self.__expressions.input_element(target)
             else:
-                self.__record_instruction(f'LDWA {node.id},d')
-
-    def visit_BinOp(self, node):
-        self.__access_memory(node.left, 'LDWA')
-        if isinstance(node.op, ast.Add):
-            self.__access_memory(node.right, 'ADDA')
-        elif isinstance(node.op, ast.Sub):
-            self.__access_memory(node.right, 'SUBA')
-        else:
-            raise ValueError(f'Unsupported binary operator: {node.op}')
+                self.__expressions.store_element(target, node.value)
+            return
+
+        name = target.id
+        # a global nothing reads
+        if name not in self.temp_loc_vars and self.symbol_table.is_removed(name):
+            return
+
+        if is_array_init(node.value):
+            # the stack is not zeroed, arrays are filled on every call
+            self.__expressions.fill(name, node.value, f'fill_{self.__identify()}')
+            return
+
+        # private nodes do not need to be assigned
+        if isinstance(node.value, ast.Constant) and self.isPrivate(name):
+            return
+
+        if is_input(node.value):
+            # We are only supporting integers for now, DECI saves the value in memory
+            self.__record_instruction(Opcode.DECI, self.__operand(name))
+            return
+
+        self.__expressions.load(node.value)
+        self.__record_instruction(Opcode.STWA, self.__operand(name))
+
+    def visit_AugAssign(self, node):
+        # x += e is compiled as x = x + e
+        value = ast.BinOp(left=node.target, op=node.op, right=node.value)
+        self.visit_Assign(ast.Assign(targets=[node.target], value=value))
+
+    ####
+    ## Handling function calls used as statements
+    ####
 
     def visit_Call(self, node):
-        match node.func.id: 
-            case 'int': 
-                # Let's visit whatever is casted into an int
-                self.visit(node.args[0])
-            case 'input':
-                # We are only supporting integers for now
-                if self.__current_variable in self.temp_loc_vars:
-                    self.__record_instruction(f'DECI {self.temp_loc_vars[self.__current_variable]},s')
-                else:
-                    self.__record_instruction(f'DECI {self.__current_variable},d')
-                self.__should_save = False # DECI already save the value in memory
+        match node.func.id:
             case 'print':
                 # We are only supporting integers for now
-                if node.args[0].id in self.temp_loc_vars:
-                    self.__record_instruction(f'DECO {self.temp_loc_vars[node.args[0].id]},s')
-                else:
-                    self.__record_instruction(f'DECO {node.args[0].id},d')
+                self.__expressions.output(node.args[0])
+            case 'exit':
+                # the exit status is lost, Pep/9 only stops
+                self.__record_instruction(Opcode.STOP)
             case _:
-                # count num of args
-                count_args = 0
-                count_call = 0
-
-                for i in node.args:
-                    count_args += 2
-                if self.has_call:
-                    count_call += 2
-                self.__record_instruction(f'SUBSP {count_args + count_call},i')
-
-                c = 0
-                for i in node.args:
-                    self.visit(i)
-                    self.__record_instruction(f'STWA {c},s')
-                    c+= 2
-                self.__record_instruction(f'CALL {node.func.id}')
-                
-                if count_args > 0:
-                    self.__record_instruction(f'ADDSP {count_args},i')
-                
-                if count_call > 0:
-                    self.__record_instruction(f'LDWA 0,s')
-
+                self.__call(node, keep_result = False)
 
     ####
     ## Handling While loops (only variable OP variable)
@@ -165,157 +201,325 @@ class FuncDef(ast.NodeVisitor):
     def visit_While(self, node):
         loop_id = self.__identify()
         inverted = {
-            ast.Lt:  'BRGE', # '<'  in the code means we branch if '>=' 
-            ast.LtE: 'BRGT', # '<=' in the code means we branch if '>' 
-            ast.Gt:  'BRLE', # '>'  in the code means we branch if '<='
-            ast.GtE: 'BRLT', # '>=' in the code means we branch if '<'
-            ast.Eq: 'BRNE', # '==' in the code means we branch if '!='
-            ast.NotEq: 'BREQ', # '!=' in the code means we branch if '=='
+            ast.Lt:  Opcode.BRGE, # '<'  in the code means we branch if '>='
+            ast.LtE: Opcode.BRGT, # '<=' in the code means we branch if '>'
+            ast.Gt:  Opcode.BRLE, # '>'  in the code means we branch if '<='
+            ast.GtE: Opcode.BRLT, # '>=' in the code means we branch if '<'
+            ast.Eq: Opcode.BRNE, # '==' in the code means we branch if '!='
+            ast.NotEq: Opcode.BREQ, # '!=' in the code means we branch if '=='
         }
-        # left part can only be a variable
-        self.__access_memory(node.test.left, 'LDWA', label = f'test_l_{loop_id}')
-        # right part can only be a variable
-        self.__access_memory(node.test.comparators[0], 'CPWA')
+        self.__label_next(f'test_l_{loop_id}')
+        start = len(self.__instructions)
+        self.__expressions.compare(node.test.left, node.test.comparators[0])
         # Branching is condition is not true (thus, inverted)
-        self.__record_instruction(f'{inverted[type(node.test.ops[0])]} end_l_{loop_id}')
-        # Visiting the body of the loop
+        self.__record_instruction(inverted[type(node.test.ops[0])], immediate(f'end_l_{loop_id}'))
+        # Visiting the body of the loop, the register allocator works statement by statement
+        bounds = [len(self.__instructions)]
         for contents in node.body:
-
-            # if there is an assignment using a constant, never skip it in a while loop
-            if isinstance(contents, ast.Assign):
-                if isinstance(contents.value, ast.Constant):
-                    self.names[contents.targets[0].id] = True
-
             self.visit(contents)
-        self.__record_instruction(f'BR test_l_{loop_id}')
+            bounds.append(len(self.__instructions))
+        self.__record_instruction(Opcode.BR, immediate(f'test_l_{loop_id}'))
         # Sentinel marker for the end of the loop
-        self.__record_instruction(f'NOP1', label = f'end_l_{loop_id}')
+        self.__record_instruction(Opcode.NOP1, label = f'end_l_{loop_id}')
+        if self.__registers is not None:
+            scaled = array_sizes_fit(node, self.__array_size)
+            self.__registers.allocate(self.__instructions, start, bounds, self.__counters(node.test), scaled, f'{self.__summary.name} line {node.lineno}')
 
     ####
     ## Handling conditional statements
     ####
-    def visit_If(self, node): 
+    def visit_If(self, node):
         cond_id = self.__identify()
         inverted = {
-            ast.Lt:  'BRGE', # '<'  in the code means we branch if '>=' 
-            ast.LtE: 'BRGT', # '<=' in the code means we branch if '>' 
-            ast.Gt:  'BRLE', # '>'  in the code means we branch if '<='
-            ast.GtE: 'BRLT', # '>=' in the code means we branch if '<'
-            ast.Eq: 'BRNE', # '==' in the code means we branch if '!='
-            ast.NotEq: 'BREQ', # '!=' in the code means we branch if '=='
+            ast.Lt:  Opcode.BRGE, # '<'  in the code means we branch if '>='
+            ast.LtE: Opcode.BRGT, # '<=' in the code means we branch if '>'
+            ast.Gt:  Opcode.BRLE, # '>'  in the code means we branch if '<='
+            ast.GtE: Opcode.BRLT, # '>=' in the code means we branch if '<'
+            ast.Eq: Opcode.BRNE, # '==' in the code means we branch if '!='
+            ast.NotEq: Opcode.BREQ, # '!=' in the code means we branch if '=='
         }
-        self.__access_memory(node.test.left, 'LDWA', label = f'test_i_{cond_id}')
-        self.__access_memory(node.test.comparators[0], 'CPWA')
-        self.__record_instruction(f'{inverted[type(node.test.ops[0])]} else_{cond_id}')
+        self.__label_next(f'test_i_{cond_id}')
+        self.__expressions.compare(node.test.left, node.test.comparators[0])
+        self.__record_instruction(inverted[type(node.test.ops[0])], immediate(f'else_{cond_id}'))
         for contents in node.body:
-            
-            # if there is an assignment using a constant, never skip it in a loop
-            if isinstance(contents, ast.Assign):
-                if isinstance(contents.value, ast.Constant):
-                    self.names[contents.targets[0].id] = True
-
             self.visit(contents)
-        self.__record_instruction(f'BR end_if_{cond_id}')
-        self.__record_instruction(f'NOP1', label = f'else_{cond_id}')
-        for contents in node.orelse: 
+        self.__record_instruction(Opcode.BR, immediate(f'end_if_{cond_id}'))
+        self.__record_instruction(Opcode.NOP1, label = f'else_{cond_id}')
+        for contents in node.orelse:
             self.visit(contents)
-        self.__record_instruction(f'BR end_if_{cond_id}')
-        self.__record_instruction(f'NOP1', label = f'end_if_{cond_id}')
+        self.__record_instruction(Opcode.BR, immediate(f'end_if_{cond_id}'))
+        self.__record_instruction(Opcode.NOP1, label = f'end_if_{cond_id}')
+
+    ####
+    ## Handling return statements
+    ####
 
-   ####
+    def visit_Return(self, node):
+        recursion = self.__recursion
+        if id(node) in recursion.tail_calls:
+            self.__tail_call(recursion.tail_calls[id(node)])
+            return
+        if id(node) in recursion.accumulated:
+            # the operation waiting for the result is done now, on the accumulator
+            call, other = recursion.accumulated[id(node)]
+            self.__expressions.load(ast.BinOp(left=ast.Name(ACCUMULATOR, ast.Load()), op=recursion.operator, right=other))
+            self.__record_instruction(Opcode.STWA, self.__operand(ACCUMULATOR))
+            self.__tail_call(call)
+            return
+        if node.value is not None:
+            value = node.value
+            if recursion.operator is not None:
+                value = ast.BinOp(left=ast.Name(ACCUMULATOR, ast.Load()), op=recursion.operator, right=value)
+            self.__expressions.load(value)
+            self.__record_instruction(Opcode.STWA, stack(self.__ret))
+        # the peephole optimizer drops this branch when the epilogue is next anyway
+        self.__record_instruction(Opcode.BR, immediate(self.__epilogue))
+
+    ####
     ## Handling function defenitions
     ####
     def visit_FunctionDef(self, node):
-        self.__record_instruction(f'; *** {node.name} function definition')
-        counter = 0
-        loc_vars = {}    # local vars symbol table
-        params = {} # params/args symbol table
+        self.link(self.generate(node), node.lineno)
 
+    def __define(self, node):
+        # frame layout, from the stack pointer up:
+        #   call arguments | temporaries | local vars | return address | params | return value
+        self.temp_loc_vars = {}
+        self.loc_arrays = set()
         self.func_def = True
+        # the frame and the prologue belong to the def line
+        self.__position = (node.lineno, node.col_offset)
+        summary = self.__summary = self.analysis.functions[node.name]
+        params = summary.params
+        if summary.memo is not None:
+            self.__check_memo(summary)
+        # a memoized function must run its body to fill the table
+        self.__recursion = TailRecursion(node, self.analysis, enabled = self.tail_calls and summary.memo is None)
+        loc_vars = {}   # local vars symbol table, name -> size in bytes
+        for name in summary.locals:
+            loc_vars[name] = summary.local_size(name)
+            if summary.is_array(name):
+                self.loc_arrays.add(name)
+        if self.__recursion.operator is not None:
+            loc_vars[ACCUMULATOR] = 2
+        if summary.memo is not None and params[0] in summary.assigned:
+            loc_vars[MEMO_KEY] = 2
+        for name in loc_vars:
+            self.temp_loc_vars[name] = self.__symbol("f"+name.lstrip('$'))
+        for name in params:
+            self.temp_loc_vars[name] = self.__symbol("m"+name)
+
+        # with an accumulator the function never calls itself anymore
+        self.__outgoing = self.analysis.call_area(node.name, exclude = [node.name] if self.__recursion.operator is not None else [])
+        self.__expressions = ExpressionGenerator(self.__record_instruction, self.__operand, self.__array, self.__element, self.__call, self.__temporary, self.__runtime)
+        self.__ret = self.__symbol(node.name[0:1]+"ret")
+        self.__epilogue = f'ret_{self.__identify()}'
+        epilogue = self.__epilogue
+
+        # the body comes first, the frame size depends on the temporaries it needs
+        outer = self.__instructions
+        self.__instructions = list()
+        if self.__recursion.operator is not None:
+            self.__record_instruction(Opcode.LDWA, immediate(self.__recursion.identity))
+            self.__record_instruction(Opcode.STWA, self.__operand(ACCUMULATOR), comment = 'accumulator of the recursion')
+        if self.__recursion.eliminates:
+            self.__entry = f'tail_{self.__identify()}'
+            self.__label_next(self.__entry)
+        if summary.memo is not None:
+            key = MEMO_KEY if MEMO_KEY in loc_vars else params[0]
+            self.__memo_lookup(summary, key, epilogue)
+            # the returns store their value in the table on the way out
+            self.__epilogue = f'memo_{self.__identify()}'
+        for i in node.body:
+            self.visit(i)
+        if summary.memo is not None:
+            self.__memo_store(summary, key, epilogue)
+        body = self.__instructions
+        self.__instructions = outer
+
+        self.__record_instruction(None, comment = f'*** {node.name} function definition')
+        counter = self.__outgoing + 2 * self.__expressions.max_depth
+        if counter:
+            self.__record_instruction(None, comment = f'call arguments and temporaries: {counter} bytes')
 
         # creating .EQUATE statments for each local var
-        self.__record_instruction(f'; local variables:')
-        for i in node.body:
-            if isinstance(i, ast.Assign):
-                # ensure we only alias each var one time
-                if i.targets[0].id not in loc_vars:
-                    loc_vars[i.targets[0].id] = "f"+i.targets[0].id
-                    self.__record_instruction(f'{str(loc_vars[i.targets[0].id]+":"):<9}\t.EQUATE {counter}\t ; local variable #2d') # aliasing name
-                    counter += 2
-                    self.temp_loc_vars[i.targets[0].id] = "f"+i.targets[0].id
-                    self.actual_loc_vars[i.targets[0].id] = "f"+i.targets[0].id
-                    
-                    
-        
+        self.__record_instruction(None, comment = 'local variables:')
+        for name, size in loc_vars.items():
+            element = self.__element(name) if name in self.loc_arrays else 2
+            kind = f'#{element}d{size // element}a' if name in self.loc_arrays else '#2d'
+            self.__record_instruction(Opcode.EQUATE, (counter, None), self.temp_loc_vars[name], f'local variable {kind}') # aliasing name
+            counter += size
+        frame = counter
+
         # the stack stores the call return address between the loc vars and (params, ret vals)
         counter += 2
-        self.__record_instruction(f'; The call return address is stored in between')
-
+        self.__record_instruction(None, comment = 'The call return address is stored in between')
 
         # creating .EQUATE statments for each argumet
-        for i in (node.args.args):
-                params[i.arg] = "m"+i.arg
-                self.__record_instruction(f'{str(params[i.arg]+":"):<9}\t.EQUATE {counter}\t ; parameter {i.arg} #2d')
-                counter += 2
-                self.temp_loc_vars[i.arg] = "m"+i.arg
-                self.actual_arguments[i.arg] = "m"+i.arg
-                
-
-        
+        for name in params:
+            self.__record_instruction(Opcode.EQUATE, (counter, None), self.temp_loc_vars[name], f'parameter {name} #2d')
+            counter += 2
+
         # check for return value
-        for i in (node.body):
-            if isinstance(i, ast.Return):
-                self.__record_instruction(f'{str(node.name[0:1]+"ret"+":"):<9}\t.EQUATE {counter}\t ; return value #2d')
-                self.ret_name = node.name
-                
-                
-        
-        # if at least 1 local variable
-        if loc_vars:
-            st = ""
-            for i in loc_vars.values():
-                st = st + ("#"+i+" ")
-            self.__record_instruction(f'{str(node.name+":"):<9}\tSUBSP {len(loc_vars)*2},i \t ; push {st}') 
+        if self.functions.get(node.name, (0, False))[1]:
+            self.__record_instruction(Opcode.EQUATE, (counter, None), self.__ret, 'return value #2d')
+
+        st = ""
+        for i in loc_vars:
+            st = st + ("#"+self.temp_loc_vars[i]+" ")
+        if frame:
+            self.__record_instruction(Opcode.SUBSP, immediate(frame), node.name, f'push {st}')
         else:
-            self.__record_instruction(f'{str(node.name+":"):<9}\tNOP1') 
-        for i in node.body:
-            self.visit(i)
-
+            self.__record_instruction(Opcode.NOP1, label=node.name)
+        self.__instructions.extend(body)
 
+        self.__label_next(epilogue)
+        if frame:
+            self.__record_instruction(Opcode.ADDSP, immediate(frame), comment = f'pop {st}')
+        self.__record_instruction(Opcode.RET)
         self.func_def = False
-        self.pre_finalize()
-
 
     ####
-    ## Helper functions to 
+    ## Helper functions to
     ####
 
-    def __record_instruction(self, instruction, label = None):
-        self.__instructions.append((label, instruction))
-
-    def __access_memory(self, node, instruction, label = None):
-        
-
-        
-        if isinstance(node, ast.Constant):
-            self.__record_instruction(f'{instruction} {node.value},i', label)
-            return
-
-                # if var name is too long
-        if len(node.id) > 8:
-            name = self.name_mapping[node.id]
-        else:
-            name = node.id   
-
-        
+    def __record_instruction(self, opcode, operand = None, label = None, comment = None):
+        if self.__pending_label is not None and opcode is not None:
+            if label is not None:
+                self.__instructions.append(Instruction(Opcode.NOP1, label = self.__pending_label, line = self.__position[0], column = self.__position[1]))
+            else:
+                label = self.__pending_label
+            self.__pending_label = None
+        value, mode = operand if operand is not None else (None, None)
+        self.__instructions.append(Instruction(opcode, value, mode, label, comment, *self.__position))
+
+    def __label_next(self, label):
+        """The next recorded instruction gets this label"""
+        if self.__pending_label is not None:
+            # two labels for the same instruction
+            self.__instructions.append(Instruction(Opcode.NOP1, label = self.__pending_label, line = self.__position[0], column = self.__position[1]))
+        self.__pending_label = label
+
+    def __check_memo(self, summary):
+        if len(summary.params) != 1 or not summary.returns:
+            raise ValueError(f'@memo function {summary.name} must take one argument and return a value')
+        if not self.analysis.is_pure(summary.name):
+            raise ValueError(f'@memo function {summary.name} must not use input, output or global variables')
+
+    def __memo_lookup(self, summary, key, epilogue):
+        """Return the known result of the argument, the body runs when the argument is out of the table or not known yet"""
+        values, known = (self.symbol_table[name].label for name in memo_tables(summary.name))
+        compute = f'body_{self.__identify()}'
+        if key == MEMO_KEY:
+            self.__record_instruction(Opcode.LDWA, self.__operand(summary.params[0]))
+            self.__record_instruction(Opcode.STWA, self.__operand(MEMO_KEY), comment = 'argument of the memo table')
+        self.__memo_index(summary, key, compute)
+        self.__record_instruction(Opcode.LDWA, (known, Mode.X))
+        self.__record_instruction(Opcode.BREQ, immediate(compute))
+        self.__record_instruction(Opcode.LDWA, (values, Mode.X))
+        self.__record_instruction(Opcode.STWA, stack(self.__ret))
+        self.__record_instruction(Opcode.BR, immediate(epilogue), comment = 'known result')
+        self.__label_next(compute)
+
+    def __memo_store(self, summary, key, epilogue):
+        values, known = (self.symbol_table[name].label for name in memo_tables(summary.name))
+        self.__label_next(self.__epilogue)
+        self.__memo_index(summary, key, epilogue)
+        self.__record_instruction(Opcode.LDWA, stack(self.__ret))
+        self.__record_instruction(Opcode.STWA, (values, Mode.X))
+        self.__record_instruction(Opcode.LDWA, immediate(1))
+        self.__record_instruction(Opcode.STWA, (known, Mode.X))
+
+    def __memo_index(self, summary, key, outside):
+        """X = 2 * key, branches to outside when the key has no entry in the table"""
+        self.__record_instruction(Opcode.LDWX, self.__operand(key))
+        self.__record_instruction(Opcode.BRLT, immediate(outside))
+        self.__record_instruction(Opcode.CPWX, immediate(summary.memo))
+        self.__record_instruction(Opcode.BRGE, immediate(outside))
+        self.__record_instruction(Opcode.ASLX)
+
+    def __tail_call(self, call):
+        """A call to the function itself reuses the frame: new parameter values and back to the entry"""
+        params = self.analysis.functions[self.__recursion.name].params
+        changed = [(p, a) for p, a in zip(params, call.args) if not (isinstance(a, ast.Name) and a.id == p)]
+        # every argument is computed from the old parameters before any of them changes
+        temps = []
+        for param, arg in changed[:-1]:
+            self.__expressions.load(arg)
+            temps.append(self.__expressions.spill())
+        if changed:
+            param, arg = changed[-1]
+            self.__expressions.load(arg)
+            self.__record_instruction(Opcode.STWA, self.__operand(param))
+        for (param, arg), temp in reversed(list(zip(changed[:-1], temps))):
+            self.__record_instruction(Opcode.LDWA, temp)
+            self.__record_instruction(Opcode.STWA, self.__operand(param))
+            self.__expressions.release()
+        self.__record_instruction(Opcode.BR, immediate(self.__entry), comment = f'tail call of {self.__recursion.name}')
+
+    def __symbol(self, name):
+        # .EQUATE symbols are global to the program, linking gives the function its own
+        label = self.__frame_labels.unique(name)
+        self.__symbols.append((label, name))
+        return label
+
+    def __operand(self, name):
         # accessing local var, load from stack
-        if node.id  in self.temp_loc_vars:
-            self.__record_instruction(f'{instruction} {self.temp_loc_vars[name]},s', label)
+        if name in self.temp_loc_vars:
+            return stack(self.temp_loc_vars[name])
+        # long names have a shorter label
+        label = self.symbol_table.label(name)
         # accessing a private variable
-        elif self.isPrivate(node.id):
-            self.__record_instruction(f'{instruction} {name},i', label)
-        else:
-            self.__record_instruction(f'{instruction} {name},d', label)
+        if self.isPrivate(name):
+            return immediate(label)
+        return direct(label)
+
+    def __array(self, name):
+        if name in self.loc_arrays:
+            return (self.temp_loc_vars[name], Mode.SX)
+        return (self.symbol_table.label(name), Mode.X)
+
+    def __element(self, name):
+        if name in self.loc_arrays:
+            return 1 if name in self.__summary.byte_arrays else 2
+        return self.symbol_table[name].element if name in self.symbol_table else 2
+
+    def __array_size(self, name):
+        if name in self.loc_arrays:
+            return self.__summary.local_size(name)
+        return self.symbol_table[name].size if name in self.symbol_table else float('inf')
+
+    def __counters(self, test):
+        """(name, operand) of the variables of a loop test that X can hold"""
+        counters = []
+        sides = (test.left, test.comparators[0])
+        for side, other in (sides, sides[::-1]):
+            if not isinstance(side, ast.Name) or not is_leaf(other) or (isinstance(other, ast.Name) and other.id == side.id):
+                continue
+            if side.id in self.loc_arrays or (side.id not in self.temp_loc_vars and side.id in self.symbol_table and self.symbol_table[side.id].kind is ARRAY):
+                continue
+            operand = self.__operand(side.id)
+            if operand[1] in (Mode.D, Mode.S):
+                counters.append((side.id, operand))
+        return counters
+
+    def __temporary(self, index):
+        return stack(self.__outgoing + 2 * index)
+
+    def __call(self, node, keep_result = True):
+        match node.func.id:
+            case 'int':
+                # Let's visit whatever is casted into an int
+                self.__expressions.load(node.args[0])
+            case 'input' | 'print' | 'exit':
+                raise ValueError(f'{node.func.id}() is not supported here')
+            case name:
+                if name not in self.functions:
+                    raise ValueError(f'Unknown function: {name}')
+                params, returns = self.functions[name]
+                if len(node.args) != params:
+                    raise ValueError(f'{name}() takes {params} arguments, {len(node.args)} given')
+                self.__expressions.call_function(node, returns and keep_result)
 
     def __identify(self):
         result = self.__elem_id
@@ -327,6 +531,3 @@ class FuncDef(ast.NodeVisitor):
         if nodeName[0] == '_' and nodeName[1:].isupper:
             return True
         return False
-
-
-        
\ No newline at end of file
@@ -1,80 +1,40 @@
 import ast
-import random
-import string
+from analysis.SymbolTable import ARRAY, CONSTANT, EQUATE, GLOBAL, SymbolTable
+from visitors.Expressions import is_array_init
 
 class GlobalVariableExtraction(ast.NodeVisitor):
-    """ 
+    """
         We extract all the left hand side of the global (top-level) assignments
     """
-    
-    def __init__(self) -> None:
-        super().__init__()
-        self.results = set()        # Non-Constant assignments
-        self.results_const = []     # Constant assignments, n[0] is the var name and n[1] is const val
-        self.results_priv = []      # Constant private var
-        self.results_arrays = []
-        self.names = {}
-        self.array_names = {}
-
 
-        # store mapping of old names to new shortened names
-        self.name_mapping = {}
+    def __init__(self, symbol_table = None, byte_arrays = ()) -> None:
+        super().__init__()
+        # one record per global, constant, private constant and array
+        self.symbol_table = symbol_table if symbol_table is not None else SymbolTable()
+        # arrays stored one byte per element
+        self.byte_arrays = byte_arrays
 
     def visit_Assign(self, node):
         if len(node.targets) != 1:
             raise ValueError("Only unary assignments are supported")
 
-        
-        if isinstance(node.targets[0], ast.Name):
-            name = node.targets[0].id
-            old_name = name
-        
-        elif isinstance (node.targets[0], ast.Subscript):
-            name = node.targets[0].value.id 
-            
-
-        # Ensure legal var length
-        if len(name) > 8: 
-            name = name[:8]
-            while name in self.names:
-                index = random.randint(1,len(name))
-                newchar = random.choice(string.ascii_letters)
-                # change random chacter in name to get unique name
-                name = name[:index] + newchar + name[index + 1:] 
-            
-            self.name_mapping[old_name] = name
+        if isinstance (node.targets[0], ast.Subscript):
+            # storing an element, the array itself is allocated by its initialization
+            return
+        name = node.targets[0].id
 
-        # check if the assignment is to an array 
-        if name[-1] == '_':
-            if self.results_arrays:
-                for i in self.results_arrays:
-                    if name not in i[0]:
-                        self.results_arrays.append([name, node.value.right])
-            else: 
-                self.results_arrays.append([name, node.value.right])
-    
-        
-        if isinstance(node.value, ast.Constant):    # Check if value being assigned is a constant
+        # check if the assignment is to an array
+        if is_array_init(node.value):
+            element = 1 if name in self.byte_arrays else 2
+            self.symbol_table.define(name, ARRAY, size = element * node.value.right.value, element = element)
+        elif isinstance(node.value, ast.Constant):    # Check if value being assigned is a constant
             if name[0] == '_' and name[1:].isupper:        # Check if var is private
-                if name not in self.names:
-                    self.names[name] = True
-                    self.results_priv.append([name, node.value.value])
+                self.symbol_table.define(name, EQUATE, node.value.value)
             else:
-                if name not in self.names:
-                    self.names[name] = True
-                    self.results_const.append([name, node.value.value])
+                self.symbol_table.define(name, CONSTANT, node.value.value)
         else:
-            if name not in self.names:
-                inside = False
-                for i in self.results_arrays: 
-                    if name == i[0]:
-                        inside = True
-                if inside == False: 
-                    self.names[name] = True
-                    self.results.add(name)
-
+            self.symbol_table.define(name, GLOBAL)
 
     def visit_FunctionDef(self, node):
         """We do not visit function definitions, they are not global by definition"""
         pass
-   
\ No newline at end of file
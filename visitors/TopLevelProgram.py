@@ -1,243 +1,184 @@
 import ast
-
-LabeledInstruction = tuple[str, str]
+from generators.Runtime import RuntimeLibrary
+from analysis.SymbolTable import ARRAY
+from ir.Instruction import Instruction, Mode, Opcode, direct, immediate, stack
+from optimizers.RegisterAllocator import array_sizes_fit
+from visitors.Expressions import ExpressionGenerator, is_array_init, is_input, is_leaf
 
 class TopLevelProgram(ast.NodeVisitor):
     """We supports assignments and input/print calls"""
-    
-    def __init__(self, entry_point, name_mapping, actual_arguments = None, ret_name = None) -> None:
+
+    def __init__(self, entry_point, symbol_table, analysis, runtime = None, registers = None, first_id = 0) -> None:
         super().__init__()
         self.__instructions = list()
-        self.__record_instruction('NOP1', label=entry_point)
-        self.__should_save = True
-        self.__current_variable = None
-        self.__elem_id = 0
-        self.ret_name =ret_name
+        self.__pending_label = None
+        # (line, column) of the statement being visited
+        self.__position = (None, None)
+        self.__record_instruction(Opcode.NOP1, label=entry_point)
+        # label numbers after the ones of the function definitions
+        self.__elem_id = first_id
+
+        # first assignments the static memory already initializes, by id of the node
+        self.analysis = analysis
+        self.__initializers = analysis.initializers()
 
-        #var names, True means it has been used and so must be reassigned
-        self.names = {}
+        # labels of the global names, shared with the static memory allocation
+        self.symbol_table = symbol_table
 
-        # name mapping for long var names from GlobalVariables.py
-        self.name_mapping = name_mapping
+        # (number of parameters, returns a value) of every function definition
+        self.functions = analysis.signatures()
 
-        # check if an assignment involves a func call, to know if need to increase stack size
-        self.has_call = False
+        # runtime routines (multiplication, division) shared with the function definitions
+        self.runtime = runtime if runtime is not None else RuntimeLibrary()
 
-        self.actual_loc_vars = {}
-        self.actual_arguments = actual_arguments
+        # keeps loop counters in X, None to leave them in memory
+        self.registers = registers
+
+        # the top level frame holds the arguments of the calls (at the bottom) and the temporaries
+        self.__outgoing = 0
+        self.__expressions = ExpressionGenerator(self.__record_instruction, self.__operand, self.__array, self.__element, self.__call, self.__temporary, self.runtime)
 
     def finalize(self):
-        if self.ret_name:
-             self.__instructions.append((None,"ADDSP 2,i"))
-            
-        self.__instructions.append((None, '.END'))
+        frame = self.__outgoing + 2 * self.__expressions.max_depth
+        if frame:
+            # the entry point reserves the frame instead of doing nothing
+            entry = self.__instructions[0]
+            self.__instructions[0] = Instruction(Opcode.SUBSP, frame, Mode.I, entry.label, 'push call arguments and temporaries')
+        self.__instructions.append(Instruction(Opcode.END))
         return self.__instructions
 
+    def visit(self, node):
+        # the instructions of a statement carry its source position
+        if not isinstance(node, ast.stmt) or not hasattr(node, 'lineno'):
+            return super().visit(node)
+        outer = self.__position
+        self.__position = (node.lineno, node.col_offset)
+        result = super().visit(node)
+        self.__position = outer
+        return result
+
+    def visit_Module(self, node):
+        self.__outgoing = self.analysis.call_area()
+        self.generic_visit(node)
+
     ####
     ## Handling Assignments (variable = ...)
     ####
 
     def visit_Assign(self, node):
-        # remembering the name of the target
-        if isinstance(node.targets[0], ast.Name):
-            self.__current_variable = node.targets[0].id
-        
-        elif isinstance (node.targets[0], ast.Subscript):
-            self.__current_variable = node.targets[0].value.id 
-        
-
-        # check if there is a func call
-        if isinstance(node.value, ast.Call):
-            self.has_call = True
-
-        # # if assignment value is constant, already stored as a global variable so no need to assign
-        if isinstance(node.value, ast.Constant):
-            # private nodes do not need to be assigned
-            if isinstance(node.targets[0], ast.Name):
-                if self.isPrivate(node.targets[0].id): 
-                    return
-            
-                # if assigning constant for the first time, skip
-                if node.targets[0].id not in self.names:
-                    self.names[node.targets[0].id] = True
-                    return
-                
-
-        # visiting the left part, now knowing where to store the result
-        self.visit(node.value)
-        if self.__should_save:
-            if self.__current_variable[-1] == '_':
-                pass
+        if len(node.targets) != 1:
+            raise ValueError("Only unary assignments are supported")
+        target = node.targets[0]
+
+        # assigning an array element
+        if isinstance(target, ast.Subscript):
+            if is_input(node.value):
+                self.__expressions.input_element(target)
             else:
-                self.__record_instruction(f'STWA {self.__current_variable},d')
-        else:
-            self.__should_save = True
-        self.__current_variable = None
-
-        # if self.has_call:
-        #     self.__record_instruction(f'ADDSP 2,i')
-        self.has_call = False
-
-    def visit_Constant(self, node):
-        self.__record_instruction(f'LDWA {node.value},i')
-    
-    def visit_Name(self, node):
-        # check if id is too long, get name from dict
-        if len(node.id) > 8:
-            self.__record_instruction(f'LDWA {self.name_mapping[node.id]},d')
-        else:
-            self.__record_instruction(f'LDWA {node.id},d')
-
-    def visit_BinOp(self, node):
-        self.__access_memory(node.left, 'LDWA')
-        if isinstance(node.op, ast.Add):
-            self.__access_memory(node.right, 'ADDA')
-        elif isinstance(node.op, ast.Sub):
-            self.__access_memory(node.right, 'SUBA')
-        elif isinstance(node.op, ast.Mult):
+                self.__expressions.store_element(target, node.value)
             return
-        else:
-            raise ValueError(f'Unsupported binary operator: {node.op}')
+
+        name = target.id
+        # a .WORD or a zeroed .BLOCK already holds the value, nothing reads a removed global
+        if id(node) in self.__initializers or self.symbol_table.is_removed(name):
+            return
+
+        if is_array_init(node.value):
+            self.__expressions.fill(name, node.value, f'fill_{self.__identify()}')
+            return
+
+        # private nodes do not need to be assigned
+        if isinstance(node.value, ast.Constant) and self.isPrivate(name):
+            return
+
+        if is_input(node.value):
+            # We are only supporting integers for now, DECI saves the value in memory
+            self.__record_instruction(Opcode.DECI, self.__operand(name))
+            return
+
+        self.__expressions.load(node.value)
+        self.__record_instruction(Opcode.STWA, self.__operand(name))
+
+    def visit_AugAssign(self, node):
+        # x += e is compiled as x = x + e
+        value = ast.BinOp(left=node.target, op=node.op, right=node.value)
+        self.visit_Assign(ast.Assign(targets=[node.target], value=value))
+
+    ####
+    ## Handling function calls used as statements
+    ####
 
     def visit_Call(self, node):
-        match node.func.id: 
-            case 'int': 
-                # Let's visit whatever is casted into an int
-                self.visit(node.args[0])
-            case 'input':
-                # We are only supporting integers for now
-                if self.__current_variable[-1] == '_':
-                    self.__record_instruction(f'DECI {self.__current_variable},x')
-                else:
-                    self.__record_instruction(f'DECI {self.__current_variable},d')
-                self.__should_save = False # DECI already save the value in memory
+        match node.func.id:
             case 'print':
                 # We are only supporting integers for now
-                if isinstance(node.args[0], ast.Subscript):
-                    self.__record_instruction(f'DECO {node.args[0].value.id}, x')
-                else:
-                   self.__record_instruction(f'DECO {node.args[0].id},d')
+                self.__expressions.output(node.args[0])
+            case 'exit':
+                # the exit status is lost, Pep/9 only stops
+                self.__record_instruction(Opcode.STOP)
             case _:
-                # count num of args
-                count_args = 0
-                count_call = 0
-
-
-
-                for i in node.args:
-                    count_args += 2
-                    
-                if self.has_call:
-                    count_call += 2
-                
-
-
-                if count_args + count_call > 0:
-                    st = ""
-                    for i in self.actual_arguments.values():
-                        st = st + ("#"+i+" ")
-                    self.__record_instruction(f'SUBSP {count_args + count_call},i\t ; push {st}')
-
-                c = 0
-                for i in node.args:
-                    self.visit(i)
-                    self.__record_instruction(f'STWA {c},s')
-                    c+= 2
-                self.__record_instruction(f'CALL {node.func.id}')
-                
-                if count_args > 0:
-                    st = ""
-                    for i in self.actual_arguments.values():
-                        st = st + ("#"+i+" ")
-                    self.__record_instruction(f'ADDSP {count_args},i\t ; pop {st}')
-                
-                if count_call > 0:
-                    self.__record_instruction(f'LDWA 0,s')
-                
-
+                self.__call(node, keep_result = False)
 
     ####
     ## Handling While loops (only variable OP variable)
     ####
 
     def visit_While(self, node):
-        b = False
         loop_id = self.__identify()
         inverted = {
-            ast.Lt:  'BRGE', # '<'  in the code means we branch if '>=' 
-            ast.LtE: 'BRGT', # '<=' in the code means we branch if '>' 
-            ast.Gt:  'BRLE', # '>'  in the code means we branch if '<='
-            ast.GtE: 'BRLT', # '>=' in the code means we branch if '<'
-            ast.Eq: 'BRNE', # '==' in the code means we branch if '!='
-            ast.NotEq: 'BREQ', # '!=' in the code means we branch if '=='
+            ast.Lt:  Opcode.BRGE, # '<'  in the code means we branch if '>='
+            ast.LtE: Opcode.BRGT, # '<=' in the code means we branch if '>'
+            ast.Gt:  Opcode.BRLE, # '>'  in the code means we branch if '<='
+            ast.GtE: Opcode.BRLT, # '>=' in the code means we branch if '<'
+            ast.Eq: Opcode.BRNE, # '==' in the code means we branch if '!='
+            ast.NotEq: Opcode.BREQ, # '!=' in the code means we branch if '=='
         }
-        for content in node.body:
-            if isinstance(content, ast.Expr):
-                if isinstance(content.value, ast.Call):
-                    for i in content.value.args: 
-                        if isinstance(i, ast.Subscript):
-                            b = True
-        if b == True: 
-            # left part can only be a variable
-            self.__access_memory(node.test.left, 'LDWX', label = f'test_l_{loop_id}')
-            # right part can only be a variable
-            self.__access_memory(node.test.comparators[0], 'CPWX')
-        else:
-            # left part can only be a variable
-            self.__access_memory(node.test.left, 'LDWA', label = f'test_l_{loop_id}')
-            # right part can only be a variable
-            self.__access_memory(node.test.comparators[0], 'CPWA')
-
+        self.__label_next(f'test_l_{loop_id}')
+        start = len(self.__instructions)
+        self.__expressions.compare(node.test.left, node.test.comparators[0])
         # Branching is condition is not true (thus, inverted)
-        self.__record_instruction(f'{inverted[type(node.test.ops[0])]} end_l_{loop_id}')
-        # Visiting the body of the loop
+        self.__record_instruction(inverted[type(node.test.ops[0])], immediate(f'end_l_{loop_id}'))
+        # Visiting the body of the loop, the register allocator works statement by statement
+        bounds = [len(self.__instructions)]
         for contents in node.body:
-            # if there is an assignment using a constant, never skip it in a while loop
-            if isinstance(contents, ast.Assign):
-                # if isinstance(contents.targets[0], ast.Name):
-                    if isinstance(contents.value, ast.Constant):
-                        self.names[contents.targets[0].id] = True
-
             self.visit(contents)
-        self.__record_instruction(f'BR test_l_{loop_id}')
+            bounds.append(len(self.__instructions))
+        self.__record_instruction(Opcode.BR, immediate(f'test_l_{loop_id}'))
         # Sentinel marker for the end of the loop
-        self.__record_instruction(f'NOP1', label = f'end_l_{loop_id}')
+        self.__record_instruction(Opcode.NOP1, label = f'end_l_{loop_id}')
+        if self.registers is not None:
+            scaled = array_sizes_fit(node, self.__array_size)
+            self.registers.allocate(self.__instructions, start, bounds, self.__counters(node.test), scaled, f'line {node.lineno}')
 
     ####
     ## Handling conditional statements
     ####
-    def visit_If(self, node): 
+    def visit_If(self, node):
         cond_id = self.__identify()
         inverted = {
-            ast.Lt:  'BRGE', # '<'  in the code means we branch if '>=' 
-            ast.LtE: 'BRGT', # '<=' in the code means we branch if '>' 
-            ast.Gt:  'BRLE', # '>'  in the code means we branch if '<='
-            ast.GtE: 'BRLT', # '>=' in the code means we branch if '<'
-            ast.Eq: 'BRNE', # '==' in the code means we branch if '!='
-            ast.NotEq: 'BREQ', # '!=' in the code means we branch if '=='
+            ast.Lt:  Opcode.BRGE, # '<'  in the code means we branch if '>='
+            ast.LtE: Opcode.BRGT, # '<=' in the code means we branch if '>'
+            ast.Gt:  Opcode.BRLE, # '>'  in the code means we branch if '<='
+            ast.GtE: Opcode.BRLT, # '>=' in the code means we branch if '<'
+            ast.Eq: Opcode.BRNE, # '==' in the code means we branch if '!='
+            ast.NotEq: Opcode.BREQ, # '!=' in the code means we branch if '=='
         }
 
-        self.__access_memory(node.test.left, 'LDWA', label = f'test_i_{cond_id}')
-        self.__access_memory(node.test.comparators[0], 'CPWA')
+        self.__label_next(f'test_i_{cond_id}')
+        self.__expressions.compare(node.test.left, node.test.comparators[0])
 
-        self.__record_instruction(f'{inverted[type(node.test.ops[0])]} else_{cond_id}')
+        self.__record_instruction(inverted[type(node.test.ops[0])], immediate(f'else_{cond_id}'))
         for contents in node.body:
-            
-            # if there is an assignment using a constant, never skip it in a loop
-            if isinstance(contents, ast.Assign):
-                if isinstance(contents.value, ast.Constant):
-                    self.names[contents.targets[0].id] = True
-
             self.visit(contents)
-        self.__record_instruction(f'BR end_if_{cond_id}')
-        self.__record_instruction(f'NOP1', label = f'else_{cond_id}')
-        for contents in node.orelse: 
+        self.__record_instruction(Opcode.BR, immediate(f'end_if_{cond_id}'))
+        self.__record_instruction(Opcode.NOP1, label = f'else_{cond_id}')
+        for contents in node.orelse:
             self.visit(contents)
-        self.__record_instruction(f'BR end_if_{cond_id}')
-        self.__record_instruction(f'NOP1', label = f'end_if_{cond_id}')
+        self.__record_instruction(Opcode.BR, immediate(f'end_if_{cond_id}'))
+        self.__record_instruction(Opcode.NOP1, label = f'end_if_{cond_id}')
 
     ####
-    ## Not handling function calls 
+    ## Not handling function calls
     ####
 
     def visit_FunctionDef(self, node):
@@ -245,43 +186,73 @@ class TopLevelProgram(ast.NodeVisitor):
         pass
 
     ####
-    ## Helper functions to 
+    ## Helper functions to
     ####
 
-    def __record_instruction(self, instruction, label = None):
-        self.__instructions.append((label, instruction))
-
-    def __access_memory(self, node, instruction, label = None):
-        
-        if isinstance(node, ast.Constant):
-            self.__record_instruction(f'{instruction} {node.value},i', label)
-            return
-        # if var name is too long    
-        if isinstance(node, ast.List):
-            return
-
-        if isinstance(node, ast.Assign):
-            if isinstance(node.targets[0], ast.Subscript):
-                if self.isArray(node):
-                    self.__record_instruction(f'{instruction} {node.targets[0].value.id}, x', label)
-            return 
-
-        # if var name is too long
-        if len(node.id) > 8:
-            name = self.name_mapping[node.id]
-        else:
-            name = node.id
-
+    def __record_instruction(self, opcode, operand = None, label = None, comment = None):
+        if self.__pending_label is not None and opcode is not None:
+            if label is not None:
+                self.__instructions.append(Instruction(Opcode.NOP1, label = self.__pending_label, line = self.__position[0], column = self.__position[1]))
+            else:
+                label = self.__pending_label
+            self.__pending_label = None
+        value, mode = operand if operand is not None else (None, None)
+        self.__instructions.append(Instruction(opcode, value, mode, label, comment, *self.__position))
+
+    def __label_next(self, label):
+        """The next recorded instruction gets this label"""
+        self.__pending_label = label
+
+    def __operand(self, name):
+        # long names have a shorter label
+        label = self.symbol_table.label(name)
         # if accessing a private variable
-        if self.isPrivate(node.id):
-            self.__record_instruction(f'{instruction} {name},i', label)
-        else:
-            self.__record_instruction(f'{instruction} {name},d', label)
-
+        if self.isPrivate(name):
+            return immediate(label)
+        return direct(label)
+
+    def __array(self, name):
+        return (self.symbol_table.label(name), Mode.X)
+
+    def __element(self, name):
+        return self.symbol_table[name].element if name in self.symbol_table else 2
+
+    def __array_size(self, name):
+        return self.symbol_table[name].size if name in self.symbol_table else float('inf')
+
+    def __counters(self, test):
+        """(name, operand) of the variables of a loop test that X can hold"""
+        counters = []
+        sides = (test.left, test.comparators[0])
+        for side, other in (sides, sides[::-1]):
+            if not isinstance(side, ast.Name) or not is_leaf(other) or (isinstance(other, ast.Name) and other.id == side.id):
+                continue
+            operand = self.__operand(side.id)
+            if operand[1] is Mode.D and not (side.id in self.symbol_table and self.symbol_table[side.id].kind is ARRAY):
+                counters.append((side.id, operand))
+        return counters
+
+    def __temporary(self, index):
+        return stack(self.__outgoing + 2 * index)
+
+    def __call(self, node, keep_result = True):
+        match node.func.id:
+            case 'int':
+                # Let's visit whatever is casted into an int
+                self.__expressions.load(node.args[0])
+            case 'input' | 'print' | 'exit':
+                raise ValueError(f'{node.func.id}() is not supported here')
+            case name:
+                if name not in self.functions:
+                    raise ValueError(f'Unknown function: {name}')
+                params, returns = self.functions[name]
+                if len(node.args) != params:
+                    raise ValueError(f'{name}() takes {params} arguments, {len(node.args)} given')
+                self.__expressions.call_function(node, returns and keep_result)
 
     def __identify(self):
         result = self.__elem_id
-    
+
         self.__elem_id = self.__elem_id + 1
         return result
 
@@ -290,12 +261,3 @@ class TopLevelProgram(ast.NodeVisitor):
         if nodeName[0] == '_' and nodeName[1:].isupper:
             return True
         return False
-
-    def isArray(self, node):
-        for contents in node.body:
-            if isinstance(contents, ast.Assign):
-                for target in contents.targets:
-                    if isinstance(target, ast.Subscript):
-                        return True 
-        return False 
-        
\ No newline at end of file